@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Measures the time required by `GOParser.get_gene_sets`.
+
+The "before" time is obtained with a replica of the previous implementation,
+which determined the genes of each GO term separately, by taking the union
+of the genes annotated with the term and with each of its descendants. The
+"after" times are obtained with the current implementation, which determines
+the genes of all GO terms in a single bottom-up pass over the GO term graph.
+The first call includes this pass, subsequent calls reuse its result.
+
+By default, the small ontology and annotation files used by the tests are
+parsed, which only checks that the script works. To obtain meaningful
+numbers, specify real files:
+
+Usage: python get_gene_sets.py [--obo go-basic.obo]
+       [--gaf gene_association.goa_human.gz]
+       [--genes protein_coding_genes.tsv] [--min-genes N] [--max-genes N]
+
+If no list of genes is specified, all genes in the GAF file are used.
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+import io
+import os
+import sys
+import gzip
+import time
+import argparse
+
+from goparser import GOParser
+from goparser.gaf import is_gzip_file
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        os.pardir, 'tests', 'data')
+
+
+def get_term_genes_legacy(parser, min_genes, max_genes):
+    """Replica of the per-term unions of the previous implementation."""
+    table = parser.annotation_table
+    graph = parser.graph
+    term_genes = {}
+    for id_ in sorted(parser.terms.keys()):
+        idx = parser.terms[id_].index
+        gene_indices = set()
+        for j in [idx] + graph.get_descendants(idx).tolist():
+            gene_indices.update(table.get_term_genes([j]).tolist())
+        tg = frozenset(table.genes[i] for i in gene_indices)
+        c = len(tg)
+        if c == 0 or (min_genes is not None and c < min_genes) or \
+                (max_genes is not None and c > max_genes):
+            continue
+        term_genes[id_] = tg
+    return term_genes
+
+
+def measure(func):
+    """Returns the result of ``func`` and the number of seconds it took."""
+    t0 = time.time()
+    result = func()
+    return result, time.time() - t0
+
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(
+        description='Measures the time required by GOParser.get_gene_sets.')
+    parser.add_argument('--obo', default=os.path.join(DATA_DIR, 'go.obo'),
+                        help='The OBO file (default: test data).')
+    parser.add_argument('--gaf', default=os.path.join(DATA_DIR, 'ann.gaf'),
+                        help='The GAF file, optionally compressed with gzip '
+                             '(default: test data).')
+    parser.add_argument('--genes',
+                        help='A tab-separated file with the valid genes in '
+                             'the first column (default: all genes in the '
+                             'GAF file).')
+    parser.add_argument('--min-genes', type=int)
+    parser.add_argument('--max-genes', type=int)
+    return parser
+
+
+def read_genes(gene_file):
+    """Reads the genes in the first column of a tab-separated file."""
+    with io.open(gene_file, encoding='UTF-8') as fh:
+        return [line.rstrip('\n').split('\t')[0] for line in fh
+                if line.strip()]
+
+
+def read_gaf_genes(gaf_file):
+    """Reads the symbols of all genes in a GAF file."""
+    genes = set()
+    opener = gzip.open if is_gzip_file(gaf_file) else io.open
+    with opener(gaf_file, 'rb') as fh:
+        for line in fh:
+            if line.strip() and not line.startswith(b'!'):
+                genes.add(line.split(b'\t')[2].decode('UTF-8'))
+    return sorted(genes)
+
+
+def main(args):
+    args = get_argument_parser().parse_args(args)
+    min_genes = args.min_genes
+    max_genes = args.max_genes
+    if args.genes is not None:
+        genes = read_genes(args.genes)
+    else:
+        genes = read_gaf_genes(args.gaf)
+
+    parser = GOParser()
+    parser.parse_ontology(args.obo)
+    parser.parse_annotations(args.gaf, genes)
+
+    term_genes, before = measure(
+        lambda: get_term_genes_legacy(parser, min_genes, max_genes))
+    D, first = measure(lambda: parser.get_gene_sets(min_genes, max_genes))
+    _, second = measure(lambda: parser.get_gene_sets(min_genes, max_genes))
+
+    # the retained gene sets must be identical
+    for gs in D.gene_sets:
+        assert gs.genes == term_genes[gs.id]
+
+    print('Number of gene sets: %d' % D.n)
+    print('Seconds: before: %.2f, after: %.2f (first call), '
+          '%.2f (subsequent calls)' % (before, first, second))
+    print('Speedup: %.1fx (first call)' % (before / max(first, 1e-9)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Measures the memory used per `GOTerm` and per `GOAnnotation` object.
+
+The "before" numbers are obtained with replicas of the classes that store
+their attributes in a per-instance ``__dict__`` and that do not share
+repeated strings (as returned by the previous parsers). The "after" numbers
+are obtained with the current (``__slots__``-based) classes and interned
+strings.
+
+Usage: python memory_per_object.py go-basic.obo gene_association.gaf.gz
+       protein_coding_genes.tsv
+
+Requires Python 3 (for ``tracemalloc``).
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+import sys
+import gc
+import tracemalloc
+
+from goparser import GOParser, GOTerm
+
+
+class LegacyTerm(object):
+    """Replica of the attributes of `GOTerm` without ``__slots__``."""
+    def __init__(self, id_, name, domain, definition, is_a, part_of):
+        self.id = id_
+        self.name = name
+        self.domain = domain
+        self.definition = definition
+        self.is_a = set(is_a)
+        self.part_of = set(part_of)
+        self.children = set()
+        self.parts = set()
+        self.descendants = None
+        self.ancestors = None
+
+
+class LegacyAnnotation(object):
+    """Replica of the attributes of `GOAnnotation` without ``__slots__``."""
+    def __init__(self, gene, term, evidence, db_id, db_ref, with_):
+        self.gene = gene
+        self.term = term
+        self.evidence = evidence
+        self.db_id = db_id
+        self.db_ref = tuple(db_ref)
+        self.with_ = tuple(with_)
+
+
+def copy_str(s):
+    """Returns a new (non-shared) string object equal to ``s``."""
+    return None if s is None else (s + '.')[:-1]
+
+
+def measure(func, items):
+    """Returns the number of bytes allocated by ``func`` per item."""
+    gc.collect()
+    tracemalloc.start()
+    objects = [func(x) for x in items]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return size / float(len(items))
+
+
+def main(args):
+    obo_file, gaf_file, gene_file = args
+    with open(gene_file) as fh:
+        genes = [line.rstrip('\n').split('\t')[0] for line in fh
+                 if line.strip()]
+
+    parser = GOParser()
+    parser.parse_ontology(obo_file)
+    parser.parse_annotations(gaf_file, genes)
+
+    terms = list(parser.terms.values())
+    before = measure(
+        lambda t: LegacyTerm(copy_str(t.id), copy_str(t.name),
+                             copy_str(t.domain), copy_str(t.definition),
+                             [copy_str(p) for p in t.is_a],
+                             [copy_str(p) for p in t.part_of]),
+        terms)
+
+    def make_term(t):
+        term = GOTerm(t.id, t.name, t.domain, t.definition,
+                      t.is_a, t.part_of)
+        # parsed terms obtain their relations from the compiled graph
+        term.attach_graph(parser.graph)
+        return term
+
+    after = measure(make_term, terms)
+    print('Bytes per GOTerm:       before: %7.1f, after: %7.1f'
+          % (before, after))
+
+    table = parser.annotation_table
+    rows = range(len(table))
+    before = measure(
+        lambda i: LegacyAnnotation(
+            copy_str(table.genes[table.gene[i]]),
+            terms[0], copy_str(table.evidence_codes[table.evidence[i]]),
+            copy_str(table.db_ids[table.db_id[i]]),
+            [copy_str(table.refs[k]) for k in
+             table.db_ref[table.db_ref_indptr[i]:table.db_ref_indptr[i+1]]],
+            [copy_str(table.with_values[k]) for k in
+             table.with_[table.with_indptr[i]:table.with_indptr[i+1]]]),
+        rows)
+    after = measure(table.get_annotation, rows)
+    print('Bytes per GOAnnotation: before: %7.1f, after: %7.1f'
+          % (before, after))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
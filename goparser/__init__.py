@@ -6,8 +6,15 @@ import pkg_resources
 
 from goparser.term import GOTerm
 from goparser.annotation import GOAnnotation
+from goparser.graph import GOGraph
+from goparser.ancestry import AncestorIndex
 from goparser.parser import GOParser
+from goparser.cache import ParseCache
+from goparser.enrichment import EnrichmentAnalysis, EnrichmentResult
+from goparser.similarity import TermSimilarity, GeneSimilarity
 
 __version__ = pkg_resources.require('goparser')[0].version
 
-__all__ = ['GOTerm', 'GOAnnotation', 'GOParser']
+__all__ = ['GOTerm', 'GOAnnotation', 'GOGraph', 'GOParser', 'ParseCache',
+           'EnrichmentAnalysis', 'EnrichmentResult', 'TermSimilarity',
+           'GeneSimilarity', 'AncestorIndex']
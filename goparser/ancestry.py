@@ -0,0 +1,240 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Module containing the `AncestorIndex` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import logging
+
+import numpy as np
+
+from .graph import merge_csr, take_csr
+
+logger = logging.getLogger(__name__)
+
+
+class AncestorIndex(object):
+
+    """Index for common ancestor queries on the GO term graph.
+
+    The index stores the ancestors of each GO term including the term itself
+    (as a CSR structure with sorted rows), together with the depth and the
+    topological rank of each GO term. Queries for any number of groups of GO
+    terms are answered at once: the ancestors of all members are encoded as
+    (group, ancestor) integer keys, and the common ancestors of a group are
+    the keys that occur once for each of its members.
+
+    The lowest (most specific) common ancestors of a group are the common
+    ancestors that are not an ancestor of any other common ancestor.
+
+    Instances are created by `GOParser`.
+
+    Parameters
+    ----------
+    ancestors: tuple of `numpy.ndarray`
+        See :attr:`ancestors` attribute.
+    depth: `numpy.ndarray` of int32
+        See :attr:`depth` attribute.
+    rank: `numpy.ndarray` of int32
+        See :attr:`rank` attribute.
+
+    Attributes
+    ----------
+    ancestors: tuple of `numpy.ndarray`
+        The ancestors of each GO term, including the term itself, as a CSR
+        structure (indptr, indices) with sorted rows.
+    depth: `numpy.ndarray` of int32
+        The length of the longest path from a root term to each GO term.
+    rank: `numpy.ndarray` of int32
+        The position of each GO term in a topological order (parents before
+        children).
+    """
+
+    def __init__(self, ancestors, depth, rank):
+        self.ancestors = ancestors
+        self.depth = depth
+        self.rank = rank
+
+    def __repr__(self):
+        return '<AncestorIndex (%d terms)>' % self.n
+
+    @property
+    def n(self):
+        """The number of GO terms."""
+        return self.depth.size
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Builds the index of a (flattened) graph.
+
+        Parameters
+        ----------
+        graph: `GOGraph`
+            The graph of the GO terms.
+
+        Returns
+        -------
+        `AncestorIndex`
+            The index.
+
+        Raises
+        ------
+        ValueError
+            If the relations between the GO terms contain a cycle.
+        """
+        n = graph.n
+        reflexive = (np.arange(n + 1, dtype=np.int64),
+                     np.arange(n, dtype=np.int32))
+        ancestors = merge_csr(graph.ancestors, reflexive)
+
+        order = graph.get_topological_order()
+        rank = np.empty(n, dtype=np.int32)
+        rank[order] = np.arange(n, dtype=np.int32)
+
+        # parents are processed before their children
+        indptr, indices = graph.get_parent_csr()
+        indptr = indptr.tolist()
+        indices = indices.tolist()
+        depth = [0] * n
+        for i in order.tolist():
+            parents = indices[indptr[i]:indptr[i+1]]
+            if parents:
+                depth[i] = max(depth[p] for p in parents) + 1
+        return cls(ancestors, np.array(depth, dtype=np.int32), rank)
+
+    def _get_common_keys(self, groups, include_self):
+        """Determines the common ancestors of each group as (group * n +
+        ancestor) keys."""
+        n = max(self.n, 1)
+        members = [np.unique(np.fromiter(g, dtype=np.int64)) for g in groups]
+        sizes = np.array([m.size for m in members], dtype=np.int64)
+        owner = np.repeat(np.arange(len(members), dtype=np.int64), sizes)
+        members = np.concatenate(members) if members \
+            else np.empty(0, dtype=np.int64)
+
+        indptr, anc = take_csr(self.ancestors[0], self.ancestors[1], members)
+        counts = np.diff(indptr)
+        owner = np.repeat(owner, counts)
+        if not include_self:
+            keep = anc != np.repeat(members, counts)
+            owner, anc = owner[keep], anc[keep]
+        keys, occurrences = np.unique(owner * n + anc, return_counts=True)
+        return keys[occurrences == sizes[keys // n]]
+
+    def _get_lowest_keys(self, keys):
+        """Removes the keys of common ancestors that are an ancestor of
+        another common ancestor of the same group."""
+        n = max(self.n, 1)
+        group, term = keys // n, keys % n
+        indptr, anc = take_csr(self.ancestors[0], self.ancestors[1], term)
+        counts = np.diff(indptr)
+        owner = np.repeat(group, counts)
+        keep = anc != np.repeat(term, counts)
+        covered = np.unique(owner[keep] * n + anc[keep])
+        return np.setdiff1d(keys, covered, assume_unique=True)
+
+    def _split_keys(self, keys, num_groups):
+        """Splits (group * n + term) keys into one array per group."""
+        n = max(self.n, 1)
+        bounds = np.searchsorted(
+            keys, np.arange(num_groups + 1, dtype=np.int64) * n)
+        terms = (keys % n).astype(np.int32)
+        return [terms[bounds[i]:bounds[i+1]] for i in range(num_groups)]
+
+    def _sort_by_specificity(self, terms):
+        """Sorts GO terms by decreasing depth and topological rank."""
+        return terms[np.lexsort((-self.rank[terms], -self.depth[terms]))]
+
+    def get_common_ancestors_many(self, groups, include_self=False):
+        """Determines the common ancestors of many groups of GO terms.
+
+        Parameters
+        ----------
+        groups: list of (Iterable of int)
+            The GO term indices of each group.
+        include_self: bool, optional
+            Whether to treat each term as one of its own ancestors.
+
+        Returns
+        -------
+        list of `numpy.ndarray` of int32
+            The sorted indices of the common ancestors of each group. The
+            result is empty for empty groups.
+        """
+        groups = list(groups)
+        keys = self._get_common_keys(groups, include_self)
+        return self._split_keys(keys, len(groups))
+
+    def get_common_ancestors(self, indices, include_self=False):
+        """Determines the common ancestors of a group of GO terms.
+
+        Parameters
+        ----------
+        indices: Iterable of int
+            The GO term indices.
+        include_self: bool, optional
+            Whether to treat each term as one of its own ancestors.
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The sorted indices of the common ancestors.
+        """
+        return self.get_common_ancestors_many([indices], include_self)[0]
+
+    def get_lowest_common_ancestors_many(self, groups, include_self=False):
+        """Determines the lowest common ancestors of many groups of GO terms.
+
+        Parameters
+        ----------
+        groups: list of (Iterable of int)
+            The GO term indices of each group.
+        include_self: bool, optional
+            Whether to treat each term as one of its own ancestors.
+
+        Returns
+        -------
+        list of `numpy.ndarray` of int32
+            The indices of the lowest common ancestors of each group, sorted
+            by decreasing depth (and then by decreasing topological rank).
+        """
+        groups = list(groups)
+        keys = self._get_lowest_keys(
+            self._get_common_keys(groups, include_self))
+        return [self._sort_by_specificity(terms)
+                for terms in self._split_keys(keys, len(groups))]
+
+    def get_lowest_common_ancestors(self, indices, include_self=False):
+        """Determines the lowest common ancestors of a group of GO terms.
+
+        Parameters
+        ----------
+        indices: Iterable of int
+            The GO term indices.
+        include_self: bool, optional
+            Whether to treat each term as one of its own ancestors.
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The indices of the lowest common ancestors, sorted by decreasing
+            depth (and then by decreasing topological rank).
+        """
+        return self.get_lowest_common_ancestors_many(
+            [indices], include_self)[0]
@@ -146,6 +146,8 @@ class GOAnnotation(object):
 
     # uniprot_pattern = re.compile("([A-Z][A-Z0-9]{5})(?:-(\d+))?")
 
+    __slots__ = ('gene', 'term', 'evidence', 'db_id', 'db_ref', 'with_')
+
     def __init__(self, gene, term, evidence, db_id=None,
                  db_ref=None, with_=None):
 
@@ -171,6 +173,13 @@ class GOAnnotation(object):
         self.db_ref = () if db_ref is None else tuple(db_ref)
         self.with_ = () if with_ is None else tuple(with_)
 
+    def __getstate__(self):
+        return dict((attr, getattr(self, attr)) for attr in self.__slots__)
+
+    def __setstate__(self, state):
+        for attr in self.__slots__:
+            setattr(self, attr, state.get(attr))
+
     def __repr__(self):
         return '<GOAnnotation (hash=%d)>' % hash(self)
 
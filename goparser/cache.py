@@ -0,0 +1,299 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Module containing the `ParseCache` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import os
+import io
+import json
+import time
+import errno
+import hashlib
+import logging
+import tempfile
+
+from . import snapshot
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 4 * 1024 * 1024
+"""Number of bytes read from an input file at once (for hashing)."""
+
+
+def hash_file(fn, block_size=BLOCK_SIZE):
+    """Computes the SHA-256 hash of the contents of a file.
+
+    Parameters
+    ----------
+    fn: str
+        Path of the file.
+    block_size: int, optional
+        The number of bytes to read at once.
+
+    Returns
+    -------
+    str
+        The hexadecimal digest.
+    """
+    h = hashlib.sha256()
+    with io.open(fn, 'rb') as fh:
+        while True:
+            block = fh.read(block_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+def hash_strings(strings):
+    """Computes the SHA-256 hash of a sequence of strings.
+
+    Parameters
+    ----------
+    strings: Iterable of str
+        The strings.
+
+    Returns
+    -------
+    str
+        The hexadecimal digest.
+    """
+    h = hashlib.sha256()
+    for s in strings:
+        h.update(s.encode('UTF-8'))
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+class ParseCache(object):
+
+    """On-disk cache of parsed ontologies and annotations.
+
+    The results of `GOParser.parse_ontology` and `GOParser.parse_annotations`
+    are stored as snapshot files (see :mod:`goparser.snapshot`), named after
+    a hash of the contents of the input file and of all parameters that
+    affect the result. A cached result is therefore only used if neither the
+    input file nor the parameters have changed.
+
+    Several processes can use the same cache directory at the same time.
+    Snapshot files are written to temporary files first, and then renamed,
+    so that no process ever reads an incomplete file. Whenever a file is
+    added, the least recently used files are removed until the total size of
+    the cache does not exceed ``max_size``.
+
+    Parameters
+    ----------
+    cache_dir: str
+        Path of the cache directory. It is created if it does not exist.
+    max_size: int, optional
+        The maximum total size of the cached files (in bytes). If None,
+        files are never removed.
+
+    Attributes
+    ----------
+    cache_dir: str
+        Path of the cache directory.
+    max_size: int or None
+        The maximum total size of the cached files (in bytes).
+
+    Examples
+    --------
+    >>> from goparser import GOParser, ParseCache
+    >>> cache = ParseCache('~/.cache/goparser')
+    >>> parser = GOParser()
+    >>> parser.parse_ontology('go-basic.obo', cache=cache)
+    >>> parser.parse_annotations('gene_association.goa_human.gz',
+    >>>                          genes, cache=cache)
+    """
+
+    suffix = '.snap'
+    """The file name extension of cached snapshot files."""
+
+    def __init__(self, cache_dir, max_size=2 * 1024**3):
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self.max_size = max_size
+        try:
+            os.makedirs(self.cache_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def __repr__(self):
+        return '<ParseCache "%s" (max. size: %s bytes)>' \
+               % (self.cache_dir, self.max_size)
+
+    def get_key(self, kind, fn, **params):
+        """Computes the cache key of a parsing result.
+
+        Parameters
+        ----------
+        kind: str
+            The type of data (e.g., "ontology").
+        fn: str
+            Path of the input file.
+        params:
+            All parameters that affect the result. The values must be
+            JSON-serializable.
+
+        Returns
+        -------
+        str
+            The key.
+        """
+        data = {
+            'kind': kind,
+            'file': hash_file(fn),
+            'params': params,
+            'format': snapshot.FORMAT_VERSION,
+        }
+        data = json.dumps(data, sort_keys=True).encode('UTF-8')
+        return '%s-%s' % (kind, hashlib.sha256(data).hexdigest())
+
+    def _get_path(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def get(self, key):
+        """Looks up a cached result.
+
+        Parameters
+        ----------
+        key: str
+            The cache key.
+
+        Returns
+        -------
+        `snapshot.SnapshotReader` or None
+            A reader of the cached snapshot file, or None if the result is
+            not cached.
+        """
+        path = self._get_path(key)
+        try:
+            reader = snapshot.SnapshotReader(path)
+            # mark the file as recently used
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return reader
+
+    def put(self, key, sections, meta=None):
+        """Stores a result in the cache.
+
+        Parameters
+        ----------
+        key: str
+            The cache key.
+        sections: dict [str:dict [str:`numpy.ndarray`]]
+            The arrays of each section (see `snapshot.write_snapshot`).
+        meta: dict, optional
+            Additional information to store with the arrays.
+
+        Returns
+        -------
+        None
+        """
+        path = self._get_path(key)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        os.close(fd)
+        try:
+            snapshot.write_snapshot(tmp_path, sections, meta)
+            # renaming is atomic, so readers never see incomplete files
+            os.rename(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            if not os.path.isfile(path):
+                raise
+            # on Windows, renaming fails if another process has already
+            # stored the same result
+        self.evict()
+
+    def _get_entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                # removed by another process
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def get_size(self):
+        """Returns the total size of the cached files (in bytes)."""
+        return sum(size for _, size, _ in self._get_entries())
+
+    def evict(self, max_size=None):
+        """Removes least recently used files from the cache.
+
+        Parameters
+        ----------
+        max_size: int, optional
+            The maximum total size of the remaining files (in bytes). If not
+            specified, use ``max_size`` attribute.
+
+        Returns
+        -------
+        int
+            The number of removed files.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        if max_size is None:
+            return 0
+
+        entries = sorted(self._get_entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= max_size:
+                break
+            try:
+                # processes that have mapped the file can keep using it
+                os.remove(path)
+            except OSError:
+                # removed by another process, or still open (on Windows)
+                continue
+            total -= size
+            removed += 1
+        if removed > 0:
+            logger.debug('Removed %d files from the parse cache.', removed)
+        return removed
+
+    def clear(self):
+        """Removes all files from the cache.
+
+        Temporary files of other processes that are still writing to the
+        cache are only removed if they are older than a day.
+
+        Returns
+        -------
+        None
+        """
+        self.evict(0)
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.tmp'):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    if os.stat(path).st_mtime < time.time() - 86400:
+                        os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,308 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Module containing the `EnrichmentAnalysis` and `EnrichmentResult`
+classes."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import logging
+
+import numpy as np
+
+from .graph import take_csr
+
+logger = logging.getLogger(__name__)
+
+
+def _import_scipy():
+    """Imports the SciPy modules required for enrichment analyses."""
+    try:
+        from scipy import sparse, stats
+    except ImportError:
+        raise ImportError('GO enrichment analyses require SciPy '
+                          '(e.g., "pip install goparser[sparse]").')
+    return sparse, stats
+
+
+def correct_pvalues(pvals, method='fdr_bh'):
+    """Corrects p-values for multiple testing.
+
+    Parameters
+    ----------
+    pvals: `numpy.ndarray`
+        The p-values. If the array is two-dimensional, each row is corrected
+        separately.
+    method: str or None, optional
+        The correction method: "fdr_bh" (Benjamini-Hochberg false discovery
+        rate) or "bonferroni". If None, the p-values are not corrected.
+
+    Returns
+    -------
+    `numpy.ndarray`
+        The corrected p-values (or q-values), of the same shape as
+        ``pvals``.
+
+    Raises
+    ------
+    ValueError
+        If the method is unknown.
+    """
+    pvals = np.asarray(pvals, dtype=np.float64)
+    if method is None:
+        return pvals.copy()
+    n = pvals.shape[-1]
+    if method == 'bonferroni':
+        return np.minimum(pvals * n, 1.0)
+    if method != 'fdr_bh':
+        raise ValueError('Unknown multiple testing correction method: "%s"'
+                         % method)
+    if n == 0:
+        return pvals.copy()
+    # correct each row separately
+    rows = np.atleast_2d(pvals)
+    order = np.argsort(rows, axis=1, kind='mergesort')
+    r = np.arange(rows.shape[0])[:, None]
+    qvals = rows[r, order] * n / np.arange(1, n + 1)
+    # enforce monotonicity, starting with the largest p-value
+    qvals = np.minimum.accumulate(qvals[:, ::-1], axis=1)[:, ::-1]
+    result = np.empty_like(qvals)
+    result[r, order] = np.minimum(qvals, 1.0)
+    return result.reshape(pvals.shape)
+
+
+class EnrichmentResult(object):
+
+    """Results of testing gene lists for enrichment of GO terms.
+
+    Parameters
+    ----------
+    term_ids: list of str
+        See :attr:`term_ids` attribute.
+    background_size: int
+        See :attr:`background_size` attribute.
+    term_sizes: `numpy.ndarray` of int64
+        See :attr:`term_sizes` attribute.
+    query_sizes: `numpy.ndarray` of int64
+        See :attr:`query_sizes` attribute.
+    overlaps: `numpy.ndarray` of int64
+        See :attr:`overlaps` attribute.
+    pvals: `numpy.ndarray` of float64
+        See :attr:`pvals` attribute.
+    qvals: `numpy.ndarray` of float64
+        See :attr:`qvals` attribute.
+
+    Attributes
+    ----------
+    term_ids: list of str
+        The IDs of the tested GO terms (columns).
+    background_size: int
+        The number of background genes.
+    term_sizes: `numpy.ndarray` of int64
+        The number of background genes annotated with each GO term.
+    query_sizes: `numpy.ndarray` of int64
+        The number of background genes in each gene list (rows).
+    overlaps: `numpy.ndarray` of int64
+        The number of genes of each gene list (row) annotated with each GO
+        term (column).
+    pvals: `numpy.ndarray` of float64
+        The (uncorrected) hypergeometric p-values.
+    qvals: `numpy.ndarray` of float64
+        The p-values corrected for multiple testing (separately for each gene
+        list).
+    """
+
+    def __init__(self, term_ids, background_size, term_sizes, query_sizes,
+                 overlaps, pvals, qvals):
+        self.term_ids = term_ids
+        self.background_size = background_size
+        self.term_sizes = term_sizes
+        self.query_sizes = query_sizes
+        self.overlaps = overlaps
+        self.pvals = pvals
+        self.qvals = qvals
+
+    def __repr__(self):
+        return '<EnrichmentResult (%d gene lists, %d GO terms)>' \
+               % (len(self), len(self.term_ids))
+
+    def __len__(self):
+        return self.query_sizes.size
+
+    def get_enriched_terms(self, query, alpha=0.05):
+        """Returns the GO terms that are significantly enriched in a gene list.
+
+        Parameters
+        ----------
+        query: int
+            The index of the gene list.
+        alpha: float, optional
+            The significance threshold for the corrected p-values.
+
+        Returns
+        -------
+        list of str
+            The IDs of the enriched GO terms, sorted by p-value.
+        """
+        qvals = self.qvals[query]
+        selected = np.flatnonzero(qvals <= alpha)
+        selected = selected[np.argsort(self.pvals[query][selected],
+                                       kind='mergesort')]
+        return [self.term_ids[j] for j in selected.tolist()]
+
+
+class EnrichmentAnalysis(object):
+
+    """Test of many gene lists for enrichment of GO terms.
+
+    The (propagated) annotations of all GO terms are stored as a sparse
+    gene-by-GO term matrix. The overlaps of a batch of gene lists with all
+    GO terms are then obtained with a single sparse matrix product, and the
+    hypergeometric p-values are computed for all of them at once.
+
+    Instances are created by `GOParser.get_enrichment_analysis`.
+
+    Parameters
+    ----------
+    matrix: `scipy.sparse.csr_matrix`
+        See :attr:`matrix` attribute.
+    term_ids: list of str
+        See :attr:`term_ids` attribute.
+    gene2idx: mapping [str:int]
+        The gene code of each gene name.
+    background: `numpy.ndarray` of int32
+        See :attr:`background` attribute.
+
+    Attributes
+    ----------
+    matrix: `scipy.sparse.csr_matrix`
+        The incidence matrix of the background genes (rows, indexed by gene
+        code) and the GO terms (columns). Rows of other genes are empty.
+    term_ids: list of str
+        The IDs of the GO terms.
+    background: `numpy.ndarray` of int32
+        The sorted gene codes of the background genes.
+    term_sizes: `numpy.ndarray` of int64
+        The number of background genes annotated with each GO term.
+    """
+
+    def __init__(self, matrix, term_ids, gene2idx, background):
+        self.matrix = matrix
+        self.term_ids = term_ids
+        self.gene2idx = gene2idx
+        self.background = background
+        self.term_sizes = np.diff(matrix.tocsc().indptr).astype(np.int64)
+        self._is_background = np.zeros(matrix.shape[0], dtype=np.bool_)
+        self._is_background[background] = True
+
+    def __repr__(self):
+        return '<EnrichmentAnalysis (%d GO terms, %d background genes)>' \
+               % (len(self.term_ids), self.background.size)
+
+    @classmethod
+    def from_propagated(cls, propagated, terms, term_ids, genes, gene2idx,
+                        background):
+        """Creates an enrichment analysis from propagated annotations.
+
+        Parameters
+        ----------
+        propagated: `propagation.PropagatedAnnotations`
+            The propagated annotations.
+        terms: `numpy.ndarray` of int32
+            The indices of the GO terms to test.
+        term_ids: list of str
+            The IDs of the GO terms to test.
+        genes: Sequence of str
+            The gene names, indexed by gene code.
+        gene2idx: mapping [str:int]
+            The gene code of each gene name.
+        background: `numpy.ndarray` of int32
+            The sorted gene codes of the background genes.
+
+        Returns
+        -------
+        `EnrichmentAnalysis`
+            The enrichment analysis.
+        """
+        sparse, _ = _import_scipy()
+        indptr, indices = take_csr(propagated.term_indptr,
+                                   propagated.term_genes, terms)
+        # only keep background genes
+        is_background = np.zeros(len(genes), dtype=np.bool_)
+        is_background[background] = True
+        keep = is_background[indices]
+        kept = np.zeros(keep.size + 1, dtype=np.int64)
+        np.cumsum(keep, out=kept[1:])
+        indptr = kept[indptr]
+        indices = indices[keep]
+        matrix = sparse.csc_matrix(
+            (np.ones(indices.size, dtype=np.float64), indices, indptr),
+            shape=(len(genes), terms.size)).tocsr()
+        return cls(matrix, term_ids, gene2idx, background)
+
+    def _get_query_matrix(self, queries):
+        """Encodes gene lists as a sparse gene list-by-gene matrix."""
+        sparse, _ = _import_scipy()
+        gene2idx = self.gene2idx
+        is_background = self._is_background
+        rows = []
+        for genes in queries:
+            codes = np.unique(np.array(
+                [gene2idx[g] for g in genes if g in gene2idx],
+                dtype=np.int32))
+            rows.append(codes[is_background[codes]])
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([r.size for r in rows])
+        indices = np.concatenate(rows) if rows \
+            else np.empty(0, dtype=np.int32)
+        return sparse.csr_matrix(
+            (np.ones(indices.size, dtype=np.float64), indices, indptr),
+            shape=(len(rows), self.matrix.shape[0]))
+
+    def test(self, queries, correction='fdr_bh'):
+        """Tests gene lists for enrichment of GO terms.
+
+        For each gene list and GO term, the p-value of the one-sided
+        hypergeometric test is calculated. Genes that are not in the
+        background are ignored.
+
+        Parameters
+        ----------
+        queries: list of (Iterable of str)
+            The gene lists.
+        correction: str or None, optional
+            The multiple testing correction method (see `correct_pvalues`).
+
+        Returns
+        -------
+        `EnrichmentResult`
+            The results for all gene lists and GO terms.
+        """
+        _, stats = _import_scipy()
+        Q = self._get_query_matrix(queries)
+        overlaps = np.rint(Q.dot(self.matrix).toarray()).astype(np.int64)
+        query_sizes = np.diff(Q.indptr).astype(np.int64)
+        N = self.background.size
+        pvals = stats.hypergeom.sf(overlaps - 1, N, self.term_sizes[None, :],
+                                   query_sizes[:, None])
+        pvals = np.clip(pvals, 0.0, 1.0)
+        qvals = correct_pvalues(pvals, correction)
+        logger.debug('Tested %d gene lists for enrichment of %d GO terms.',
+                     len(query_sizes), len(self.term_ids))
+        return EnrichmentResult(self.term_ids, N, self.term_sizes,
+                                query_sizes, overlaps, pvals, qvals)
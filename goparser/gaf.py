@@ -0,0 +1,449 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Functions for reading gene association files (GAF 2.0 format)."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import os
+import gzip
+import shutil
+import logging
+import tempfile
+import multiprocessing
+from collections import Counter
+
+from .table import AnnotationTableBuilder
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 4 * 1024 * 1024
+"""Number of bytes read from a GAF file at once."""
+
+
+def iter_gaf_lines(fh, block_size=BLOCK_SIZE):
+    """Reads a binary file handle in large blocks and yields its lines.
+
+    Parameters
+    ----------
+    fh: file-like object
+        The file handle (opened in binary mode).
+    block_size: int, optional
+        The number of bytes to read at once.
+
+    Yields
+    ------
+    (int, bytes)
+        The line number (starting at 1) and the line (without the line
+        break).
+    """
+    rest = b''
+    line_no = 0
+    while True:
+        block = fh.read(block_size)
+        if not block:
+            break
+        lines = (rest + block).split(b'\n')
+        rest = lines.pop()
+        for line in lines:
+            line_no += 1
+            yield line_no, line
+    if rest:
+        yield line_no + 1, rest
+
+
+def read_gaf(fh, db_sel='UniProtKB', block_size=BLOCK_SIZE, decode=True):
+    """Yields the relevant columns of all positive annotations in a GAF file.
+
+    Header lines (starting with "!") and empty lines are skipped. Rows are
+    rejected based on their ``DB`` (column 1) and ``Qualifier`` (column 4)
+    values before the remaining columns are split, and only the columns
+    that are returned are decoded (as UTF-8). Decoding can be disabled
+    altogether, e.g., so that `AnnotationFilter` can apply further filters
+    before decoding.
+
+    Parameters
+    ----------
+    fh: file-like object
+        The file handle (opened in binary mode).
+    db_sel: str, optional
+        Select only annotations with this ``DB`` value. If empty, disable
+        filtering based on the ``DB`` value.
+    block_size: int, optional
+        The number of bytes to read at once.
+    decode: bool, optional
+        If set to False, return the column values as bytes.
+
+    Yields
+    ------
+    tuple
+        A tuple (line_no, db_id, gene, term_id, db_ref, evidence, with_),
+        containing the line number and the (unsplit) values of columns 2, 3,
+        5, 6, 7, and 8.
+    """
+    db_prefix = (db_sel + '\t').encode('UTF-8') if db_sel else None
+    malformed = 0
+    for line_no, l in iter_gaf_lines(fh, block_size):
+        if not l or l.startswith(b'!'):
+            continue
+        if db_prefix is not None and not l.startswith(db_prefix):
+            continue
+        # locate the qualifier column (column 4) and reject NOT annotations
+        # before splitting the row
+        i = l.find(b'\t')
+        i = l.find(b'\t', i + 1) if i >= 0 else -1
+        i = l.find(b'\t', i + 1) if i >= 0 else -1
+        if i >= 0 and l.startswith(b'NOT\t', i + 1):
+            continue
+        c = l.split(b'\t', 8)
+        if len(c) < 8:
+            if l.strip():
+                malformed += 1
+            continue
+        if not decode:
+            yield line_no, c[1], c[2], c[4], c[5], c[6], c[7]
+            continue
+        yield (line_no, c[1].decode('UTF-8'), c[2].decode('UTF-8'),
+               c[4].decode('UTF-8'), c[5].decode('UTF-8'),
+               c[6].decode('UTF-8'), c[7].decode('UTF-8'))
+
+    if malformed > 0:
+        logger.warning('Skipped %d malformed lines with fewer than 8 '
+                       'columns.', malformed)
+
+
+class AnnotationFilter(object):
+
+    """Selects valid GO annotations and keeps statistics on excluded ones.
+
+    Parameters
+    ----------
+    genes: Iterable of str or None
+        The valid genes. If None, accept all genes.
+    term_ids: Iterable of str
+        The valid GO term IDs.
+    select_evidence: list of str, optional
+        Only include annotations with the given evidence codes.
+    exclude_evidence: list of str, optional
+        Exclude all annotations with any of the given evidence codes.
+        Ignored if ``select_evidence`` is specified.
+    exclude_ref: list of str, optional
+        Exclude all annotations with the given (single) DB:reference.
+    strip_species: bool, optional
+        Remove species suffixes (e.g., "_HUMAN") from gene names.
+    ignore_case: bool, optional
+        Ignore case when matching gene names to the valid genes.
+
+    Attributes
+    ----------
+    num_positive: int
+        The number of positive annotations (excluding "NOT" annotations).
+    num_excluded_evidence: int
+        The number of annotations excluded based on their evidence code.
+    num_excluded_ref: int
+        The number of annotations excluded based on their DB:reference.
+    num_valid: int
+        The number of valid annotations.
+    unknown_gene_names: `collections.Counter`
+        The number of annotations for each unknown gene name.
+    num_unknown_gene: int
+        The number of annotations with unknown gene names.
+    unknown_term_ids: `collections.Counter`
+        The number of annotations for each unknown GO term ID.
+    num_unknown_term: int
+        The number of annotations with unknown GO term IDs.
+    """
+
+    def __init__(self, genes, term_ids, select_evidence=None,
+                 exclude_evidence=None, exclude_ref=None,
+                 strip_species=False, ignore_case=False):
+
+        self.genes = None
+        self.genes_upper = None
+        if genes is not None:
+            self.genes = set(genes)
+            self.genes_upper = dict((g.upper(), g) for g in genes)
+        self.term_ids = set(term_ids)
+        self.select_evidence = set(select_evidence or [])
+        self.exclude_evidence = set(exclude_evidence or [])
+        self.exclude_ref = set(exclude_ref or [])
+        self.strip_species = strip_species
+        self.ignore_case = ignore_case
+
+        self.num_positive = 0
+        self.num_excluded_evidence = 0
+        self.num_excluded_ref = 0
+        self.num_valid = 0
+        self.unknown_gene_names = Counter()
+        self.num_unknown_gene = 0
+        self.unknown_term_ids = Counter()
+        self.num_unknown_term = 0
+
+    def filter(self, rows):
+        """Selects the valid annotations among the rows of a GAF file.
+
+        The evidence code of each row is tested before any column is decoded,
+        and the "with" column is only decoded for valid annotations.
+
+        Parameters
+        ----------
+        rows: Iterable of tuples
+            The rows, as generated by `read_gaf` with ``decode=False``.
+
+        Yields
+        ------
+        tuple
+            A tuple (gene, term_id, evidence, db_id, db_ref, with_) for each
+            valid annotation, where ``db_ref`` and ``with_`` are lists.
+
+        Raises
+        ------
+        ValueError
+            If a row does not specify a gene.
+        """
+        select_evidence = set(e.encode('UTF-8')
+                              for e in self.select_evidence)
+        exclude_evidence = set(e.encode('UTF-8')
+                               for e in self.exclude_evidence)
+        exclude_ref = self.exclude_ref
+        genes = self.genes
+        genes_upper = self.genes_upper
+        term_ids = self.term_ids
+        strip_species = self.strip_species
+        ignore_case = self.ignore_case
+
+        for i, db_id, gene, term_id, ref, evidence, with_ in rows:
+            self.num_positive += 1
+
+            # test if evidence code is excluded
+            if (select_evidence and evidence not in select_evidence) \
+                    or evidence in exclude_evidence:
+                self.num_excluded_evidence += 1
+                continue
+
+            # test if reference is excluded
+            db_ref = []
+            if ref:
+                db_ref = ref.decode('UTF-8').split('|')
+                if len(db_ref) == 1 and db_ref[0] in exclude_ref:
+                    self.num_excluded_ref += 1
+                    continue
+
+            # determine target gene
+            db_id = db_id.decode('UTF-8')
+            if not gene:
+                raise ValueError('Missing target gene in line %d '
+                                 '(DB Object ID: %s)' % (i, db_id))
+
+            gene = gene.decode('UTF-8')
+            original_gene = gene
+            if strip_species:
+                try:
+                    gene = gene[:gene.rindex('_')]
+                except ValueError:
+                    pass
+
+            invalid = False
+
+            if genes is not None and (
+                    (ignore_case and gene.upper() not in genes_upper) or
+                    ((not ignore_case) and gene not in genes)):
+                self.num_unknown_gene += 1
+                self.unknown_gene_names[original_gene] += 1
+                invalid = True
+
+            term_id = term_id.decode('UTF-8')
+            if term_id not in term_ids:
+                self.num_unknown_term += 1
+                self.unknown_term_ids[term_id] += 1
+                invalid = True
+
+            if not invalid:
+                self.num_valid += 1
+
+                # if ignore_case, convert gene to "original" name
+                if ignore_case and genes is not None:
+                    gene = genes_upper[gene.upper()]
+
+                with_ = with_.decode('UTF-8').split('|') if with_ else []
+                yield (gene, term_id, evidence.decode('UTF-8'), db_id,
+                       db_ref, with_)
+
+    def filter_gaf(self, fh, db_sel='UniProtKB'):
+        """Reads a GAF file and selects the valid annotations.
+
+        Parameters
+        ----------
+        fh: file-like object
+            The file handle (opened in binary mode).
+        db_sel: str, optional
+            Select only annotations with this ``DB`` value. If empty, disable
+            filtering based on the ``DB`` value.
+
+        Yields
+        ------
+        tuple
+            A tuple (gene, term_id, evidence, db_id, db_ref, with_) for each
+            valid annotation, where ``db_ref`` and ``with_`` are lists.
+        """
+        return self.filter(read_gaf(fh, db_sel, decode=False))
+
+    def update(self, other):
+        """Adds the statistics of another filter to this filter.
+
+        Parameters
+        ----------
+        other: `AnnotationFilter`
+            The other filter.
+
+        Returns
+        -------
+        None
+        """
+        self.num_positive += other.num_positive
+        self.num_excluded_evidence += other.num_excluded_evidence
+        self.num_excluded_ref += other.num_excluded_ref
+        self.num_valid += other.num_valid
+        self.unknown_gene_names.update(other.unknown_gene_names)
+        self.num_unknown_gene += other.num_unknown_gene
+        self.unknown_term_ids.update(other.unknown_term_ids)
+        self.num_unknown_term += other.num_unknown_term
+
+
+class _RangeReader(object):
+    """File wrapper that reads all lines starting within a byte range.
+
+    A line belongs to the range that contains its first byte.
+    """
+
+    def __init__(self, fh, start, end):
+        self._fh = fh
+        if start > 0:
+            # skip the line that started in the previous range
+            fh.seek(start - 1)
+            fh.readline()
+        self._pos = fh.tell()
+        self._end = end
+
+    def read(self, size):
+        if self._pos >= self._end:
+            return b''
+        data = self._fh.read(min(size, self._end - self._pos))
+        self._pos += len(data)
+        if self._pos >= self._end and data and not data.endswith(b'\n'):
+            # complete the last line
+            data += self._fh.readline()
+        return data
+
+
+def get_byte_ranges(fn, n):
+    """Splits a file into ``n`` byte ranges of (approximately) equal size.
+
+    Parameters
+    ----------
+    fn: str
+        Path of the (uncompressed) file.
+    n: int
+        The number of ranges.
+
+    Returns
+    -------
+    list of (int, int) tuples
+        The start and end offsets of each range.
+    """
+    size = os.path.getsize(fn)
+    bounds = [(size * k) // n for k in range(n + 1)]
+    return [(bounds[k], bounds[k+1]) for k in range(n)]
+
+
+def _parse_gaf_range(args):
+    """Filters and encodes the annotations in a byte range of a GAF file."""
+    fn, start, end, db_sel, annotation_filter, genes, term_ids = args
+    builder = AnnotationTableBuilder(genes, term_ids)
+    with open(fn, 'rb') as fh:
+        try:
+            for ann in annotation_filter.filter_gaf(
+                    _RangeReader(fh, start, end), db_sel):
+                builder.append(*ann)
+        except ValueError as e:
+            raise ValueError('%s (in the byte range starting at %d)'
+                             % (str(e), start))
+    return builder, annotation_filter
+
+
+def is_gzip_file(fn):
+    """Tests whether a file is compressed with gzip."""
+    with open(fn, 'rb') as fh:
+        return fh.read(2) == b'\x1f\x8b'
+
+
+def parse_gaf_parallel(fn, builder, annotation_filter, db_sel='UniProtKB',
+                       n_jobs=2):
+    """Filters and encodes the annotations in a GAF file in parallel.
+
+    The (decompressed) file is split into line-aligned byte ranges, which are
+    processed by separate worker processes. The results are merged in order,
+    so that the result is identical to that of processing the file serially.
+
+    Parameters
+    ----------
+    fn: str
+        Path of the GAF file. If the file is compressed with gzip, it is
+        first decompressed to a temporary file.
+    builder: `AnnotationTableBuilder`
+        The builder to add the valid annotations to.
+    annotation_filter: `AnnotationFilter`
+        The filter to apply. Its statistics are updated with those of all
+        worker processes.
+    db_sel: str, optional
+        Select only annotations with this ``DB`` value. If empty, disable
+        filtering based on the ``DB`` value.
+    n_jobs: int, optional
+        The number of worker processes.
+
+    Returns
+    -------
+    None
+    """
+    tmp_fn = None
+    if is_gzip_file(fn):
+        logger.info('Decompressing annotation file...')
+        with gzip.open(fn, 'rb') as ifh, \
+                tempfile.NamedTemporaryFile(suffix='.gaf', delete=False) \
+                as ofh:
+            shutil.copyfileobj(ifh, ofh, BLOCK_SIZE)
+            tmp_fn = ofh.name
+        fn = tmp_fn
+
+    try:
+        args = [(fn, start, end, db_sel, annotation_filter,
+                 builder.genes, builder.term_ids)
+                for start, end in get_byte_ranges(fn, n_jobs)]
+        pool = multiprocessing.Pool(n_jobs)
+        try:
+            results = pool.map(_parse_gaf_range, args)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        if tmp_fn is not None:
+            os.remove(tmp_fn)
+
+    for shard_builder, shard_filter in results:
+        builder.update(shard_builder)
+        annotation_filter.update(shard_filter)
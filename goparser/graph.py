@@ -0,0 +1,639 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Module containing the `GOGraph` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import numpy as np
+
+from .util import LazyAttributes
+
+
+def build_csr(rows):
+    """Builds a CSR (compressed sparse row) structure from a list of rows.
+
+    Parameters
+    ----------
+    rows: list of (list of int)
+        The column indices of each row.
+
+    Returns
+    -------
+    indptr: `numpy.ndarray` of int64
+        Row offsets into ``indices`` (length ``len(rows) + 1``).
+    indices: `numpy.ndarray` of int32
+        The concatenated column indices.
+    """
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(r) for r in rows])
+    indices = np.empty(indptr[-1], dtype=np.int32)
+    for i, r in enumerate(rows):
+        indices[indptr[i]:indptr[i+1]] = r
+    return indptr, indices
+
+
+def transpose_csr(indptr, indices, n):
+    """Transposes a CSR structure with ``n`` columns.
+
+    The column indices of each row of the result are sorted.
+
+    Parameters
+    ----------
+    indptr: `numpy.ndarray` of int64
+        Row offsets.
+    indices: `numpy.ndarray` of int32
+        Column indices.
+    n: int
+        The number of columns.
+
+    Returns
+    -------
+    indptr: `numpy.ndarray` of int64
+        Row offsets of the transposed structure.
+    indices: `numpy.ndarray` of int32
+        Column indices of the transposed structure.
+    """
+    rows = np.repeat(np.arange(indptr.size - 1, dtype=np.int32),
+                     np.diff(indptr))
+    order = np.lexsort((rows, indices))
+    t_indptr = np.zeros(n + 1, dtype=np.int64)
+    t_indptr[1:] = np.cumsum(np.bincount(indices, minlength=n))
+    return t_indptr, rows[order]
+
+
+def merge_csr(*structures):
+    """Merges several CSR structures with the same number of rows.
+
+    Each row of the result contains the sorted union of the corresponding
+    rows of the input structures.
+
+    Parameters
+    ----------
+    structures: (indptr, indices) tuples
+        The CSR structures to merge.
+
+    Returns
+    -------
+    indptr: `numpy.ndarray` of int64
+        Row offsets of the merged structure.
+    indices: `numpy.ndarray` of int32
+        Column indices of the merged structure.
+    """
+    n = structures[0][0].size - 1
+    rows = np.concatenate([np.repeat(np.arange(n, dtype=np.int32),
+                                     np.diff(indptr))
+                           for indptr, _ in structures])
+    cols = np.concatenate([indices for _, indices in structures])
+    # remove duplicate entries
+    pairs = np.unique(rows.astype(np.int64) * max(n, 1) + cols)
+    rows = (pairs // max(n, 1)).astype(np.int32)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(rows, minlength=n))
+    return indptr, (pairs % max(n, 1)).astype(np.int32)
+
+
+def take_csr(indptr, indices, rows):
+    """Selects rows from a CSR structure.
+
+    Parameters
+    ----------
+    indptr: `numpy.ndarray` of int64
+        Row offsets.
+    indices: `numpy.ndarray`
+        Column indices (or values).
+    rows: `numpy.ndarray` of int
+        The rows to select (in the order given).
+
+    Returns
+    -------
+    indptr: `numpy.ndarray` of int64
+        Row offsets of the selected rows.
+    indices: `numpy.ndarray`
+        Column indices (or values) of the selected rows.
+    """
+    counts = np.diff(indptr)[rows]
+    new_indptr = np.zeros(rows.size + 1, dtype=np.int64)
+    new_indptr[1:] = np.cumsum(counts)
+    idx = np.repeat(indptr[rows] - new_indptr[:-1], counts) + \
+        np.arange(new_indptr[-1], dtype=np.int64)
+    return new_indptr, indices[idx]
+
+
+def replace_csr_rows(indptr, indices, rows, values):
+    """Replaces rows of a CSR structure.
+
+    Parameters
+    ----------
+    indptr: `numpy.ndarray` of int64
+        Row offsets.
+    indices: `numpy.ndarray`
+        Column indices (or values).
+    rows: `numpy.ndarray` of int
+        The (distinct) rows to replace.
+    values: list of `numpy.ndarray`
+        The new column indices (or values) of each row to replace.
+
+    Returns
+    -------
+    indptr: `numpy.ndarray` of int64
+        Row offsets of the new structure.
+    indices: `numpy.ndarray`
+        Column indices (or values) of the new structure.
+    """
+    counts = np.diff(indptr)
+    keep = np.ones(counts.size, dtype=np.bool_)
+    keep[rows] = False
+    new_counts = counts.copy()
+    new_counts[rows] = np.array([len(v) for v in values], dtype=np.int64)
+    new_indptr = np.zeros(counts.size + 1, dtype=np.int64)
+    new_indptr[1:] = np.cumsum(new_counts)
+    new_indices = np.empty(new_indptr[-1], dtype=indices.dtype)
+    # copy the rows that are kept in a single step
+    new_indices[np.repeat(keep, new_counts)] = \
+        indices[np.repeat(keep, counts)]
+    for i, v in zip(rows.tolist(), values):
+        new_indices[new_indptr[i]:new_indptr[i+1]] = v
+    return new_indptr, new_indices
+
+
+class GOGraph(LazyAttributes):
+
+    """Compiled representation of the relations between GO terms.
+
+    Each GO term is assigned a dense integer index (in the order of its ID),
+    and the ``is_a`` and ``part_of`` relations are stored as CSR (compressed
+    sparse row) arrays, both in the parent and in the child direction. The
+    `GOTerm` objects created by `GOParser.parse_ontology` are views of this
+    graph.
+
+    Parameters
+    ----------
+    ids: list of str
+        The GO term IDs.
+    parents: dict [str:list of (list of int)]
+        For each relation type (``is_a`` and ``part_of``), a list containing
+        the indices of the parents of each GO term.
+
+    Attributes
+    ----------
+    ids: list of str
+        The GO term IDs, ordered by index.
+    id2idx: dict [str:int]
+        A mapping of GO term IDs to indices.
+    n: int
+        The number of GO terms.
+    ancestors: tuple of `numpy.ndarray` or None
+        The (indptr, indices) CSR structure storing the sorted indices of all
+        ancestors of each GO term, or None if the graph is not flattened.
+    descendants: tuple of `numpy.ndarray` or None
+        The (indptr, indices) CSR structure storing the sorted indices of all
+        descendants of each GO term, or None if the graph is not flattened.
+
+    Notes
+    -----
+    The transitive closure is stored as sorted arrays of 32-bit term
+    indices, so that membership tests are binary searches and set operations
+    are merges of sorted arrays. For the Gene Ontology, this requires only a
+    few bytes per (term, ancestor) pair, whereas a dense bit matrix would
+    require ``n**2 / 8`` bytes (several hundred MB) per direction.
+    """
+
+    relations = ('is_a', 'part_of')
+    """The relation types stored in the graph."""
+
+    def __init__(self, ids, parents):
+        self.ids = list(ids)
+        self.id2idx = dict((id_, i) for i, id_ in enumerate(self.ids))
+
+        self._parents = {}
+        self._children = {}
+        for rel in self.relations:
+            indptr, indices = build_csr([sorted(r) for r in parents[rel]])
+            self._parents[rel] = (indptr, indices)
+            self._children[rel] = transpose_csr(indptr, indices, self.n)
+
+        self.ancestors = None
+        self.descendants = None
+
+    def __repr__(self):
+        return '<GOGraph (%d terms)>' % self.n
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def n(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_terms(cls, terms):
+        """Compiles a graph from a collection of GO terms.
+
+        Parameters
+        ----------
+        terms: dict [str:GOTerm]
+            A mapping of GO term IDs to `GOTerm` objects.
+
+        Returns
+        -------
+        GOGraph
+            The compiled graph.
+        """
+        ids = sorted(terms)
+        id2idx = dict((id_, i) for i, id_ in enumerate(ids))
+        parents = {
+            'is_a': [[id2idx[p] for p in terms[id_].is_a] for id_ in ids],
+            'part_of': [[id2idx[p] for p in terms[id_].part_of]
+                        for id_ in ids],
+        }
+        return cls(ids, parents)
+
+    @classmethod
+    def from_csr(cls, ids, id2idx, parents, children,
+                 ancestors=None, descendants=None, load_closure=None):
+        """Creates a graph from existing CSR structures, without copying.
+
+        This is used to restore a graph from a snapshot (see
+        :mod:`goparser.snapshot`).
+
+        Parameters
+        ----------
+        ids: sequence of str
+            The GO term IDs, ordered by index.
+        id2idx: mapping [str:int]
+            A mapping of GO term IDs to indices.
+        parents: dict [str:tuple of `numpy.ndarray`]
+            For each relation type, the (indptr, indices) CSR structure of the
+            parents of each GO term.
+        children: dict [str:tuple of `numpy.ndarray`]
+            For each relation type, the (indptr, indices) CSR structure of the
+            children of each GO term.
+        ancestors: tuple of `numpy.ndarray`, optional
+            See the ``ancestors`` attribute.
+        descendants: tuple of `numpy.ndarray`, optional
+            See the ``descendants`` attribute.
+        load_closure: callable, optional
+            If specified, ``ancestors`` and ``descendants`` are ignored, and
+            the closure is instead loaded by calling this function (with the
+            graph as its argument) when it is first accessed. The function
+            has to return a dictionary with the keys "ancestors" and
+            "descendants" (see `util.LazyAttributes`).
+
+        Returns
+        -------
+        GOGraph
+            The graph.
+        """
+        graph = cls.__new__(cls)
+        graph.ids = ids
+        graph.id2idx = id2idx
+        graph._parents = dict(parents)
+        graph._children = dict(children)
+        if load_closure is not None:
+            graph.set_lazy(['ancestors', 'descendants'], load_closure)
+        else:
+            graph.ancestors = ancestors
+            graph.descendants = descendants
+        return graph
+
+    def _get_relations(self, relations):
+        if relations is None:
+            return self.relations
+        if isinstance(relations, str):
+            return (relations, )
+        return tuple(relations)
+
+    def get_parent_csr(self, relations=None):
+        """Returns the parent relations as a single CSR structure.
+
+        Parameters
+        ----------
+        relations: str or list of str, optional
+            The relation types to include. If not specified, include all.
+
+        Returns
+        -------
+        indptr: `numpy.ndarray` of int64
+            Row offsets.
+        indices: `numpy.ndarray` of int32
+            Sorted parent indices of each GO term.
+        """
+        relations = self._get_relations(relations)
+        if len(relations) == 1:
+            return self._parents[relations[0]]
+        return merge_csr(*[self._parents[rel] for rel in relations])
+
+    def get_child_csr(self, relations=None):
+        """Returns the child relations as a single CSR structure.
+
+        Parameters
+        ----------
+        relations: str or list of str, optional
+            The relation types to include. If not specified, include all.
+
+        Returns
+        -------
+        indptr: `numpy.ndarray` of int64
+            Row offsets.
+        indices: `numpy.ndarray` of int32
+            Sorted child indices of each GO term.
+        """
+        relations = self._get_relations(relations)
+        if len(relations) == 1:
+            return self._children[relations[0]]
+        return merge_csr(*[self._children[rel] for rel in relations])
+
+    def get_parents(self, idx, relations=None):
+        """Returns the indices of the parents of a GO term.
+
+        Parameters
+        ----------
+        idx: int
+            The index of the GO term.
+        relations: str or list of str, optional
+            The relation types to include. If not specified, include all.
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The sorted parent indices.
+        """
+        relations = self._get_relations(relations)
+        parents = []
+        for rel in relations:
+            indptr, indices = self._parents[rel]
+            parents.append(indices[indptr[idx]:indptr[idx+1]])
+        if len(parents) == 1:
+            return parents[0]
+        return np.unique(np.concatenate(parents))
+
+    def get_children(self, idx, relations=None):
+        """Returns the indices of the children of a GO term.
+
+        Parameters
+        ----------
+        idx: int
+            The index of the GO term.
+        relations: str or list of str, optional
+            The relation types to include. If not specified, include all.
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The sorted child indices.
+        """
+        relations = self._get_relations(relations)
+        children = []
+        for rel in relations:
+            indptr, indices = self._children[rel]
+            children.append(indices[indptr[idx]:indptr[idx+1]])
+        if len(children) == 1:
+            return children[0]
+        return np.unique(np.concatenate(children))
+
+    def get_ancestors(self, idx):
+        """Returns the indices of all ancestors of a GO term.
+
+        Parameters
+        ----------
+        idx: int
+            The index of the GO term.
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The sorted ancestor indices.
+        """
+        indptr, indices = self.ancestors
+        return indices[indptr[idx]:indptr[idx+1]]
+
+    def get_descendants(self, idx):
+        """Returns the indices of all descendants of a GO term.
+
+        Parameters
+        ----------
+        idx: int
+            The index of the GO term.
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The sorted descendant indices.
+        """
+        indptr, indices = self.descendants
+        return indices[indptr[idx]:indptr[idx+1]]
+
+    @staticmethod
+    def _contains(row, idx):
+        k = np.searchsorted(row, idx)
+        return bool(k < row.size and row[k] == idx)
+
+    def is_ancestor(self, idx, other_idx):
+        """Tests whether a GO term is an ancestor of another GO term.
+
+        Parameters
+        ----------
+        idx: int
+            The index of the (potential) ancestor.
+        other_idx: int
+            The index of the other GO term.
+
+        Returns
+        -------
+        bool
+            Whether the first term is an ancestor of the second term.
+        """
+        return self._contains(self.get_ancestors(other_idx), idx)
+
+    def is_descendant(self, idx, other_idx):
+        """Tests whether a GO term is a descendant of another GO term.
+
+        Parameters
+        ----------
+        idx: int
+            The index of the (potential) descendant.
+        other_idx: int
+            The index of the other GO term.
+
+        Returns
+        -------
+        bool
+            Whether the first term is a descendant of the second term.
+        """
+        # ancestor sets are much smaller than descendant sets
+        return self._contains(self.get_ancestors(idx), other_idx)
+
+    def get_common_ancestors(self, indices, include_self=False):
+        """Returns the indices of all common ancestors of several GO terms.
+
+        Parameters
+        ----------
+        indices: Iterable of int
+            The GO term indices.
+        include_self: bool, optional
+            Whether to treat each term as one of its own ancestors.
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The sorted indices of the common ancestors.
+        """
+        return self._intersect_rows(self.get_ancestors, indices, include_self)
+
+    def get_common_descendants(self, indices, include_self=False):
+        """Returns the indices of all common descendants of several GO terms.
+
+        Parameters
+        ----------
+        indices: Iterable of int
+            The GO term indices.
+        include_self: bool, optional
+            Whether to treat each term as one of its own descendants.
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The sorted indices of the common descendants.
+        """
+        return self._intersect_rows(self.get_descendants, indices,
+                                    include_self)
+
+    @staticmethod
+    def _intersect_rows(get_row, indices, include_self):
+        result = None
+        for idx in indices:
+            row = get_row(idx)
+            if include_self:
+                row = np.insert(row, np.searchsorted(row, idx), idx)
+            if result is None:
+                result = row
+            else:
+                result = np.intersect1d(result, row, assume_unique=True)
+            if result.size == 0:
+                break
+        if result is None:
+            result = np.empty(0, dtype=np.int32)
+        return result
+
+    def get_ids(self, indices):
+        """Converts GO term indices to a set of GO term IDs.
+
+        Parameters
+        ----------
+        indices: Iterable of int
+            The GO term indices.
+
+        Returns
+        -------
+        frozenset of str
+            The GO term IDs.
+        """
+        ids = self.ids
+        if isinstance(indices, np.ndarray):
+            indices = indices.tolist()
+        return frozenset(ids[i] for i in indices)
+
+    def get_topological_order(self, relations=None):
+        """Sorts the GO terms so that each term comes after its parents.
+
+        Uses Kahn's algorithm, so that deep hierarchies do not require
+        recursion.
+
+        Parameters
+        ----------
+        relations: str or list of str, optional
+            The relation types to consider. If not specified, use all.
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The sorted GO term indices.
+
+        Raises
+        ------
+        ValueError
+            If the relations between the GO terms contain a cycle.
+        """
+        indptr, _ = self.get_parent_csr(relations)
+        next_indptr, next_indices = self.get_child_csr(relations)
+
+        num_pending = np.diff(indptr).tolist()
+        next_indptr = next_indptr.tolist()
+        next_indices = next_indices.tolist()
+        order = [i for i, k in enumerate(num_pending) if k == 0]
+        i = 0
+        while i < len(order):
+            j = order[i]
+            for c in next_indices[next_indptr[j]:next_indptr[j+1]]:
+                num_pending[c] -= 1
+                if num_pending[c] == 0:
+                    order.append(c)
+            i += 1
+
+        if len(order) < self.n:
+            cyclic = sorted(self.ids[i] for i, k in enumerate(num_pending)
+                            if k > 0)
+            raise ValueError('GO term relations contain a cycle (%d terms '
+                             'affected, e.g., %s).'
+                             % (len(cyclic), ', '.join(cyclic[:5])))
+
+        return np.array(order, dtype=np.int32)
+
+    def _compute_closure(self, indptr, indices, order):
+        """Computes the transitive closure of a relation in a single pass."""
+        empty = np.empty(0, dtype=np.int32)
+        rows = [empty] * self.n
+        for i in order.tolist():
+            nb = indices[indptr[i]:indptr[i+1]]
+            if nb.size == 1:
+                j = nb[0]
+                r = rows[j]
+                rows[i] = np.insert(r, np.searchsorted(r, j), j)
+            elif nb.size > 1:
+                rows[i] = np.unique(np.concatenate([nb] + [rows[j]
+                                                           for j in nb]))
+        return build_csr(rows)
+
+    def flatten(self, relations=None):
+        """Determines and stores the ancestors and descendants of all terms.
+
+        The terms are processed in topological order, so that the ancestors
+        (descendants) of each term are obtained from those of its parents
+        (children).
+
+        Parameters
+        ----------
+        relations: str or list of str, optional
+            The relation types to follow. If not specified, use all.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError
+            If the relations between the GO terms contain a cycle.
+        """
+        indptr, indices = self.get_parent_csr(relations)
+        order = self.get_topological_order(relations)
+        self.ancestors = self._compute_closure(indptr, indices, order)
+
+        indptr, indices = self.get_child_csr(relations)
+        self.descendants = self._compute_closure(indptr, indices, order[::-1])
@@ -0,0 +1,194 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Functions for reading ontology files (in OBO 1.2 format)."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import re
+import logging
+
+from genometools import misc
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 4 * 1024 * 1024
+"""Number of bytes read from an OBO file at once."""
+
+_LINE_PATTERN = re.compile(
+    r'\n(\[[^\]\n]*\]|'
+    r'(?:id|namespace|name|def|alt_id|synonym|is_a|relationship|is_obsolete)'
+    r'(?=[ \t]*:))[ \t]*:?[ \t]*([^\n]*)')
+"""Regular expression matching stanza headers and the tag-value pairs used by
+the parser (all other lines are skipped)."""
+
+
+def _iter_text_blocks(fh, block_size=BLOCK_SIZE):
+    """Reads a binary file handle in large blocks and yields decoded text.
+
+    Each block of text only contains complete lines, starts with a line break
+    and does not contain any carriage returns.
+    """
+    rest = b''
+    while True:
+        block = fh.read(block_size)
+        if not block:
+            break
+        data = rest + block
+        idx = data.rfind(b'\n')
+        if idx == -1:
+            rest = data
+            continue
+        rest = data[(idx+1):]
+        data = data[:(idx+1)]
+        if b'\r' in data:
+            data = data.replace(b'\r', b'')
+        yield '\n' + data.decode('UTF-8')
+    if rest:
+        yield '\n' + rest.decode('UTF-8').replace('\r', '') + '\n'
+
+
+def _parse_quoted(value):
+    """Parses a quoted string (with backslash escapes) at the start of a
+    tag value, and returns the unescaped string and the remaining value."""
+    if not value.startswith('"'):
+        return None, value
+    end = value.find('"', 1)
+    if end != -1 and '\\' not in value[1:end]:
+        # fast path: no escaped characters
+        return value[1:end], value[(end+1):]
+    i = 1
+    n = len(value)
+    chars = []
+    while i < n:
+        c = value[i]
+        if c == '\\' and i + 1 < n:
+            chars.append(value[i+1])
+            i += 2
+            continue
+        if c == '"':
+            return ''.join(chars), value[(i+1):]
+        chars.append(c)
+        i += 1
+    return ''.join(chars), ''
+
+
+def _is_complete(term):
+    """Tests whether a term stanza specifies an ID and a namespace, and logs
+    a warning if it does not."""
+    if term['id'] is not None and term['namespace'] is not None:
+        return True
+    if term['id'] is None:
+        logger.warning('Skipping [Term] stanza without "id" tag '
+                       '(name: "%s").', term['name'])
+    else:
+        logger.warning('Skipping [Term] stanza "%s" without "namespace" tag.',
+                       term['id'])
+    return False
+
+
+def iter_obo_terms(fn, block_size=BLOCK_SIZE):
+    """Parses an OBO file and yields the data of each term stanza.
+
+    The file can be plain or compressed with gzip. Tags can appear in any
+    order within a stanza, the last stanza does not need to be followed by
+    an empty line, and stanzas other than ``[Term]`` (e.g., ``[Typedef]``)
+    are skipped. Trailing comments (``! ...``) and modifiers (``{...}``) of
+    ``is_a`` and ``relationship`` tags are ignored. ``[Term]`` stanzas
+    without an ``id`` or a ``namespace`` tag are skipped with a warning.
+
+    Parameters
+    ----------
+    fn: str
+        Path of the OBO file.
+    block_size: int, optional
+        The number of bytes to read at once.
+
+    Yields
+    ------
+    dict
+        A dictionary with the keys "id", "name", "namespace", "def",
+        "alt_id" (list of str), "synonym" (list of (str, str) tuples, with
+        the synonym text and scope), "is_a" (list of str), "part_of" (list of
+        str), and "is_obsolete" (bool).
+    """
+    term = None
+    skipped = 0
+    with misc.smart_open_read(fn, mode='rb', try_gzip=True) as fh:
+        for text in _iter_text_blocks(fh, block_size):
+            for tag, value in _LINE_PATTERN.findall(text):
+                if tag.startswith('['):
+                    # start of a new stanza
+                    if term is not None and _is_complete(term):
+                        yield term
+                    if tag == '[Term]':
+                        is_a = []
+                        part_of = []
+                        synonyms = []
+                        alt_ids = []
+                        term = {
+                            'id': None,
+                            'name': None,
+                            'namespace': None,
+                            'def': None,
+                            'alt_id': alt_ids,
+                            'synonym': synonyms,
+                            'is_a': is_a,
+                            'part_of': part_of,
+                            'is_obsolete': False,
+                        }
+                    else:
+                        term = None
+                        skipped += 1
+
+                elif term is None:
+                    # header of the file or line within a skipped stanza
+                    continue
+
+                elif tag == 'is_a':
+                    is_a.append(value.split(None, 1)[0])
+
+                elif tag == 'synonym':
+                    syn, rest = _parse_quoted(value)
+                    if syn is not None:
+                        rest = rest.split(None, 1)
+                        scope = rest[0] if rest else 'RELATED'
+                        synonyms.append((syn, scope))
+
+                elif tag == 'relationship':
+                    rel = value.split(None, 2)
+                    if len(rel) >= 2 and rel[0] == 'part_of':
+                        part_of.append(rel[1])
+
+                elif tag == 'def':
+                    term['def'] = _parse_quoted(value)[0]
+
+                elif tag == 'alt_id':
+                    alt_ids.append(value.rstrip())
+
+                elif tag == 'is_obsolete':
+                    term['is_obsolete'] = (value.rstrip() == 'true')
+
+                else:  # id, name or namespace
+                    term[tag] = value.rstrip()
+
+    if term is not None and _is_complete(term):
+        yield term
+
+    if skipped > 0:
+        logger.debug('Skipped %d non-term stanzas.', skipped)
@@ -28,13 +28,24 @@ import six
 import logging
 # import bisect
 
-from collections import Counter, OrderedDict
-
-import unicodecsv as csv
+import numpy as np
 
 from genometools import misc
 from genometools.basic import GeneSet, GeneSetCollection
 from . import GOTerm, GOAnnotation
+from .gaf import AnnotationFilter, parse_gaf_parallel
+from .graph import GOGraph, take_csr, transpose_csr
+from .obo import iter_obo_terms
+from .propagation import PropagatedAnnotations, get_direct_genes
+from .ancestry import AncestorIndex
+from .similarity import (TermSimilarity, GeneSimilarity,
+                         compute_similarity_matrix, get_information_content)
+from . import snapshot
+from .cache import hash_strings
+from .enrichment import EnrichmentAnalysis
+from .table import (AnnotationTableBuilder, AnnotationIndexView,
+                    AnnotationDelta)
+from .util import InternPool, LazyAttributes, paused_gc
 
 if six.PY2:
     import cPickle as pickle
@@ -44,7 +55,40 @@ else:
 logger = logging.getLogger(__name__)
 
 
-class GOParser(object):
+def _propagate_annotations(parser):
+    """Propagates the annotations of a parser on first access (see
+    `util.LazyAttributes`)."""
+    table = parser.annotation_table
+    if table is None:
+        return {'_propagated': None, '_gene_sets': {}}
+    return {'_propagated': PropagatedAnnotations.from_table(
+        parser.graph, table), '_gene_sets': {}}
+
+
+def _get_ancestor_index(parser):
+    """Builds the common ancestor index of a parser on first access (see
+    `util.LazyAttributes`)."""
+    if parser.graph is None:
+        return {'_ancestor_index': None}
+    return {'_ancestor_index': AncestorIndex.from_graph(parser.graph)}
+
+
+def _get_term_similarity(parser):
+    """Computes the information content of all GO terms on first access (see
+    `util.LazyAttributes`)."""
+    if parser._propagated is None:
+        return {'_similarity': None, '_gene_similarity': {}}
+    domains = InternPool()
+    codes = np.array([domains.encode(parser.terms[id_].domain)
+                      for id_ in parser.graph.ids], dtype=np.int32)
+    # the closure (including each term itself) is shared with the common
+    # ancestor index
+    ic = get_information_content(parser._propagated.get_counts(), codes)
+    return {'_similarity': TermSimilarity(
+        parser._ancestor_index.ancestors, ic), '_gene_similarity': {}}
+
+
+class GOParser(LazyAttributes):
     """ A class for accessing Gene Ontology (GO) term and annotation data.
 
     This class provides functions for parsing text files describing the Gene
@@ -60,18 +104,26 @@ class GOParser(object):
     terms: dict [str:GOTerm]
         A mapping of GO term IDs to `GOTerm` objects, each representing a
         single GO term. Populated by the member function `parse_ontology`.
+    graph: `GOGraph` or None
+        The compiled graph of GO term relations, with the GO terms in
+        ``terms`` serving as views of it. Populated by the member function
+        `parse_ontology`.
     genes: set of str
         A set of all "valid" gene names. Populated by the member function
         `parse_annotations`. Typically, this is the set of all protein-coding
         genes of a particular species. GOparser ignores all annotations
         for genes that are not in this set.
-    annotations: list of GOAnnotation objects
-        A list of `GOAnnotation` objects, each representing a single GO
-        annotation. Populated by the member function `parse_annotations`.
-    term_annotations: dict [str:list of GOAnnotation objects]
+    annotation_table: `AnnotationTable` or None
+        Columnar storage of all parsed GO annotations. Populated by the member
+        function `parse_annotations`.
+    annotations: sequence of GOAnnotation objects
+        A sequence of `GOAnnotation` objects, each representing a single GO
+        annotation. The objects are created from ``annotation_table`` when
+        they are accessed.
+    term_annotations: mapping [str:list of GOAnnotation objects]
         A mapping of GO term IDs to lists of `GOAnnotation` objects, with each
         list representing all annotations that use a particular GO term.
-    gene_annotations: dict [str:list of GOAnnotation objects]
+    gene_annotations: mapping [str:list of GOAnnotation objects]
         A mapping of gene symbols to lists of `GOAnnotation` objects, with each
         list representing all annotations of a particular gene.
 
@@ -81,22 +133,75 @@ class GOParser(object):
         Return the term with the given term ID as a `GOTerm` object.
     get_term_by_name(name)
         Return the term with the given name as a `GOTerm` object.
+    get_common_ancestors(ids, include_self=False)
+        Return the common ancestors of several GO terms.
+    get_common_ancestors_many(groups, include_self=False)
+        Batch version of `get_common_ancestors`.
+    get_lowest_common_ancestors(ids, include_self=False)
+        Return the most specific common ancestors of several GO terms.
+    get_lowest_common_ancestors_many(groups, include_self=False)
+        Batch version of `get_lowest_common_ancestors`.
+    get_term_depth(id_)
+        Return the depth of a GO term.
     get_gene_goterms(gene, ancestors=False)
         Return all GO terms that the given gene is annotated with.
         If ``ancestors`` is set to True, also return all ancestor GO terms
         of those terms.
+    get_gene_goterm_ids(gene, ancestors=False)
+        Same as `get_gene_goterms`, but return GO term IDs instead of `GOTerm`
+        objects.
+    get_gene_goterms_many(genes, ancestors=False, as_dict=False)
+        Batch version of `get_gene_goterms`.
     get_goterm_genes(id_, descendants=True)
         Return all genes annotated with the GO term corresponding to the given
         GO term ID. If ``descendants`` is set to True, also
         return genes annotated with any descendant GO term of this term. Since
         annotations should be propagated down to descendant terms, this is the
         default behavior.
+    get_goterm_genes_many(ids, descendants=True, as_dict=False)
+        Batch version of `get_goterm_genes`.
+    update_annotations(annotation_file)
+        Update the annotations using a new version of the gene association
+        file, and return the differences.
+    to_incidence_matrix(propagate=True, evidence=None, domains=None)
+        Return the annotations as a sparse gene-by-GO term matrix.
+    get_information_content(id_)
+        Return the information content of a GO term.
+    get_term_similarity(id1, id2, method='lin')
+        Return the semantic similarity (Resnik, Lin, or Jiang-Conrath) of two
+        GO terms.
+    get_term_similarity_many(pairs, method='lin')
+        Batch version of `get_term_similarity`.
+    term_similarity_matrix(domain, method='lin', n_jobs=1)
+        Return the semantic similarities of all pairs of GO terms of a domain,
+        as a memory-mapped matrix.
+    get_gene_similarity(gene1, gene2, method='lin', aggregate='bma', ...)
+        Return the functional similarity of two genes, based on the
+        similarities of their GO terms.
+    get_gene_similarity_many(pairs, method='lin', aggregate='bma', ...)
+        Batch version of `get_gene_similarity`.
+    gene_similarity_matrix(genes1, genes2=None, ..., n_jobs=1)
+        Return the functional similarities of all pairs of genes.
+    get_enrichment_analysis(background=None, min_genes=None, ...)
+        Prepare a GO enrichment analysis, for testing many gene lists at
+        once.
+    test_enrichment(queries, background=None, min_genes=None, ...)
+        Test gene lists for enrichment of GO terms.
+    iter_annotations(annotation_file, genes=None, ...)
+        Iterate over the annotations in a gene association file that pass the
+        same filters as those used by `parse_annotations`, without storing
+        them.
     save(ofn, compress=False)
         Stores the GOParser object as a `pickle` file. If ``compress`` is set
         to True, the object is stored as a gzip'ed pickle file.
     load(fn)
         Loads the GOParser object from a `pickle` file. Gzip compression is
         detected automatically.
+    write_snapshot(ofn)
+        Stores the GOParser object as a binary snapshot file.
+    read_snapshot(fn, sections=None)
+        Loads a GOParser object from a snapshot file, by memory-mapping it.
+        Sections that are not selected are loaded on first access.
         
     Notes
     -----
@@ -156,14 +261,71 @@ class GOParser(object):
     def __init__(self):
         self.genes = set()
         self.terms = {}
-        self.annotations = []
-        self.term_annotations = {}
-        self.gene_annotations = {}
+        self.graph = None
+        self.annotation_table = None
+        self._annotation_params = None
 
         self._syn2id = {}
         self._alt_id = {}
         self._name2id = {}
         self._flattened = False
+        self.set_lazy(['_ancestor_index'], _get_ancestor_index)
+        self.set_lazy(['_propagated', '_gene_sets'], _propagate_annotations)
+        self.set_lazy(['_similarity', '_gene_similarity'],
+                      _get_term_similarity)
+
+    @property
+    def annotations(self):
+        """Sequence of all annotations (as `GOAnnotation` objects)."""
+        if self.annotation_table is None:
+            return []
+        return self.annotation_table
+
+    @property
+    def term_annotations(self):
+        """Mapping of GO term IDs to lists of `GOAnnotation` objects."""
+        if self.annotation_table is None:
+            return {}
+        return AnnotationIndexView(self.annotation_table, 'term')
+
+    @property
+    def gene_annotations(self):
+        """Mapping of gene symbols to lists of `GOAnnotation` objects."""
+        if self.annotation_table is None:
+            return {}
+        return AnnotationIndexView(self.annotation_table, 'gene')
+
+    def __setstate__(self, state):
+        # the annotations of parsers loaded from snapshot files can be
+        # pickled before they are loaded, but the graph is always present
+        if 'graph' in state:
+            self.__dict__.update(state)
+            return
+
+        # pickle written by a previous version, which did not compile the
+        # GO term graph and stored annotations as `GOAnnotation` lists
+        logger.info('Converting GOParser object from a previous version...')
+        annotations = state.pop('annotations', [])
+        state.pop('term_annotations', None)
+        state.pop('gene_annotations', None)
+        self.__init__()
+        self.__dict__.update(state)
+
+        if self.terms:
+            self.graph = GOGraph.from_terms(self.terms)
+            for term in self.terms.values():
+                term.attach_graph(self.graph)
+            if self._flattened:
+                self.graph.flatten()
+
+        if annotations:
+            genes = set(self.genes)
+            genes.update(ann.gene for ann in annotations)
+            builder = AnnotationTableBuilder(genes, self.graph.ids)
+            for ann in annotations:
+                builder.append(ann.gene, ann.term.id, ann.evidence,
+                               ann.db_id, ann.db_ref, ann.with_)
+            self.annotation_table = builder.build(self.terms)
 
     def write_pickle(self, ofn, compress=False):
         """Serialize the current GOParser object and store it in a pickle file.
@@ -213,6 +375,67 @@ class GOParser(object):
             parser = pickle.load(fh)
         return parser
 
+    def write_snapshot(self, ofn):
+        """Store the current GOParser object in a binary snapshot file.
+
+        Parameters
+        ----------
+        ofn: str
+            Path of the output file.
+
+        Returns
+        -------
+        None
+
+        Notes
+        -----
+        See :mod:`goparser.snapshot` for a description of the file format.
+        """
+        logger.info('Saving snapshot...')
+        sections, meta = snapshot.get_parser_arrays(self)
+        snapshot.write_snapshot(ofn, sections, meta)
+
+    @staticmethod
+    def read_snapshot(fn, sections=None):
+        """Load a GOParser object from a binary snapshot file.
+
+        The file is memory-mapped, so that loading it does not require
+        deserializing any objects. `GOTerm` and `GOAnnotation` objects are
+        only created when they are accessed.
+
+        Parameters
+        ----------
+        fn: str
+            Path of the snapshot file.
+        sections: list of str, optional
+            The sections of the file to load immediately, out of "ontology",
+            "closure" (the ancestors and descendants of all terms), "names"
+            (required by `get_term_by_name`) and "annotations". The ontology
+            is always loaded. Each other section is loaded when its data are
+            first accessed. If not specified, load all sections immediately.
+
+        Returns
+        -------
+        GOParser
+            The GOParser object stored in the snapshot file.
+
+        Notes
+        -----
+        Processes that load the same snapshot file share its physical memory
+        pages. The data of the returned object are read-only.
+
+        Examples
+        --------
+        Only load what is needed to look up GO terms by ID and by name:
+
+        >>> parser = GOParser.read_snapshot('go.snap',
+        >>>                                 sections=['ontology', 'names'])
+        """
+        reader = snapshot.SnapshotReader(fn)
+        parser = GOParser()
+        snapshot.load_parser(parser, reader, sections)
+        return parser
+
     def get_term_by_id(self, id_):
         """Get the GO term corresponding to the given GO term ID.
 
@@ -297,10 +520,12 @@ class GOParser(object):
         """
         self.clear_annotation_data()
         self.terms = {}
+        self.graph = None
         self._alt_id = {}
         self._syn2id = {}
         self._name2id = {}
         self._flattened = False
+        self.set_lazy(['_ancestor_index'], _get_ancestor_index)
  
     def clear_annotation_data(self):
         """Clear annotation data.
@@ -313,11 +538,15 @@ class GOParser(object):
         None
         """
         self.genes = set()
-        self.annotations = []
-        self.term_annotations = {}
-        self.gene_annotations = {}
-
-    def parse_ontology(self, fn, flatten=True, part_of_cc_only=False):
+        self.annotation_table = None
+        self._annotation_params = None
+        # propagated annotations are only computed when they are needed
+        self.set_lazy(['_propagated', '_gene_sets'], _propagate_annotations)
+        self.set_lazy(['_similarity', '_gene_similarity'],
+                      _get_term_similarity)
+
+    def parse_ontology(self, fn, flatten=True, part_of_cc_only=False,
+                       cache=None):
         """ Parse an OBO file and store GO term information.
 
         This function needs to be called before `parse_annotations`, in order
@@ -335,135 +564,108 @@ class GOParser(object):
             Legacy parameter for backwards compatibility. If set to True,
             ignore ``part_of`` relations outside the ``celluclar_component``
             domain.
+        cache: `ParseCache`, optional
+            If specified, load the result from this cache if the same file
+            has been parsed with the same parameters before, and otherwise
+            store the result in the cache.
 
         Notes
         -----
         The function erases all previously parsed data.
-        The function requires the OBO file to end with a line break.
+        The OBO file can be plain or compressed with gzip. See
+        :func:`goparser.obo.iter_obo_terms` for details on the parsing.
+        If the result is loaded from a cache, the GO terms are read-only.
         """
+        key = None
+        if cache is not None:
+            key = cache.get_key('ontology', fn, flatten=flatten,
+                                part_of_cc_only=part_of_cc_only)
+            if self._load_cached(cache, key, snapshot.load_parser):
+                logger.info('Loaded %d GO terms from cache.', len(self.terms))
+                return
+
         self.clear_data()  # clear all old data
 
-        with open(fn) as fh:
-            n = 0
-            while True:
-                try:
-                    nextline = next(fh)
-                except StopIteration:
-                    break
-                if nextline == '[Term]\n':
-                    n += 1
-                    id_ = next(fh)[4:-1]
-                    # acc = get_acc(id_)
-                    name = next(fh)[6:-1]
-                    self._name2id[name] = id_
-                    domain = next(fh)[11:-1]
-                    def_ = None
-                    is_a = set()
-                    part_of = set()
-                    l = next(fh)
-                    while l != '\n':
-                        if l.startswith('alt_id:'):
-                            self._alt_id[l[8:-1]] = id_
-                        elif l.startswith('def: '):
-                            idx = l[6:].index('"')
-                            def_ = l[6:(idx+6)]
-                        elif l.startswith('is_a:'):
-                            is_a.add(l[6:16])
-                        elif l.startswith('synonym:'):
-                            idx = l[10:].index('"')
-                            if l[(10+idx+2):].startswith("EXACT"):
-                                s = l[10:(10+idx)]
-                                self._syn2id[s] = id_
-                        elif l.startswith('relationship: part_of'):
-                            if part_of_cc_only:
-                                if domain == 'cellular_component':
-                                    part_of.add(l[22:32])
-                            else:
-                                part_of.add(l[22:32])
-                        l = next(fh)
-                    assert def_ is not None
-                    self.terms[id_] = GOTerm(id_, name, domain,
-                                             def_, is_a, part_of)
-
-        logger.info('Parsed %d GO term definitions.', n)
-
-        # store children and parts
-        logger.info('Adding child and part relationships...')
-        for id_, term in self.terms.items():
-            for parent in term.is_a:
-                self.terms[parent].children.add(id_)
-            for whole in term.part_of:
-                self.terms[whole].parts.add(id_)
+        # make sure that all terms share the same domain strings
+        pool = InternPool()
+
+        n = 0
+        referenced = set()
+        with paused_gc():
+            for data in iter_obo_terms(fn):
+                n += 1
+                id_ = data['id']
+                name = data['name']
+                domain = pool.intern(data['namespace'])
+                self._name2id[name] = id_
+                for alt_id in data['alt_id']:
+                    self._alt_id[alt_id] = id_
+                for syn, scope in data['synonym']:
+                    if scope == 'EXACT':
+                        self._syn2id[syn] = id_
+                part_of = data['part_of']
+                if part_of_cc_only and domain != 'cellular_component':
+                    part_of = []
+                referenced.update(data['is_a'])
+                referenced.update(part_of)
+                self.terms[id_] = GOTerm(id_, name, domain, data['def'],
+                                         data['is_a'], part_of,
+                                         is_obsolete=data['is_obsolete'])
+
+            # remove relations to terms that are not defined in the file
+            undefined = referenced.difference(self.terms)
+            num_missing = 0
+            if undefined:
+                for term in self.terms.values():
+                    for attr in ['is_a', 'part_of']:
+                        related = getattr(term, attr)
+                        missing = related & undefined
+                        if missing:
+                            num_missing += len(missing)
+                            setattr(term, attr, related - missing)
+            if num_missing > 0:
+                logger.warning('Ignored %d relations to undefined GO terms.',
+                               num_missing)
+
+            logger.info('Parsed %d GO term definitions.', n)
+
+            # compile the graph (this also stores children and parts)
+            logger.info('Compiling GO term graph...')
+            self.graph = GOGraph.from_terms(self.terms)
+            for term in self.terms.values():
+                term.attach_graph(self.graph)
 
         if flatten:
-            logger.info('Flattening ancestors...')
-            self._flatten_ancestors()
-            logger.info('Flattening descendants...')
-            self._flatten_descendants()
+            logger.info('Flattening ancestors and descendants...')
+            self.graph.flatten()
             self._flattened = True
 
-    def _flatten_ancestors(self, include_part_of=True):
-        """Determines and stores all ancestors of each GO term.
-
-        Parameters
-        ----------
-        include_part_of: bool, optional
-            Whether to include ``part_of`` relations in determining
-            ancestors.
-
-        Returns
-        -------
-        None
-        """
-
-        def get_all_ancestors(term):
-            ancestors = set()
-            for id_ in term.is_a:
-                ancestors.add(id_)
-                ancestors.update(get_all_ancestors(self.terms[id_]))
-            if include_part_of:
-                for id_ in term.part_of:
-                    ancestors.add(id_)
-                    ancestors.update(get_all_ancestors(self.terms[id_]))
-            return ancestors
-
-        for term in self.terms.values():
-            term.ancestors = get_all_ancestors(term)
-
-    def _flatten_descendants(self, include_parts=True):
-        """Determines and stores all descendants of each GO term.
+        if cache is not None:
+            cache.put(key, *snapshot.get_parser_arrays(
+                self, ['ontology', 'closure', 'names']))
 
-        Parameters
-        ----------
-        include_parts: bool, optional
-            Whether to include ``part_of`` relations in determining
-            descendants.
-
-        Returns
-        -------
-        None
-        """
-
-        def get_all_descendants(term):
-            descendants = set()
-            for id_ in term.children:
-                descendants.add(id_)
-                descendants.update(get_all_descendants(self.terms[id_]))
-            if include_parts:
-                for id_ in term.parts:
-                    descendants.add(id_)
-                    descendants.update(get_all_descendants(self.terms[id_]))
-            return descendants
-
-        for term in self.terms.values():
-            term.descendants = get_all_descendants(term)
+    def _load_cached(self, cache, key, load):
+        """Loads a cached parsing result, and reports whether it exists."""
+        reader = cache.get(key)
+        if reader is None:
+            return False
+        try:
+            load(self, reader)
+        except (IOError, OSError):
+            # the file was removed by another process in the meantime
+            return False
+        return True
 
     def parse_annotations(
             self, annotation_file, genes, db_sel='UniProtKB',
             select_evidence=None, exclude_evidence=None,
-            exclude_ref=None, strip_species=False, ignore_case=False):
+            exclude_ref=None, strip_species=False, ignore_case=False,
+            n_jobs=1, cache=None):
         """Parse a GO annotation file (in GAF 2.0 format).
 
+        The annotations are read using the same stream as `iter_annotations`,
+        and stored in ``annotation_table``.
+
         GO annotation files can be downloaded from the
         `UniProt-GOA download site`__ or from their `FTP server`__.
 
@@ -498,6 +700,15 @@ class GOParser(object):
             Undocumented.
         ignore_case: bool, optional
             Undocumented.
+        n_jobs: int, optional
+            The number of worker processes to use. If larger than 1, the
+            (decompressed) file is split into byte ranges that are parsed in
+            parallel. The result is identical to that of parsing the file
+            with a single process.
+        cache: `ParseCache`, optional
+            If specified, load the result from this cache if the same file
+            has been parsed with the same parameters (and the same ontology)
+            before, and otherwise store the result in the cache.
 
         Returns
         -------
@@ -505,163 +716,365 @@ class GOParser(object):
         """
 
         assert isinstance(annotation_file, str)
+        assert isinstance(n_jobs, int) and n_jobs >= 1
         assert isinstance(genes, (list, tuple))
 
         if not self.terms:
             raise ValueError('You need to first parse an OBO file!')
 
-        if select_evidence is None:
-            select_evidence = []
+        # the parameters that determine which annotations are valid
+        params = {
+            'db_sel': db_sel,
+            'select_evidence': sorted(select_evidence or []),
+            'exclude_evidence': sorted(exclude_evidence or []),
+            'exclude_ref': sorted(exclude_ref or []),
+            'strip_species': strip_species,
+            'ignore_case': ignore_case,
+        }
+
+        key = None
+        if cache is not None:
+            key = cache.get_key(
+                'annotations', annotation_file,
+                ontology=hash_strings(self.graph.ids), genes=list(genes),
+                **params)
+            if self._load_cached(cache, key, snapshot.load_annotations):
+                self.genes = set(genes)
+                logger.info('Loaded %d annotations from cache.',
+                            len(self.annotation_table))
+                return
 
-        if exclude_evidence is None:
-            exclude_evidence = []
-
-        if exclude_ref is None:
-            exclude_ref = []
+        logger.info('Read %d genes.', len(genes))
+        table = self._read_annotation_table(
+            annotation_file, genes, params, n_jobs)
 
-        # always overwrite all previously parsed annotations
+        # always overwrite all previously parsed annotations (only once the
+        # new annotations have been parsed successfully)
         self.clear_annotation_data()
 
         # store genes
         self.genes = set(genes)  # store the list of genes for later use
-        genes_upper = dict((g.upper(), g) for g in genes)
-        logger.info('Read %d genes.', len(genes))
 
-        # read annotations
-        self.term_annotations = dict((id_, []) for id_ in self.terms)
-        self.gene_annotations = dict((g, []) for g in self.genes)
-        # gene_terms is used for statistics
-        gene_terms = dict((g, set()) for g in self.genes)
+        self.annotation_table = table
+        self._annotation_params = params
 
-        # isoform_pattern = re.compile(r"UniProtKB:([A-Z][0-9A-Z]{5}-\d+)")
-        # gene_pattern = re.compile(r"[a-zA-Z0-9]+\.\d+$")
-        # pmid_pattern = re.compile(r"(?:PMID:\d+|DOI:[^\s]+)")
-        # uniprot_pattern = re.compile(r"UniProtKB:([A-Z][0-9A-Z]{5}(?:-\d+)?)")
-
-        unknown_gene_names = Counter()
-        unknown_gene_annotations = 0
-
-        unknown_term_ids = Counter()
-        unknown_term_annotations = 0
+        logger.info('%d unique Gene-Term associations.',
+                    self.annotation_table.get_num_associations())
+
+        if cache is not None:
+            cache.put(key, *snapshot.get_parser_arrays(
+                self, ['annotations']))
+
+    def _read_annotation_table(self, annotation_file, genes, params, n_jobs):
+        """Reads the valid annotations in a GAF file into a table."""
+        builder = AnnotationTableBuilder(genes, self.graph.ids)
+        annotation_filter = AnnotationFilter(
+            genes, self.graph.ids, select_evidence=params['select_evidence'],
+            exclude_evidence=params['exclude_evidence'],
+            exclude_ref=params['exclude_ref'],
+            strip_species=params['strip_species'],
+            ignore_case=params['ignore_case'])
 
         # Parsing!
         logger.info('Parsing annotations...')
-        n = 0
-        excluded_evidence_annotations = 0
-        excluded_reference_annotations = 0
-        valid_annotations = 0
+        if n_jobs > 1:
+            parse_gaf_parallel(annotation_file, builder, annotation_filter,
+                               db_sel=params['db_sel'], n_jobs=n_jobs)
+        else:
+            for record in self._iter_annotation_records(
+                    annotation_file, annotation_filter, params['db_sel']):
+                builder.append(*record)
+
+        self._log_annotation_statistics(annotation_filter)
+        return builder.build(self.terms)
+
+    def update_annotations(self, annotation_file, n_jobs=1):
+        """Update the annotations using a new version of the annotation file.
+
+        The new file is parsed with the same parameters (genes and filters)
+        that were used to parse the current annotations, and the result is
+        compared to the current annotations. Only annotations that were
+        added or removed are changed, and the differences are reported, so
+        that data derived from the annotations can be updated selectively.
+
+        Parameters
+        ----------
+        annotation_file: str
+            Path of the new annotation file (in GAF 2.0 format).
+        n_jobs: int, optional
+            The number of worker processes to use (see `parse_annotations`).
+
+        Returns
+        -------
+        `AnnotationDelta`
+            The annotations that were added and removed, as well as the
+            affected genes and GO terms.
+
+        Raises
+        ------
+        ValueError
+            If no annotations have been parsed, or if the parameters used to
+            parse them are unknown (e.g., for objects pickled with an older
+            version of GOparser).
+
+        Notes
+        -----
+        Unchanged annotations keep their order, and added annotations are
+        appended in the order of the new file.
+        """
+        assert isinstance(annotation_file, str)
+        assert isinstance(n_jobs, int) and n_jobs >= 1
+
+        table = self.annotation_table
+        if table is None:
+            raise ValueError('You need to first parse a gene association '
+                             'file!')
+        params = getattr(self, '_annotation_params', None)
+        if params is None:
+            raise ValueError('The parameters used to parse the current '
+                             'annotations are unknown.')
+
+        new_table = self._read_annotation_table(
+            annotation_file, list(table.genes), params, n_jobs)
+        updated, removed, added = table.update(new_table)
+        delta = AnnotationDelta(
+            [new_table.get_annotation(i) for i in added.tolist()],
+            [table.get_annotation(i) for i in removed.tolist()])
+        self.annotation_table = updated
+        if self.is_loaded('_propagated') and self._propagated is not None:
+            self._propagated.update(
+                self.graph, updated,
+                [self.graph.id2idx[id_] for id_ in delta.term_ids])
+            self._gene_sets = {}
+        self.set_lazy(['_similarity', '_gene_similarity'],
+                      _get_term_similarity)
+
+        logger.info('Updated annotations: %d added, %d removed '
+                    '(affecting %d genes and %d GO terms).',
+                    len(delta.added), len(delta.removed),
+                    len(delta.genes), len(delta.term_ids))
+        return delta
+
+    @staticmethod
+    def _iter_annotation_records(annotation_file, annotation_filter,
+                                 db_sel):
+        """Yields the valid annotations in a GAF file as tuples."""
         with misc.smart_open_read(annotation_file, mode='rb',
                                   try_gzip=True) as fh:
-            reader = csv.reader(fh, dialect='excel-tab', encoding='UTF-8')
-            for i, l in enumerate(reader):
-                # gene = None
-
-                if not l:
-                    continue
-                if ((not db_sel) or l[0] == db_sel) and l[3] != 'NOT':
-                    n += 1
-
-                    # test if evidence code is excluded
-                    if (select_evidence and l[6] not in select_evidence) \
-                            or l[6] in exclude_evidence:
-                        excluded_evidence_annotations += 1
-                        continue
-
-                    # test if reference is excluded
-                    db_ref = []
-                    if l[5]:
-                        db_ref = l[5].split('|')
-                        if len(db_ref) == 1 and db_ref[0] in exclude_ref:
-                            excluded_reference_annotations += 1
-                            continue
-                            
-                    # determine target gene
-                    if not l[2]:
-                        raise Exception('Missing target gene in line %d:\n%s'
-                                        % (i+1, '\t'.join(l)))
-
-                    gene = l[2]
-                    # db = l[0]
-                    db_id = l[1]
-                    if strip_species:
-                        try:
-                            gene = gene[:gene.rindex('_')]
-                        except ValueError:
-                            pass
-
-                    term_id = l[4]
-                    evidence = l[6]
-
-                    invalid = False
-
-                    if (ignore_case and gene.upper() not in genes_upper) \
-                            or ((not ignore_case) and gene not in self.genes):
-                        unknown_gene_annotations += 1
-                        unknown_gene_names[l[2]] += 1
-                        invalid = True
-
-                    if term_id not in self.terms:
-                        unknown_term_annotations += 1
-                        unknown_term_ids[term_id] += 1
-                        invalid = True
-
-                    if not invalid:
-                
-                        valid_annotations += 1
-
-                        # if ignore_case, convert gene to "original" name
-                        if ignore_case:
-                            gene = genes_upper[gene.upper()]
-
-                        term = self.terms[term_id]
-
-                        # parse secondary information
-                        # (associated UniProt and PubMed entries)
-                        # pmid = pmid_pattern.search(l[5])
-                        # if pmid is not None: pmid = pmid.group(0)
-                        # uniprot = uniprot_pattern.search(l[7])
-                        # if uniprot is not None: uniprot = uniprot.group(1)
-                        with_ = []
-                        if l[7]:
-                            with_ = l[7].split('|')
-
-                        # generate annotation
-                        ann = GOAnnotation(
-                            gene=gene, term=term,
-                            evidence=evidence, db_id=db_id,
-                            db_ref=db_ref, with_=with_)
-
-                        # add annotation to global list
-                        self.annotations.append(ann)
-
-                        # add annotation under term ID
-                        self.term_annotations[term_id].append(ann)
-
-                        # add annotation under gene
-                        self.gene_annotations[gene].append(ann)
-                        gene_terms[gene].add(term_id)
-
-        # output some statistics
+            for record in annotation_filter.filter_gaf(fh, db_sel):
+                yield record
+
+    @staticmethod
+    def _log_annotation_statistics(annotation_filter):
+        """Reports the statistics collected by an `AnnotationFilter`."""
+        n = annotation_filter.num_positive
         if n > 0:
             logger.info('Parsed %d positive GO annotations '
                         '(%d = %.1f%% excluded based on evidence type).',
-                        n, excluded_evidence_annotations,
-                        100*(excluded_evidence_annotations/float(n)))
+                        n, annotation_filter.num_excluded_evidence,
+                        100*(annotation_filter.num_excluded_evidence /
+                             float(n)))
 
-        if unknown_gene_annotations > 0:
+        if annotation_filter.num_unknown_gene > 0:
             logger.warning('Warning: %d annotations with %d unkonwn gene '
-                           'names.',
-                           unknown_gene_annotations, len(unknown_gene_names))
+                           'names.', annotation_filter.num_unknown_gene,
+                           len(annotation_filter.unknown_gene_names))
 
-        if unknown_term_annotations > 0:
+        if annotation_filter.num_unknown_term > 0:
             logger.warning('Warning: %d annotations with %d unkonwn term IDs.',
-                           unknown_term_annotations, len(unknown_term_ids))
+                           annotation_filter.num_unknown_term,
+                           len(annotation_filter.unknown_term_ids))
 
         logger.info('Found a total of %d valid annotations.',
-                    valid_annotations)
+                    annotation_filter.num_valid)
 
-        logger.info('%d unique Gene-Term associations.',
-                    sum(len(gene_terms[g]) for g in genes))
+    def iter_annotations(
+            self, annotation_file, genes=None, db_sel='UniProtKB',
+            select_evidence=None, exclude_evidence=None,
+            exclude_ref=None, strip_species=False, ignore_case=False):
+        """Iterate over the valid annotations in a GO annotation file.
+
+        This function applies the same filters as `parse_annotations`, but
+        reads the file in a single pass and yields the annotations one at a
+        time, without storing them. Previously parsed annotations are not
+        affected.
+
+        Parameters
+        ----------
+        annotation_file: str
+            Path of the annotation file (in GAF 2.0 format).
+        genes: List (tuple, set) of str, optional
+            List of valid gene names. If not specified, annotations of all
+            genes are included.
+        db_sel: str, optional
+            Select only annotations with this ``DB`` (column 1) value.
+            If empty, disable filtering based on the ``DB`` value.
+        select_evidence: list of str, optional
+            Only include annotations with the given evidence codes.
+        exclude_evidence: list of str, optional
+            Exclude all annotations with any of the given evidence codes.
+        exclude_ref: list of str, optional
+            Exclude all annotations with the given DB:reference (column 6).
+        strip_species: bool, optional
+            See `parse_annotations`.
+        ignore_case: bool, optional
+            See `parse_annotations`.
+
+        Yields
+        ------
+        GOAnnotation
+            The valid annotations, in the order of the file.
+        """
+        assert isinstance(annotation_file, str)
+
+        if not self.terms:
+            raise ValueError('You need to first parse an OBO file!')
+
+        annotation_filter = AnnotationFilter(
+            genes, self.graph.ids, select_evidence=select_evidence,
+            exclude_evidence=exclude_evidence, exclude_ref=exclude_ref,
+            strip_species=strip_species, ignore_case=ignore_case)
+
+        for gene, term_id, evidence, db_id, db_ref, with_ in \
+                self._iter_annotation_records(
+                    annotation_file, annotation_filter, db_sel):
+            yield GOAnnotation(gene=gene, term=self.terms[term_id],
+                               evidence=evidence, db_id=db_id,
+                               db_ref=db_ref, with_=with_)
+
+        self._log_annotation_statistics(annotation_filter)
+
+    def _check_ancestor_index(self):
+        if not self._flattened:
+            raise ValueError('Ancestor queries require the transitive '
+                             'closure of the GO term graph. Parse the '
+                             'ontology with flatten=True.')
+
+    def _get_term_indices(self, ids):
+        """Converts GO term IDs to GO term indices."""
+        return [self.terms[id_].index for id_ in ids]
+
+    def get_common_ancestors(self, ids, include_self=False):
+        """Return the common ancestors of several GO terms.
+
+        Parameters
+        ----------
+        ids: Iterable of str
+            The GO term IDs.
+        include_self: bool, optional
+            Whether to treat each GO term as one of its own ancestors.
+
+        Returns
+        -------
+        frozenset of `GOTerm`
+            The common ancestors.
+        """
+        return self.get_common_ancestors_many([ids], include_self)[0]
+
+    def get_common_ancestors_many(self, groups, include_self=False):
+        """Return the common ancestors of each of many groups of GO terms.
+
+        This is the batch version of `get_common_ancestors`.
+
+        Parameters
+        ----------
+        groups: Iterable of (Iterable of str)
+            The GO term IDs of each group.
+        include_self: bool, optional
+            Whether to treat each GO term as one of its own ancestors.
+
+        Returns
+        -------
+        list of (frozenset of `GOTerm`)
+            The common ancestors of each group.
+
+        Raises
+        ------
+        ValueError
+            If the ontology was parsed with ``flatten=False``.
+        """
+        self._check_ancestor_index()
+        groups = [self._get_term_indices(ids) for ids in groups]
+        terms = self.terms
+        ids = self.graph.ids
+        return [frozenset(terms[ids[i]] for i in r.tolist()) for r in
+                self._ancestor_index.get_common_ancestors_many(
+                    groups, include_self)]
+
+    def get_lowest_common_ancestors(self, ids, include_self=False):
+        """Return the most specific common ancestors of several GO terms.
+
+        These are the common ancestors that are not an ancestor of any other
+        common ancestor.
+
+        Parameters
+        ----------
+        ids: Iterable of str
+            The GO term IDs.
+        include_self: bool, optional
+            Whether to treat each GO term as one of its own ancestors.
+
+        Returns
+        -------
+        list of `GOTerm`
+            The lowest common ancestors, sorted by decreasing depth (see
+            :class:`goparser.ancestry.AncestorIndex`).
+        """
+        return self.get_lowest_common_ancestors_many([ids], include_self)[0]
+
+    def get_lowest_common_ancestors_many(self, groups, include_self=False):
+        """Return the most specific common ancestors of many groups of GO
+        terms.
+
+        This is the batch version of `get_lowest_common_ancestors`.
+
+        Parameters
+        ----------
+        groups: Iterable of (Iterable of str)
+            The GO term IDs of each group.
+        include_self: bool, optional
+            Whether to treat each GO term as one of its own ancestors.
+
+        Returns
+        -------
+        list of (list of `GOTerm`)
+            The lowest common ancestors of each group, sorted by decreasing
+            depth.
+
+        Raises
+        ------
+        ValueError
+            If the ontology was parsed with ``flatten=False``.
+        """
+        self._check_ancestor_index()
+        groups = [self._get_term_indices(ids) for ids in groups]
+        terms = self.terms
+        ids = self.graph.ids
+        return [[terms[ids[i]] for i in r.tolist()] for r in
+                self._ancestor_index.get_lowest_common_ancestors_many(
+                    groups, include_self)]
+
+    def get_term_depth(self, id_):
+        """Return the depth of a GO term.
+
+        Parameters
+        ----------
+        id_: str
+            GO term ID of the GO term.
+
+        Returns
+        -------
+        int
+            The length of the longest path from the root term of the domain
+            to the GO term.
+
+        Raises
+        ------
+        ValueError
+            If the ontology was parsed with ``flatten=False``.
+        """
+        self._check_ancestor_index()
+        return int(self._ancestor_index.depth[self.terms[id_].index])
 
     def get_gene_goterms(self, gene, ancestors=False):
         """Return all GO terms a particular gene is annotated with.
@@ -683,18 +1096,67 @@ class GOParser(object):
         -----
         If a gene is annotated with a particular GO term, it can also be
         considered annotated with all ancestors of that GO term.
+
+        See `get_gene_goterm_ids` and `get_gene_goterm_indices` for faster
+        alternatives that do not create `GOTerm` objects.
+        """
+        ids = self.graph.ids
+        terms = self.terms
+        indices = self.get_gene_goterm_indices(gene, ancestors)
+        return frozenset(terms[ids[i]] for i in indices.tolist())
+
+    def get_gene_goterm_ids(self, gene, ancestors=False):
+        """Return the IDs of all GO terms a particular gene is annotated with.
+
+        Parameters
+        ----------
+        gene: str
+            The gene symbol of the gene.
+        ancestors: bool, optional
+            If set to True, also return the IDs of all ancestor GO terms.
+
+        Returns
+        -------
+        frozenset of str
+            The IDs of the GO terms the gene is annotated with.
+        """
+        ids = self.graph.ids
+        indices = self.get_gene_goterm_indices(gene, ancestors)
+        return frozenset(ids[i] for i in indices.tolist())
+
+    def get_gene_goterm_indices(self, gene, ancestors=False):
+        """Return the indices of all GO terms a gene is annotated with.
+
+        Parameters
+        ----------
+        gene: str
+            The gene symbol of the gene.
+        ancestors: bool, optional
+            If set to True, also return the indices of all ancestor GO terms.
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The sorted indices (see `GOGraph`) of the GO terms the gene is
+            annotated with. The array must not be modified.
+
+        Notes
+        -----
+        With ``ancestors`` set to True, the result is a slice of the
+        propagated annotations of all genes, which are determined the first
+        time they are needed (see
+        :class:`goparser.propagation.PropagatedAnnotations`).
         """
-        annotations = self.gene_annotations[gene]
-        terms = set(ann.term for ann in annotations)
+        table = self.annotation_table
+        if table is None:
+            raise KeyError(gene)
+        gene_idx = table.gene2idx[gene]
 
         if ancestors:
             assert self._flattened
-            ancestor_terms = set()
-            for t in terms:
-                ancestor_terms.update(self.terms[id_] for id_ in t.ancestors)
-            terms |= ancestor_terms
+            return self._propagated.get_terms(gene_idx)
 
-        return frozenset(terms)
+        return table.get_gene_terms(gene_idx)
 
     def get_goterm_genes(self, id_, descendants=True):
         """Return all genes that are annotated with a particular GO term.
@@ -710,24 +1172,465 @@ class GOParser(object):
 
         Returns
         -------
+        frozenset of str
+            The genes annotated with the GO term.
+
         Notes
+        -----
+        The genes annotated with each GO term or any of its descendants are
+        determined for all GO terms at once, the first time they are needed
+        (see :class:`goparser.propagation.PropagatedAnnotations`).
         """
-
-        # determine which terms to include
         main_term = self.terms[id_]
-        check_terms = {main_term, }
+        table = self.annotation_table
+        if table is None:
+            return frozenset()
 
         if descendants:
+            # use the precomputed propagated annotations
             assert self._flattened
-            check_terms.update([self.terms[id_]
-                                for id_ in main_term.descendants])
+            gene_indices = self._propagated.get_genes(main_term.index)
+        else:
+            gene_indices = table.get_term_genes([main_term.index])
+
+        genes = table.genes
+        return frozenset(genes[i] for i in gene_indices.tolist())
+
+    @staticmethod
+    def _csr_to_dict(keys, indptr, indices, values):
+        """Converts a CSR structure to a dictionary of frozensets."""
+        values = list(values)
+        indptr = indptr.tolist()
+        indices = indices.tolist()
+        return dict((k, frozenset(values[j] for j in
+                                  indices[indptr[i]:indptr[i+1]]))
+                    for i, k in enumerate(keys))
+
+    def get_goterm_genes_many(self, ids, descendants=True, as_dict=False):
+        """Return the genes annotated with each of several GO terms.
+
+        This is the batch version of `get_goterm_genes`.
+
+        Parameters
+        ----------
+        ids: Iterable of str
+            The GO term IDs.
+        descendants: bool, optional
+            If set to False, only return genes that are directly annotated with
+            the GO terms. By default, also genes annotated with any descendant
+            term are returned.
+        as_dict: bool, optional
+            If set to True, return a dictionary instead of a CSR structure.
+
+        Returns
+        -------
+        indptr: `numpy.ndarray` of int64
+            Offsets of the genes of each GO term (in the order of ``ids``).
+        indices: `numpy.ndarray` of int32
+            The sorted codes of the genes of each GO term, i.e., their
+            indices in ``annotation_table.genes``.
+        -- or --
+        dict [str:frozenset of str]
+            If ``as_dict`` is True, a mapping of the GO term IDs to the genes
+            annotated with them.
+        """
+        ids = list(ids)
+        id2idx = self.graph.id2idx
+        term_indices = np.array([id2idx[id_] for id_ in ids], dtype=np.int64)
+
+        table = self.annotation_table
+        if table is None:
+            indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+            indices = np.empty(0, dtype=np.int32)
+            genes = []
+        else:
+            if descendants:
+                assert self._flattened
+                csr = (self._propagated.term_indptr,
+                       self._propagated.term_genes)
+            else:
+                csr = get_direct_genes(table, self.graph.n)
+            indptr, indices = take_csr(csr[0], csr[1], term_indices)
+            genes = table.genes
+
+        if as_dict:
+            return self._csr_to_dict(ids, indptr, indices, genes)
+        return indptr, indices
+
+    def get_gene_goterms_many(self, genes, ancestors=False, as_dict=False):
+        """Return the GO terms that each of several genes is annotated with.
+
+        This is the batch version of `get_gene_goterms`.
+
+        Parameters
+        ----------
+        genes: Iterable of str
+            The gene symbols.
+        ancestors: bool, optional
+            If set to True, also return all ancestor GO terms.
+        as_dict: bool, optional
+            If set to True, return a dictionary instead of a CSR structure.
+
+        Returns
+        -------
+        indptr: `numpy.ndarray` of int64
+            Offsets of the GO terms of each gene (in the order of ``genes``).
+        indices: `numpy.ndarray` of int32
+            The sorted indices (see `GOGraph`) of the GO terms of each gene.
+        -- or --
+        dict [str:frozenset of str]
+            If ``as_dict`` is True, a mapping of the genes to the IDs of the
+            GO terms they are annotated with.
+        """
+        genes = list(genes)
+        table = self.annotation_table
+        if table is None:
+            if genes:
+                raise KeyError(genes[0])
+            indptr = np.zeros(1, dtype=np.int64)
+            indices = np.empty(0, dtype=np.int32)
+        else:
+            gene2idx = table.gene2idx
+            gene_indices = np.array([gene2idx[g] for g in genes],
+                                    dtype=np.int64)
+            if ancestors:
+                assert self._flattened
+                csr = (self._propagated.gene_indptr,
+                       self._propagated.gene_terms)
+            else:
+                indptr, indices = get_direct_genes(table, self.graph.n)
+                csr = transpose_csr(indptr, indices, len(table.genes))
+            indptr, indices = take_csr(csr[0], csr[1], gene_indices)
+
+        if as_dict:
+            return self._csr_to_dict(genes, indptr, indices, self.graph.ids)
+        return indptr, indices
+
+    def _get_term_domain_mask(self, domains):
+        """Determines which GO terms belong to any of the given domains."""
+        short2long = dict((v, k) for k, v in GOTerm._short_domain.items())
+        domains = set(short2long.get(d, d) for d in domains)
+        ids = self.graph.ids
+        return np.array([self.terms[id_].domain in domains for id_ in ids],
+                        dtype=np.bool_)
+
+    def to_incidence_matrix(self, propagate=True, evidence=None,
+                            domains=None, dtype=np.float64):
+        """Return the annotations as a sparse gene-by-GO term matrix.
+
+        The matrix is built directly from the annotation table and from the
+        propagated annotations (or the closure of the GO term graph), without
+        creating any Python objects per annotation.
+
+        Parameters
+        ----------
+        propagate: bool, optional
+            If set to True, consider each gene annotated with all ancestors
+            of the GO terms it is annotated with.
+        evidence: list of str, optional
+            Only use annotations with these evidence codes. If not specified,
+            use all annotations.
+        domains: list of str, optional
+            Only include GO terms from these domains (either full names,
+            e.g. "biological_process", or abbreviations, e.g. "BP"). If not
+            specified, include GO terms from all domains.
+        dtype: `numpy.dtype`, optional
+            The data type of the matrix.
+
+        Returns
+        -------
+        matrix: `scipy.sparse.csr_matrix`
+            The incidence matrix, with ones indicating that a gene (row) is
+            annotated with a GO term (column). The column indices of each row
+            are sorted.
+        genes: `numpy.ndarray` of int32
+            The gene codes (indices in ``annotation_table.genes``) of the
+            rows.
+        terms: `numpy.ndarray` of int32
+            The GO term indices (indices in ``graph.ids``) of the columns.
+
+        Raises
+        ------
+        ImportError
+            If SciPy is not installed.
+        ValueError
+            If no annotations have been parsed.
+        """
+        try:
+            from scipy import sparse
+        except ImportError:
+            raise ImportError('Exporting an incidence matrix requires SciPy '
+                              '(e.g., "pip install goparser[sparse]").')
+
+        table = self.annotation_table
+        if table is None:
+            raise ValueError('You need to first parse a gene association '
+                             'file!')
+
+        num_genes = len(table.genes)
+        num_terms = self.graph.n
+        if propagate:
+            assert self._flattened
+
+        if propagate and evidence is None:
+            # use the precomputed propagated annotations
+            indptr = self._propagated.gene_indptr
+            indices = self._propagated.gene_terms
+        else:
+            gene = table.gene
+            term = table.term
+            if evidence is not None:
+                evidence = set(evidence)
+                selected = np.array([e in evidence
+                                     for e in table.evidence_codes] or [0],
+                                    dtype=np.bool_)
+                sel = selected[table.evidence]
+                gene = gene[sel]
+                term = term[sel]
+            pairs = np.unique(gene.astype(np.int64) * num_terms + term)
+            indptr = np.zeros(num_genes + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum(np.bincount(pairs // num_terms,
+                                               minlength=num_genes))
+            indices = (pairs % num_terms).astype(np.int32)
+
+        matrix = sparse.csr_matrix(
+            (np.ones(indices.size, dtype=dtype), indices, indptr),
+            shape=(num_genes, num_terms))
+
+        if propagate and evidence is not None:
+            # multiply with the (reflexive) ancestor matrix
+            anc_indptr, anc_indices = self.graph.ancestors
+            closure = sparse.csr_matrix(
+                (np.ones(anc_indices.size, dtype=dtype), anc_indices,
+                 anc_indptr), shape=(num_terms, num_terms)) + \
+                sparse.identity(num_terms, dtype=dtype, format='csr')
+            matrix = matrix.dot(closure).tocsr()
+            matrix.data[:] = 1
+            matrix.sort_indices()
+
+        terms = np.arange(num_terms, dtype=np.int32)
+        if domains is not None:
+            terms = np.nonzero(self._get_term_domain_mask(domains))[0]
+            terms = terms.astype(np.int32)
+            matrix = matrix[:, terms]
+
+        return matrix, np.arange(num_genes, dtype=np.int32), terms
+
+    def _check_similarity(self):
+        if self.annotation_table is None:
+            raise ValueError('You need to first parse a gene association '
+                             'file!')
+        assert self._flattened
+
+    def get_information_content(self, id_):
+        """Return the information content of a GO term.
+
+        The information content is the negative logarithm of the fraction of
+        genes annotated with the GO term (or any of its descendants), among
+        all genes annotated with a GO term of the same domain.
+
+        Parameters
+        ----------
+        id_: str
+            GO term ID of the GO term.
+
+        Returns
+        -------
+        float
+            The information content (NaN if no genes are annotated with the
+            GO term).
+        """
+        self._check_similarity()
+        return float(self._similarity.ic[self.terms[id_].index])
+
+    def get_term_similarity(self, id1, id2, method='lin'):
+        """Return the semantic similarity of two GO terms.
+
+        Parameters
+        ----------
+        id1: str
+            GO term ID of the first GO term.
+        id2: str
+            GO term ID of the second GO term.
+        method: str, optional
+            The similarity measure ("resnik", "lin", or "jiang"). See
+            :class:`goparser.similarity.TermSimilarity`.
+
+        Returns
+        -------
+        float
+            The similarity.
+        """
+        return float(self.get_term_similarity_many([(id1, id2)], method)[0])
+
+    def get_term_similarity_many(self, pairs, method='lin'):
+        """Return the semantic similarities of many pairs of GO terms.
+
+        This is the batch version of `get_term_similarity`.
 
-        # get annotations of all included terms
-        genes = set()
-        for term in check_terms:
-            genes.update(ann.gene for ann in self.term_annotations[term.id])
+        Parameters
+        ----------
+        pairs: Iterable of (str, str) tuples
+            The GO term IDs of each pair.
+        method: str, optional
+            The similarity measure ("resnik", "lin", or "jiang").
+
+        Returns
+        -------
+        `numpy.ndarray` of float64
+            The similarity of each pair.
+        """
+        self._check_similarity()
+        id2idx = self.graph.id2idx
+        indices = np.array([(id2idx[id1], id2idx[id2]) for id1, id2 in pairs],
+                           dtype=np.int64).reshape(-1, 2)
+        return self._similarity.get_scores(indices[:, 0], indices[:, 1],
+                                           method)
+
+    def term_similarity_matrix(self, domain, method='lin', n_jobs=1,
+                               ofn=None):
+        """Return the semantic similarities of all pairs of GO terms.
+
+        The matrix is computed in blocks, in parallel, and is stored in a
+        memory-mapped file (see
+        :func:`goparser.similarity.compute_similarity_matrix`).
+
+        Parameters
+        ----------
+        domain: str
+            The domain of the GO terms (either the full name, e.g.
+            "biological_process", or the abbreviation, e.g. "BP").
+        method: str, optional
+            The similarity measure ("resnik", "lin", or "jiang").
+        n_jobs: int, optional
+            The number of worker processes.
+        ofn: str, optional
+            Path of the file to store the matrix in. If not specified, a
+            temporary file is used.
+
+        Returns
+        -------
+        matrix: `numpy.memmap` of float32
+            The (symmetric) similarity matrix.
+        ids: list of str
+            The GO term IDs of the rows and columns of the matrix.
+        """
+        self._check_similarity()
+        terms = np.nonzero(self._get_term_domain_mask([domain]))[0]
+        matrix = compute_similarity_matrix(
+            self._similarity, terms, method=method, ofn=ofn, n_jobs=n_jobs)
+        ids = self.graph.ids
+        return matrix, [ids[i] for i in terms.tolist()]
+
+    def _get_gene_similarity(self, method, domain):
+        """Returns the (cached) `GeneSimilarity` object for a measure."""
+        self._check_similarity()
+        if domain is not None:
+            domain = GOTerm._short_domain.get(domain, domain)
+        key = (method, domain)
+        try:
+            return self._gene_similarity[key]
+        except KeyError:
+            pass
+        mask = None
+        if domain is not None:
+            mask = self._get_term_domain_mask([domain])
+        gene_similarity = GeneSimilarity.from_table(
+            self._similarity, self.annotation_table, mask, method)
+        self._gene_similarity[key] = gene_similarity
+        return gene_similarity
+
+    def get_gene_similarity(self, gene1, gene2, method='lin',
+                            aggregate='bma', domain=None):
+        """Return the functional similarity of two genes.
+
+        Parameters
+        ----------
+        gene1: str
+            The gene symbol of the first gene.
+        gene2: str
+            The gene symbol of the second gene.
+        method: str, optional
+            The term similarity measure ("resnik", "lin", or "jiang").
+        aggregate: str, optional
+            The method for combining the similarities of the GO terms of the
+            genes ("bma", "max", or "avg"). See
+            :class:`goparser.similarity.GeneSimilarity`.
+        domain: str, optional
+            Only use GO terms from this domain (either the full name, e.g.
+            "biological_process", or the abbreviation, e.g. "BP"). If not
+            specified, use GO terms from all domains.
+
+        Returns
+        -------
+        float
+            The similarity (NaN if either gene has no annotations).
+        """
+        return float(self.get_gene_similarity_many(
+            [(gene1, gene2)], method, aggregate, domain)[0])
 
-        return frozenset(genes)
+    def get_gene_similarity_many(self, pairs, method='lin', aggregate='bma',
+                                 domain=None):
+        """Return the functional similarities of many pairs of genes.
+
+        This is the batch version of `get_gene_similarity`.
+
+        Parameters
+        ----------
+        pairs: Iterable of (str, str) tuples
+            The gene symbols of each pair.
+        method: str, optional
+            The term similarity measure ("resnik", "lin", or "jiang").
+        aggregate: str, optional
+            The aggregation method ("bma", "max", or "avg").
+        domain: str, optional
+            Only use GO terms from this domain.
+
+        Returns
+        -------
+        `numpy.ndarray` of float64
+            The similarity of each pair.
+        """
+        gene_similarity = self._get_gene_similarity(method, domain)
+        gene2idx = self.annotation_table.gene2idx
+        genes = np.array([(gene2idx[g1], gene2idx[g2]) for g1, g2 in pairs],
+                         dtype=np.int64).reshape(-1, 2)
+        return gene_similarity.get_scores(genes[:, 0], genes[:, 1],
+                                          aggregate)
+
+    def gene_similarity_matrix(self, genes1, genes2=None, method='lin',
+                               aggregate='bma', domain=None, n_jobs=1):
+        """Return the functional similarities of all pairs of genes.
+
+        Parameters
+        ----------
+        genes1: list of str
+            The gene symbols of the rows.
+        genes2: list of str, optional
+            The gene symbols of the columns. If not specified, use
+            ``genes1``.
+        method: str, optional
+            The term similarity measure ("resnik", "lin", or "jiang").
+        aggregate: str, optional
+            The aggregation method ("bma", "max", or "avg").
+        domain: str, optional
+            Only use GO terms from this domain.
+        n_jobs: int, optional
+            The number of worker processes.
+
+        Returns
+        -------
+        `numpy.ndarray` of float64
+            The similarity matrix.
+        """
+        gene_similarity = self._get_gene_similarity(method, domain)
+        gene2idx = self.annotation_table.gene2idx
+        first = np.array([gene2idx[g] for g in genes1], dtype=np.int64)
+        if genes2 is None:
+            second = first
+        else:
+            second = np.array([gene2idx[g] for g in genes2], dtype=np.int64)
+        return gene_similarity.get_matrix(first, second, aggregate, n_jobs)
 
     def get_gene_sets(self, min_genes=None, max_genes=None):
         """Return the set of annotated genes for each GO term.
@@ -743,8 +1646,53 @@ class GOParser(object):
         -------
         GeneSetCollection
             A gene set "database" with one gene set for each GO term.
+
+        Notes
+        -----
+        The gene sets and the redundant GO terms are cached until the
+        ontology or the annotations change, so that repeated calls with
+        different values for ``min_genes`` and ``max_genes`` only need to
+        select the gene sets.
         """
 
+        ids = self._select_gene_set_terms(min_genes, max_genes)
+
+        # gene sets are cached, so that calls with different size bounds only
+        # have to select them
+        propagated = self._propagated
+        cache = self._gene_sets
+        genes = self.annotation_table.genes
+        gene_sets = []
+        for id_ in ids:
+            term = self.terms[id_]
+            j = term.index
+            try:
+                gs = cache[j]
+            except KeyError:
+                tg = frozenset(genes[i] for i in
+                               propagated.get_genes(j).tolist())
+                name = term.name
+                source = 'GO'
+                coll = term.domain_short
+                desc = term.definition
+                gs = GeneSet(id_, name, tg, source=source,
+                             collection=coll, description=desc)
+                cache[j] = gs
+            gene_sets.append(gs)
+
+        D = GeneSetCollection(gene_sets)
+        logger.info('# terms retained: %d', D.n)
+
+        return D
+
+    def _select_gene_set_terms(self, min_genes=None, max_genes=None):
+        """Selects the GO terms used as gene sets (see `get_gene_sets`).
+
+        Returns
+        -------
+        list of str
+            The sorted IDs of the selected GO terms.
+        """
         if not self.terms:
             raise ValueError('You need to first parse both an OBO file and '
                              'a gene association file!')
@@ -753,74 +1701,106 @@ class GOParser(object):
             raise ValueError('You need to first parse a gene association '
                              'file!')
 
-        all_term_ids = sorted(self.terms.keys())
-
-        # go over all GO terms and get associated genes
+        # the genes of all GO terms are determined in a single bottom-up pass
+        # over the GO term graph (see `PropagatedAnnotations`)
         logger.info('Obtaining GO term associations...')
-        # n = len(all_term_ids)
-        # term_gene_counts = []
-        # term_ids = []
-
-        term_genes = OrderedDict()
-        geneset_terms = {}
-        gene_sets = []
-        for j, id_ in enumerate(all_term_ids):
-            tg = self.get_goterm_genes(id_)
-            assert isinstance(tg, frozenset)
-            c = len(tg)
-
-            if c == 0:
-                continue
-
-            if (min_genes is not None and c < min_genes) or \
-                    (max_genes is not None and c > max_genes):
-                # term doesn't meet min/max number of genes criteria
-                continue
-
-            # for finding redundant terms (use set of genes as key)
-            try:
-                geneset_terms[tg].append(id_)
-            except KeyError:
-                geneset_terms[tg] = [id_]
+        assert self._flattened
+        propagated = self._propagated
+        counts = propagated.get_counts()
+        valid = counts > 0
+        if min_genes is not None:
+            valid &= (counts >= min_genes)
+        if max_genes is not None:
+            valid &= (counts <= max_genes)
+
+        # terms with identical gene sets are determined once, and a term is
+        # excluded if it is an ancestor of another term in its group
+        logger.info('Finding redundant GO terms...')
+        redundant, excluded = propagated.get_redundant_terms(self.graph)
+        logger.info('# terms selected intially: %d', int(np.sum(valid)))
+        logger.info('# terms with redundant gene sets: %d',
+                    int(np.sum(redundant[valid])))
+        logger.info('# terms excluded due to redundancy: %d',
+                    int(np.sum(excluded[valid])))
+
+        # keep all terms that are not redundant with any other term, or that
+        # aren't the ancestor of any redundant term
+        valid &= ~excluded
+        return [id_ for id_ in sorted(self.terms.keys())
+                if valid[self.terms[id_].index]]
+
+    def get_enrichment_analysis(self, background=None, min_genes=None,
+                                max_genes=None):
+        """Prepare a GO enrichment analysis.
+
+        The GO terms (and their genes) are selected in the same way as by
+        `get_gene_sets`. The returned object can be used to test any number
+        of gene lists for enrichment.
 
-            term_genes[id_] = tg
+        Parameters
+        ----------
+        background: Iterable of str, optional
+            The background genes. If not specified, use all valid genes (see
+            `parse_annotations`). Genes that are not valid are ignored.
+        min_genes: int, optional
+            Exclude GO terms with fewer than this number of genes.
+        max_genes: int, optional
+            Exclude GO terms with more than this number of genes.
 
-        selected = len(term_genes)
-        affected = 0
-        excl = 0
-        for id_, tg in term_genes.items():
+        Returns
+        -------
+        `enrichment.EnrichmentAnalysis`
+            The enrichment analysis.
 
-            # check if there are redundant terms
-            term = self.terms[id_]
-            if len(geneset_terms[tg]) > 1:
-                gt = geneset_terms[tg]
-                affected += 1
-                # check if this term is an ancestor of any of them
-                # if so, exclude it
-                excluded = False
-                for other_id in gt:
-                    if (other_id != id_) and (other_id in term.descendants):
-                        excluded = True
-                        break
-                if excluded:
-                    excl += 1
-                    continue
-
-            # if the term is not redundant with any other term,
-            # or if it isn't the ancestor of any redundant term,
-            # add its gene set to the list
-            name = term.name
-            source = 'GO'
-            coll = term.domain_short
-            desc = term.definition
-            gs = GeneSet(id_, name, tg, source=source,
-                         collection=coll, description=desc)
-            gene_sets.append(gs)
+        Raises
+        ------
+        ImportError
+            If SciPy is not installed.
+        ValueError
+            If the background does not contain any valid genes.
+        """
+        ids = self._select_gene_set_terms(min_genes, max_genes)
+        table = self.annotation_table
+        if background is None:
+            background = np.arange(len(table.genes), dtype=np.int32)
+        else:
+            gene2idx = table.gene2idx
+            background = np.unique(np.array(
+                [gene2idx[g] for g in background if g in gene2idx],
+                dtype=np.int32))
+        if background.size == 0:
+            raise ValueError('The background does not contain any valid '
+                             'genes.')
+        terms = np.array([self.terms[id_].index for id_ in ids],
+                         dtype=np.int32)
+        return EnrichmentAnalysis.from_propagated(
+            self._propagated, terms, ids, table.genes, table.gene2idx,
+            background)
+
+    def test_enrichment(self, queries, background=None, min_genes=None,
+                        max_genes=None, correction='fdr_bh'):
+        """Test gene lists for enrichment of GO terms.
+
+        See `get_enrichment_analysis` and `EnrichmentAnalysis.test`.
 
-        D = GeneSetCollection(gene_sets)
-        logger.info('# terms selected intially: %d', selected)
-        logger.info('# terms with redundant gene sets: %d', affected)
-        logger.info('# terms excluded due to redundancy: %d', excl)
-        logger.info('# terms retained: %d', D.n)
+        Parameters
+        ----------
+        queries: list of (Iterable of str)
+            The gene lists.
+        background: Iterable of str, optional
+            The background genes. If not specified, use all valid genes.
+        min_genes: int, optional
+            Exclude GO terms with fewer than this number of genes.
+        max_genes: int, optional
+            Exclude GO terms with more than this number of genes.
+        correction: str or None, optional
+            The multiple testing correction ("fdr_bh" or "bonferroni").
 
-        return D
+        Returns
+        -------
+        `enrichment.EnrichmentResult`
+            The results for all gene lists and GO terms.
+        """
+        analysis = self.get_enrichment_analysis(background, min_genes,
+                                                max_genes)
+        return analysis.test(queries, correction=correction)
@@ -0,0 +1,409 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Module containing the `PropagatedAnnotations` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from .graph import build_csr, replace_csr_rows, take_csr, transpose_csr
+
+logger = logging.getLogger(__name__)
+
+_GOLDEN = np.uint64(0x9e3779b97f4a7c15)
+
+
+def _mix64(x):
+    """Scrambles 64-bit integers (the finalizer of SplitMix64)."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def get_direct_genes(table, n):
+    """Determines the genes directly annotated with each GO term.
+
+    Parameters
+    ----------
+    table: `AnnotationTable`
+        The annotations.
+    n: int
+        The number of GO terms.
+
+    Returns
+    -------
+    indptr: `numpy.ndarray` of int64
+        Row offsets.
+    indices: `numpy.ndarray` of int32
+        Sorted gene codes of each GO term.
+    """
+    num_genes = max(len(table.genes), 1)
+    pairs = np.unique(table.term.astype(np.int64) * num_genes + table.gene)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(pairs // num_genes, minlength=n))
+    return indptr, (pairs % num_genes).astype(np.int32)
+
+
+class PropagatedAnnotations(object):
+
+    """Genes annotated with each GO term or with any of its descendants.
+
+    The gene codes of each GO term are obtained in a single bottom-up pass
+    over the GO term graph, in which the genes of each term are merged with
+    those of its children, and are stored as a CSR (compressed sparse row)
+    structure of sorted gene codes. The transposed structure contains the
+    GO terms that each gene is annotated with, including all ancestors.
+    Queries therefore only take time proportional to the size of the result.
+
+    Instances are created and kept up to date by `GOParser`.
+
+    Parameters
+    ----------
+    term_indptr: `numpy.ndarray` of int64
+        See :attr:`term_indptr` attribute.
+    term_genes: `numpy.ndarray` of int32
+        See :attr:`term_genes` attribute.
+    num_genes: int
+        The number of genes.
+
+    Attributes
+    ----------
+    term_indptr, term_genes: `numpy.ndarray`
+        Offsets and sorted gene codes (see `AnnotationTable`) of each GO
+        term, indexed by GO term index.
+    gene_indptr, gene_terms: `numpy.ndarray`
+        Offsets and sorted GO term indices of each gene, indexed by gene
+        code.
+    """
+
+    def __init__(self, term_indptr, term_genes, num_genes):
+        self.term_indptr = term_indptr
+        self.term_genes = term_genes
+        self.gene_indptr, self.gene_terms = transpose_csr(
+            term_indptr, term_genes, num_genes)
+        self._redundancy = None
+
+    def __repr__(self):
+        return '<PropagatedAnnotations (%d terms, %d genes, %d ' \
+               'associations)>' % (self.term_indptr.size - 1,
+                                   self.gene_indptr.size - 1,
+                                   self.term_genes.size)
+
+    @classmethod
+    def from_table(cls, graph, table):
+        """Propagates the annotations in a table.
+
+        Parameters
+        ----------
+        graph: `GOGraph`
+            The graph of the GO terms.
+        table: `AnnotationTable`
+            The annotations.
+
+        Returns
+        -------
+        `PropagatedAnnotations`
+            The propagated annotations.
+
+        Raises
+        ------
+        ValueError
+            If the relations between the GO terms contain a cycle.
+        """
+        logger.info('Propagating annotations...')
+        rows = [None] * graph.n
+        order = graph.get_topological_order()[::-1]
+        indptr, indices = get_direct_genes(table, graph.n)
+        cls._propagate(rows, graph,
+                       lambda i: indices[indptr[i]:indptr[i+1]],
+                       order.tolist())
+        indptr, indices = build_csr(rows)
+        return cls(indptr, indices, len(table.genes))
+
+    @staticmethod
+    def _propagate(rows, graph, get_direct, order):
+        """Determines the rows of the given terms (children first).
+
+        The rows of the children of these terms must either be among them,
+        or already be stored in ``rows``."""
+        child_indptr, child_indices = graph.get_child_csr()
+        for i in order:
+            children = child_indices[child_indptr[i]:child_indptr[i+1]]
+            genes = get_direct(i)
+            if children.size == 0:
+                rows[i] = genes
+            elif children.size == 1 and genes.size == 0:
+                rows[i] = rows[children[0]]
+            else:
+                rows[i] = np.unique(np.concatenate(
+                    [genes] + [rows[j] for j in children.tolist()]))
+
+    def get_genes(self, term_idx):
+        """Returns the codes of all genes annotated with a GO term.
+
+        Parameters
+        ----------
+        term_idx: int
+            The GO term index.
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The sorted gene codes, including those of genes annotated with
+            any descendant of the GO term.
+        """
+        return self.term_genes[
+            self.term_indptr[term_idx]:self.term_indptr[term_idx+1]]
+
+    def get_terms(self, gene_idx):
+        """Returns the indices of all GO terms a gene is annotated with.
+
+        Parameters
+        ----------
+        gene_idx: int
+            The gene code.
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The sorted GO term indices, including all ancestors of the GO
+            terms the gene is directly annotated with.
+        """
+        return self.gene_terms[
+            self.gene_indptr[gene_idx]:self.gene_indptr[gene_idx+1]]
+
+    def get_counts(self):
+        """Returns the number of genes annotated with each GO term.
+
+        Returns
+        -------
+        `numpy.ndarray` of int64
+            The number of genes (including those of descendants), indexed by
+            GO term index.
+        """
+        return np.diff(self.term_indptr)
+
+    def get_fingerprints(self):
+        """Computes a 64-bit fingerprint of the genes of each GO term.
+
+        GO terms with identical sets of genes have identical fingerprints.
+        Different sets of genes only have the same fingerprint by chance.
+
+        Returns
+        -------
+        `numpy.ndarray` of uint64
+            The fingerprints, indexed by GO term index.
+        """
+        with np.errstate(over='ignore'):
+            mixed = _mix64(self.term_genes.astype(np.uint64) + _GOLDEN)
+            # sums are computed modulo 2^64
+            sums = np.zeros(self.term_genes.size + 1, dtype=np.uint64)
+            np.cumsum(mixed, out=sums[1:])
+            fp = sums[self.term_indptr[1:]] - sums[self.term_indptr[:-1]]
+            return _mix64(fp ^ self.get_counts().astype(np.uint64))
+
+    def get_redundancy_groups(self, term_indices):
+        """Finds GO terms that are annotated with identical sets of genes.
+
+        Candidates are found by comparing fingerprints (see
+        `get_fingerprints`), and then confirmed by comparing their genes.
+
+        Parameters
+        ----------
+        term_indices: `numpy.ndarray` of int
+            The indices of the GO terms to compare.
+
+        Returns
+        -------
+        list of `numpy.ndarray` of int32
+            The groups (of at least two GO terms each) with identical sets of
+            genes. The GO terms in each group are in the order given.
+        """
+        term_indices = np.asarray(term_indices, dtype=np.int32)
+        fp = self.get_fingerprints()[term_indices]
+        order = np.argsort(fp, kind='mergesort')
+        fp = fp[order]
+        # find runs of identical fingerprints
+        bounds = np.flatnonzero(fp[1:] != fp[:-1]) + 1
+        starts = np.r_[0, bounds]
+        ends = np.r_[bounds, fp.size]
+        groups = []
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            if end - start < 2:
+                continue
+            # confirm that the sets of genes are identical
+            candidates = OrderedDict()
+            for i in term_indices[order[start:end]].tolist():
+                key = self.get_genes(i).tobytes()
+                candidates.setdefault(key, []).append(i)
+            groups.extend(np.array(g, dtype=np.int32)
+                          for g in candidates.values() if len(g) > 1)
+        # restore the order given
+        pos = np.empty(self.term_indptr.size - 1, dtype=np.int64)
+        pos[term_indices] = np.arange(term_indices.size)
+        groups = [g[np.argsort(pos[g], kind='mergesort')] for g in groups]
+        groups.sort(key=lambda g: pos[g[0]])
+        return groups
+
+    def get_redundant_terms(self, graph):
+        """Determines the GO terms with the same genes as other GO terms.
+
+        The result is computed the first time this method is called, and is
+        then reused.
+
+        Parameters
+        ----------
+        graph: `GOGraph`
+            The graph of the GO terms (with transitive closure).
+
+        Returns
+        -------
+        redundant: `numpy.ndarray` of bool
+            Flags indicating which GO terms have the same (non-empty) set of
+            genes as at least one other GO term, indexed by GO term index.
+        excluded: `numpy.ndarray` of bool
+            Flags indicating which redundant GO terms are an ancestor of
+            another GO term with the same set of genes, indexed by GO term
+            index.
+
+        Notes
+        -----
+        GO terms with the same set of genes also have the same number of
+        genes, so the flags remain valid if GO terms are selected based on
+        their number of genes.
+        """
+        if self._redundancy is not None:
+            return self._redundancy
+
+        n = self.term_indptr.size - 1
+        redundant = np.zeros(n, dtype=np.bool_)
+        excluded = np.zeros(n, dtype=np.bool_)
+        anc_indptr, anc_indices = graph.ancestors
+        nonempty = np.flatnonzero(self.get_counts() > 0)
+        for group in self.get_redundancy_groups(nonempty):
+            redundant[group] = True
+            # a term is excluded if it is an ancestor of any other term in
+            # its group
+            _, anc = take_csr(anc_indptr, anc_indices, group)
+            anc = np.unique(anc)
+            if anc.size > 0:
+                k = np.minimum(np.searchsorted(anc, group), anc.size - 1)
+                excluded[group[anc[k] == group]] = True
+        self._redundancy = (redundant, excluded)
+        return self._redundancy
+
+    def update(self, graph, table, term_indices):
+        """Updates the propagated annotations after the annotations changed.
+
+        Only the rows of the given GO terms and of their ancestors are
+        recomputed and replaced, and only the rows of genes gained or lost by
+        any of these GO terms are changed in the transposed structure.
+
+        Parameters
+        ----------
+        graph: `GOGraph`
+            The graph of the GO terms.
+        table: `AnnotationTable`
+            The updated annotations (of the same genes).
+        term_indices: Iterable of int
+            The indices of the GO terms whose direct annotations changed.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError
+            If the relations between the GO terms contain a cycle.
+        """
+        # determine the affected terms
+        parent_indptr, parent_indices = graph.get_parent_csr()
+        child_indptr, child_indices = graph.get_child_csr()
+        affected = np.zeros(graph.n, dtype=np.bool_)
+        pending = list(term_indices)
+        while pending:
+            i = pending.pop()
+            if not affected[i]:
+                affected[i] = True
+                pending.extend(parent_indices[
+                    parent_indptr[i]:parent_indptr[i+1]].tolist())
+        terms = np.flatnonzero(affected)
+        if terms.size == 0:
+            return
+
+        # sort the affected terms children first (all parents of affected
+        # terms are affected as well), and collect the rows of unaffected
+        # children
+        rows = {}
+        num_pending = {}
+        for i in terms.tolist():
+            children = child_indices[child_indptr[i]:child_indptr[i+1]]
+            num_pending[i] = int(np.count_nonzero(affected[children]))
+            for j in children[~affected[children]].tolist():
+                rows[j] = self.get_genes(j)
+        order = [i for i, k in num_pending.items() if k == 0]
+        k = 0
+        while k < len(order):
+            i = order[k]
+            for p in parent_indices[
+                    parent_indptr[i]:parent_indptr[i+1]].tolist():
+                num_pending[p] -= 1
+                if num_pending[p] == 0:
+                    order.append(p)
+            k += 1
+        if len(order) < terms.size:
+            raise ValueError('GO term relations contain a cycle.')
+
+        self._propagate(
+            rows, graph,
+            lambda i: np.unique(table.gene[table.get_term_rows(i)]), order)
+        values = [rows[i] for i in terms.tolist()]
+
+        # determine the (gene, term) associations that were lost or gained
+        n = max(graph.n, 1)
+        lost, gained = [], []
+        for i, new in zip(terms.tolist(), values):
+            old = self.get_genes(i)
+            lost.append(np.setdiff1d(old, new, assume_unique=True)
+                        .astype(np.int64) * n + i)
+            gained.append(np.setdiff1d(new, old, assume_unique=True)
+                          .astype(np.int64) * n + i)
+        lost = np.unique(np.concatenate(lost))
+        gained = np.unique(np.concatenate(gained))
+
+        self.term_indptr, self.term_genes = replace_csr_rows(
+            self.term_indptr, self.term_genes, terms, values)
+
+        # update the rows of the genes that lost or gained terms
+        genes = np.union1d(lost // n, gained // n)
+        if genes.size > 0:
+            indptr, old = take_csr(self.gene_indptr, self.gene_terms, genes)
+            keys = np.repeat(genes, np.diff(indptr)) * n + old
+            keys = np.union1d(
+                np.setdiff1d(keys, lost, assume_unique=True), gained)
+            bounds = np.searchsorted(keys, np.r_[genes, genes[-1] + 1] * n)
+            new = (keys % n).astype(np.int32)
+            self.gene_indptr, self.gene_terms = replace_csr_rows(
+                self.gene_indptr, self.gene_terms, genes,
+                [new[bounds[k]:bounds[k+1]] for k in range(genes.size)])
+        self._redundancy = None
@@ -0,0 +1,594 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Module containing the `TermSimilarity` and `GeneSimilarity` classes."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import os
+import logging
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+from .graph import take_csr, transpose_csr
+from .propagation import get_direct_genes
+from .util import LRUCache
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('resnik', 'lin', 'jiang')
+"""The supported semantic similarity measures."""
+
+AGGREGATIONS = ('bma', 'max', 'avg')
+"""The supported methods for combining term similarities into gene
+similarities."""
+
+BLOCK_SIZE = 256
+"""The number of rows and columns of the blocks of similarity matrices."""
+
+CACHE_SIZE = 1000000
+"""The default number of term similarities cached by `GeneSimilarity`."""
+
+# the `TermSimilarity` or `GeneSimilarity` object used by worker processes
+_worker_similarity = None
+
+
+def get_information_content(counts, domains):
+    """Computes the information content of GO terms.
+
+    The information content of a GO term is the negative logarithm of the
+    fraction of genes annotated with the term (or any of its descendants),
+    among all genes annotated with a term of the same domain.
+
+    Parameters
+    ----------
+    counts: `numpy.ndarray` of int
+        The number of genes annotated with each GO term (including genes
+        annotated with descendants), indexed by GO term index.
+    domains: `numpy.ndarray` of int
+        The domain code of each GO term, indexed by GO term index.
+
+    Returns
+    -------
+    `numpy.ndarray` of float64
+        The information content of each GO term. It is NaN for GO terms
+        without any genes.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    # the root term of each domain has the largest number of genes
+    totals = np.zeros(int(domains.max()) + 1 if domains.size else 0,
+                      dtype=np.float64)
+    np.maximum.at(totals, domains, counts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ic = -np.log(counts / totals[domains])
+    ic[counts == 0] = np.nan
+    # avoid negative zeros
+    return ic + 0.0
+
+
+class TermSimilarity(object):
+
+    """Semantic similarity of GO terms based on information content.
+
+    The most informative common ancestor (MICA) of two GO terms is the common
+    ancestor (including the terms themselves) with the largest information
+    content. Common ancestors are found by intersecting the (sorted) rows of
+    the transitive closure of the GO term graph, for many pairs of GO terms
+    at once.
+
+    Three similarity measures are supported:
+
+    - "resnik": the information content of the MICA.
+    - "lin": ``2 * IC(MICA) / (IC(a) + IC(b))``.
+    - "jiang": ``1 / (1 + IC(a) + IC(b) - 2 * IC(MICA))`` (Jiang-Conrath
+      distance converted to a similarity).
+
+    GO terms without common ancestors (e.g., from different domains) have a
+    MICA of -1 and a similarity of 0. The Lin and Jiang-Conrath similarities
+    are NaN if either GO term has no genes.
+
+    Instances are created (and kept up to date) by `GOParser`, from the
+    ancestor rows of its `ancestry.AncestorIndex`.
+
+    Parameters
+    ----------
+    ancestors: tuple of `numpy.ndarray`
+        See :attr:`ancestors` attribute.
+    ic: `numpy.ndarray` of float64
+        See :attr:`ic` attribute.
+
+    Attributes
+    ----------
+    ancestors: tuple of `numpy.ndarray`
+        The ancestors of each GO term, including the term itself, as a CSR
+        structure (indptr, indices) with sorted rows.
+    ic: `numpy.ndarray` of float64
+        The information content of each GO term (see
+        `get_information_content`).
+    """
+
+    def __init__(self, ancestors, ic):
+        self.ancestors = ancestors
+        self.ic = ic
+
+    def __repr__(self):
+        return '<TermSimilarity (%d terms)>' % self.n
+
+    @property
+    def n(self):
+        """The number of GO terms."""
+        return self.ic.size
+
+    def get_mica(self, first, second):
+        """Determines the most informative common ancestors of term pairs.
+
+        Parameters
+        ----------
+        first: `numpy.ndarray` of int
+            The indices of the first GO term of each pair.
+        second: `numpy.ndarray` of int
+            The indices of the second GO term of each pair.
+
+        Returns
+        -------
+        mica: `numpy.ndarray` of int32
+            The index of the most informative common ancestor of each pair,
+            or -1 if the terms have no common ancestor with genes.
+        ic: `numpy.ndarray` of float64
+            The information content of the most informative common ancestor
+            of each pair (0 if there is none).
+        """
+        first = np.asarray(first, dtype=np.int64).ravel()
+        second = np.asarray(second, dtype=np.int64).ravel()
+        if first.size != second.size:
+            raise ValueError('The numbers of first and second GO terms of '
+                             'the pairs differ!')
+        n = max(self.n, 1)
+        m = first.size
+        pairs = np.arange(m, dtype=np.int64)
+        indptr, indices = self.ancestors
+
+        # encode the ancestors of each pair as (pair * n + ancestor)
+        keys = []
+        for terms in (first, second):
+            a_indptr, a_indices = take_csr(indptr, indices, terms)
+            keys.append(np.repeat(pairs, np.diff(a_indptr)) * n + a_indices)
+        common = np.intersect1d(keys[0], keys[1], assume_unique=True)
+        pair = common // n
+        term = (common % n).astype(np.int32)
+
+        # select the common ancestor with the largest information content
+        ic = self.ic[term]
+        valid = ~np.isnan(ic)
+        pair, term, ic = pair[valid], term[valid], ic[valid]
+        order = np.lexsort((ic, pair))
+        last = np.ones(order.size, dtype=np.bool_)
+        last[:-1] = pair[order][1:] != pair[order][:-1]
+        sel = order[last]
+        mica = np.full(m, -1, dtype=np.int32)
+        mica_ic = np.zeros(m, dtype=np.float64)
+        mica[pair[sel]] = term[sel]
+        mica_ic[pair[sel]] = ic[sel]
+        return mica, mica_ic
+
+    def get_scores(self, first, second, method='lin'):
+        """Computes the similarities of many pairs of GO terms.
+
+        Parameters
+        ----------
+        first: `numpy.ndarray` of int
+            The indices of the first GO term of each pair.
+        second: `numpy.ndarray` of int
+            The indices of the second GO term of each pair.
+        method: str, optional
+            The similarity measure ("resnik", "lin", or "jiang").
+
+        Returns
+        -------
+        `numpy.ndarray` of float64
+            The similarity of each pair.
+
+        Raises
+        ------
+        ValueError
+            If the method is unknown.
+        """
+        if method not in METHODS:
+            raise ValueError('Unknown similarity measure: "%s" (must be one '
+                             'of %s)' % (method, ', '.join(METHODS)))
+        first = np.asarray(first, dtype=np.int64).ravel()
+        second = np.asarray(second, dtype=np.int64).ravel()
+        mica, res = self.get_mica(first, second)
+        if method == 'resnik':
+            return res
+
+        found = mica >= 0
+        ic_sum = self.ic[first] + self.ic[second]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if method == 'lin':
+                # two root terms have an information content of 0
+                scores = np.where(ic_sum > 0, 2 * res / ic_sum, 1.0)
+            else:
+                scores = 1.0 / (1.0 + ic_sum - 2 * res)
+        scores[~found] = 0.0
+        scores[np.isnan(ic_sum)] = np.nan
+        return scores
+
+
+class GeneSimilarity(object):
+
+    """Functional similarity of genes based on their GO annotations.
+
+    The similarity of two genes is obtained by combining the semantic
+    similarities of all pairs of GO terms that the genes are (directly)
+    annotated with:
+
+    - "bma": the best-match average, i.e., the average of the mean of the
+      row maxima and the mean of the column maxima.
+    - "max": the largest term similarity.
+    - "avg": the average term similarity.
+
+    The GO terms of each gene are stored as a CSR structure, and term
+    similarities are kept in a bounded LRU cache, so that they are only
+    computed once for genes with overlapping annotations. The similarity of
+    genes without annotations is NaN.
+
+    Instances are created (and kept) by `GOParser`.
+
+    Parameters
+    ----------
+    similarity: `TermSimilarity`
+        The term similarity data.
+    gene_indptr: `numpy.ndarray` of int64
+        Row offsets of the GO terms of each gene (indexed by gene code).
+    gene_terms: `numpy.ndarray` of int32
+        Sorted GO term indices of each gene.
+    method: str, optional
+        The term similarity measure ("resnik", "lin", or "jiang").
+    cache_size: int, optional
+        The maximum number of cached term similarities.
+
+    Attributes
+    ----------
+    similarity: `TermSimilarity`
+        The term similarity data.
+    method: str
+        The term similarity measure.
+    cache: `util.LRUCache`
+        The cached term similarities.
+    """
+
+    def __init__(self, similarity, gene_indptr, gene_terms, method='lin',
+                 cache_size=CACHE_SIZE):
+        if method not in METHODS:
+            raise ValueError('Unknown similarity measure: "%s" (must be one '
+                             'of %s)' % (method, ', '.join(METHODS)))
+        self.similarity = similarity
+        self.gene_indptr = gene_indptr
+        self.gene_terms = gene_terms
+        self.method = method
+        self.cache = LRUCache(cache_size)
+
+    def __repr__(self):
+        return '<GeneSimilarity (%d genes, method: %s)>' \
+               % (self.gene_indptr.size - 1, self.method)
+
+    @classmethod
+    def from_table(cls, similarity, table, term_mask=None, method='lin',
+                   cache_size=CACHE_SIZE):
+        """Creates a `GeneSimilarity` object from an annotation table.
+
+        Parameters
+        ----------
+        similarity: `TermSimilarity`
+            The term similarity data.
+        table: `AnnotationTable`
+            The annotations.
+        term_mask: `numpy.ndarray` of bool, optional
+            Flags indicating which GO terms to use (e.g., the GO terms of one
+            domain). If not specified, use all GO terms.
+        method: str, optional
+            The term similarity measure ("resnik", "lin", or "jiang").
+        cache_size: int, optional
+            The maximum number of cached term similarities.
+
+        Returns
+        -------
+        `GeneSimilarity`
+            The object.
+        """
+        indptr, indices = get_direct_genes(table, similarity.n)
+        indptr, indices = transpose_csr(indptr, indices, len(table.genes))
+        if term_mask is not None:
+            keep = term_mask[indices]
+            kept = np.zeros(keep.size + 1, dtype=np.int64)
+            np.cumsum(keep, out=kept[1:])
+            indptr = kept[indptr]
+            indices = indices[keep]
+        return cls(similarity, indptr, indices, method, cache_size)
+
+    def get_terms(self, gene_idx):
+        """Returns the indices of the GO terms a gene is annotated with.
+
+        Parameters
+        ----------
+        gene_idx: int
+            The gene code.
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The sorted GO term indices.
+        """
+        return self.gene_terms[
+            self.gene_indptr[gene_idx]:self.gene_indptr[gene_idx+1]]
+
+    def get_term_scores(self, first, second):
+        """Returns the similarities of many pairs of GO terms (cached).
+
+        Parameters
+        ----------
+        first: `numpy.ndarray` of int
+            The indices of the first GO term of each pair.
+        second: `numpy.ndarray` of int
+            The indices of the second GO term of each pair.
+
+        Returns
+        -------
+        `numpy.ndarray` of float64
+            The similarity of each pair.
+        """
+        first = np.asarray(first, dtype=np.int64)
+        second = np.asarray(second, dtype=np.int64)
+        n = max(self.similarity.n, 1)
+        # similarities are symmetric
+        keys = np.minimum(first, second) * n + np.maximum(first, second)
+        keys, inverse = np.unique(keys, return_inverse=True)
+        scores = np.empty(keys.size, dtype=np.float64)
+        cache = self.cache
+        missing = []
+        for i, k in enumerate(keys.tolist()):
+            score = cache.get(k)
+            if score is None:
+                missing.append(i)
+            else:
+                scores[i] = score
+        if missing:
+            missing = np.array(missing, dtype=np.int64)
+            k = keys[missing]
+            computed = self.similarity.get_scores(k // n, k % n, self.method)
+            scores[missing] = computed
+            for key, score in zip(k.tolist(), computed.tolist()):
+                cache.put(key, score)
+        return scores[inverse]
+
+    @staticmethod
+    def _aggregate(scores, aggregate):
+        """Combines a matrix of term similarities into a gene similarity."""
+        if scores.size == 0:
+            return np.nan
+        if aggregate == 'max':
+            return scores.max()
+        if aggregate == 'avg':
+            return scores.mean()
+        return (scores.max(axis=1).mean() + scores.max(axis=0).mean()) / 2
+
+    def get_scores(self, first, second, aggregate='bma'):
+        """Computes the similarities of many pairs of genes.
+
+        Parameters
+        ----------
+        first: `numpy.ndarray` of int
+            The codes of the first gene of each pair.
+        second: `numpy.ndarray` of int
+            The codes of the second gene of each pair.
+        aggregate: str, optional
+            The method for combining term similarities ("bma", "max", or
+            "avg").
+
+        Returns
+        -------
+        `numpy.ndarray` of float64
+            The similarity of each pair.
+
+        Raises
+        ------
+        ValueError
+            If the aggregation method is unknown.
+        """
+        if aggregate not in AGGREGATIONS:
+            raise ValueError('Unknown aggregation method: "%s" (must be one '
+                             'of %s)' % (aggregate, ', '.join(AGGREGATIONS)))
+        first = np.asarray(first, dtype=np.int64).ravel()
+        second = np.asarray(second, dtype=np.int64).ravel()
+        # determine all pairs of GO terms at once
+        shapes = []
+        term_pairs = []
+        for g1, g2 in zip(first.tolist(), second.tolist()):
+            a, b = self.get_terms(g1), self.get_terms(g2)
+            shapes.append((a.size, b.size))
+            term_pairs.append((np.repeat(a, b.size), np.tile(b, a.size)))
+        if term_pairs:
+            scores = self.get_term_scores(
+                np.concatenate([a for a, _ in term_pairs]),
+                np.concatenate([b for _, b in term_pairs]))
+        else:
+            scores = np.empty(0, dtype=np.float64)
+
+        result = np.empty(len(shapes), dtype=np.float64)
+        offset = 0
+        for i, (k1, k2) in enumerate(shapes):
+            result[i] = self._aggregate(
+                scores[offset:(offset + k1 * k2)].reshape(k1, k2), aggregate)
+            offset += k1 * k2
+        return result
+
+    def get_matrix(self, first, second, aggregate='bma', n_jobs=1):
+        """Computes the similarities of all pairs of genes from two lists.
+
+        Parameters
+        ----------
+        first: `numpy.ndarray` of int
+            The codes of the genes of the rows.
+        second: `numpy.ndarray` of int
+            The codes of the genes of the columns.
+        aggregate: str, optional
+            The method for combining term similarities ("bma", "max", or
+            "avg").
+        n_jobs: int, optional
+            The number of worker processes. Each worker process has its own
+            cache.
+
+        Returns
+        -------
+        `numpy.ndarray` of float64
+            The similarity matrix.
+        """
+        first = np.asarray(first, dtype=np.int64).ravel()
+        second = np.asarray(second, dtype=np.int64).ravel()
+        step = max(1, -(-first.size // (4 * n_jobs)))
+        args = [(first[k:(k + step)], second, aggregate)
+                for k in range(0, first.size, step)]
+        if n_jobs == 1:
+            rows = [self._get_rows(*a) for a in args]
+        else:
+            pool = multiprocessing.Pool(n_jobs, _init_worker, (self,))
+            try:
+                rows = pool.map(_compute_gene_rows, args, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        if not rows:
+            return np.empty((0, second.size), dtype=np.float64)
+        return np.vstack(rows)
+
+    def _get_rows(self, first, second, aggregate):
+        """Computes rows of a gene similarity matrix."""
+        scores = self.get_scores(np.repeat(first, second.size),
+                                 np.tile(second, first.size), aggregate)
+        return scores.reshape(first.size, second.size)
+
+
+def _init_worker(similarity):
+    """Stores the (read-only) similarity data in a worker process."""
+    global _worker_similarity
+    _worker_similarity = similarity
+
+
+def _compute_block(args):
+    """Computes a block of a similarity matrix, and its transpose."""
+    fn, terms, method, (r0, r1), (c0, c1) = args
+    rows, cols = terms[r0:r1], terms[c0:c1]
+    scores = _worker_similarity.get_scores(
+        np.repeat(rows, cols.size), np.tile(cols, rows.size), method)
+    scores = scores.reshape(rows.size, cols.size)
+    matrix = np.memmap(fn, dtype=np.float32, mode='r+',
+                       shape=(terms.size, terms.size))
+    matrix[r0:r1, c0:c1] = scores
+    matrix[c0:c1, r0:r1] = scores.T
+    matrix.flush()
+    del matrix
+
+
+def _compute_gene_rows(args):
+    """Computes rows of a gene similarity matrix."""
+    return _worker_similarity._get_rows(*args)
+
+
+def compute_similarity_matrix(similarity, terms, method='lin', ofn=None,
+                              n_jobs=1, block_size=BLOCK_SIZE):
+    """Computes the similarities of all pairs of GO terms.
+
+    The matrix is divided into square blocks, and the blocks on and above the
+    diagonal are computed (in parallel) by worker processes. Each worker
+    writes its blocks directly to a memory-mapped file, so that the matrix
+    never has to be held in memory.
+
+    Parameters
+    ----------
+    similarity: `TermSimilarity`
+        The similarity data. It is shared with the worker processes.
+    terms: `numpy.ndarray` of int
+        The indices of the GO terms.
+    method: str, optional
+        The similarity measure ("resnik", "lin", or "jiang").
+    ofn: str, optional
+        Path of the file to store the matrix in. If not specified, a
+        temporary file is used, which is removed as soon as it has been
+        mapped (except on Windows).
+    n_jobs: int, optional
+        The number of worker processes.
+    block_size: int, optional
+        The number of rows and columns of each block.
+
+    Returns
+    -------
+    `numpy.memmap` of float32
+        The (symmetric) similarity matrix.
+
+    Raises
+    ------
+    ValueError
+        If the method is unknown.
+    """
+    if method not in METHODS:
+        raise ValueError('Unknown similarity measure: "%s" (must be one '
+                         'of %s)' % (method, ', '.join(METHODS)))
+    terms = np.asarray(terms, dtype=np.int64)
+    n = terms.size
+    tmp = ofn is None
+    if tmp:
+        fd, ofn = tempfile.mkstemp(suffix='.f32')
+        os.close(fd)
+
+    # create the file
+    matrix = np.memmap(ofn, dtype=np.float32, mode='w+',
+                       shape=(max(n, 1), max(n, 1)))
+    del matrix
+
+    bounds = [(k, min(k + block_size, n)) for k in range(0, n, block_size)]
+    args = [(ofn, terms, method, rows, cols)
+            for i, rows in enumerate(bounds) for cols in bounds[i:]]
+    logger.info('Computing %d x %d similarity matrix (%d blocks)...',
+                n, n, len(args))
+    if n_jobs == 1:
+        _init_worker(similarity)
+        try:
+            for a in args:
+                _compute_block(a)
+        finally:
+            _init_worker(None)
+    else:
+        pool = multiprocessing.Pool(n_jobs, _init_worker, (similarity,))
+        try:
+            pool.map(_compute_block, args, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    matrix = np.memmap(ofn, dtype=np.float32, mode='r+',
+                       shape=(max(n, 1), max(n, 1)))[:n, :n]
+    if tmp:
+        try:
+            # the mapping remains valid
+            os.remove(ofn)
+        except OSError:
+            pass
+    return matrix
@@ -0,0 +1,594 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Functions for storing `GOParser` data in memory-mapped snapshot files.
+
+A snapshot file consists of a short header, a table of contents (in JSON
+format), and a series of flat arrays. Each array starts at an offset that is
+a multiple of `ALIGNMENT`, so that it can be used directly from a read-only
+memory map of the file. Loading a snapshot therefore does not deserialize any
+objects, and processes that load the same file share its physical memory
+pages.
+
+The arrays are grouped into independent sections (see `SECTIONS`), which are
+stored in contiguous parts of the file. Each section is only memory-mapped
+when it is first needed, so that, e.g., a parser that is only used to look
+up GO terms never maps the annotation data.
+
+Layout::
+
+    MAGIC (8 bytes)
+    format version (uint32, little-endian)
+    length of the table of contents (uint32, little-endian)
+    table of contents (UTF-8 encoded JSON)
+    sections (each aligned to ALIGNMENT bytes)
+        arrays (each aligned to ALIGNMENT bytes)
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import io
+import json
+import mmap
+import struct
+import logging
+from functools import partial
+
+try:
+    from collections.abc import Mapping, KeysView
+except ImportError:
+    from collections import Mapping, KeysView
+
+from future.utils import native_str
+
+import numpy as np
+
+from . import GOTerm
+from .graph import GOGraph
+from .table import AnnotationTable
+from .util import StringArray, StringIndex
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'GOPSNAP\x00'
+"""The first bytes of each snapshot file."""
+
+FORMAT_VERSION = 2
+"""The version of the snapshot format written by this module."""
+
+ALIGNMENT = 64
+"""The alignment (in bytes) of the arrays in a snapshot file."""
+
+SECTIONS = ('ontology', 'closure', 'names', 'annotations')
+"""The sections of a `GOParser` snapshot, in the order they are stored.
+
+- "ontology": the GO terms, their relations and the index of GO term IDs
+- "closure": the ancestors and descendants of all GO terms
+- "names": the indexes of GO term names, synonyms and alternative IDs
+- "annotations": the annotation table
+"""
+
+_HEADER = struct.Struct(native_str('<II'))
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _get_section_key(section):
+    try:
+        return (SECTIONS.index(section), section)
+    except ValueError:
+        return (len(SECTIONS), section)
+
+
+def write_snapshot(ofn, sections, meta=None):
+    """Writes collections of arrays to a snapshot file.
+
+    Parameters
+    ----------
+    ofn: str
+        Path of the output file.
+    sections: dict [str:dict [str:`numpy.ndarray`]]
+        The arrays of each section.
+    meta: dict, optional
+        Additional (JSON-serializable) information to store in the table of
+        contents.
+
+    Returns
+    -------
+    None
+    """
+    toc = {'meta': meta or {}, 'sections': {}}
+    data = []
+    end = 0
+    for section in sorted(sections, key=_get_section_key):
+        arrays = sections[section]
+        # offsets of sections are relative to the (aligned) end of the
+        # header, offsets of arrays are relative to the start of the section
+        start = _align(end)
+        info = {'offset': start, 'arrays': {}}
+        offset = 0
+        for name in sorted(arrays):
+            a = np.ascontiguousarray(arrays[name])
+            offset = _align(offset)
+            info['arrays'][name] = {
+                'dtype': a.dtype.str,
+                'shape': list(a.shape),
+                'offset': offset,
+            }
+            data.append((start + offset, a))
+            offset += a.nbytes
+        info['size'] = offset
+        toc['sections'][section] = info
+        end = start + offset
+
+    toc = json.dumps(toc, sort_keys=True).encode('UTF-8')
+    pos = len(MAGIC) + _HEADER.size + len(toc)
+    start = _align(pos)
+
+    with io.open(ofn, 'wb') as ofh:
+        ofh.write(MAGIC)
+        ofh.write(_HEADER.pack(FORMAT_VERSION, len(toc)))
+        ofh.write(toc)
+        for offset, a in data:
+            ofh.write(b'\x00' * (start + offset - pos))
+            ofh.write(a.tobytes())
+            pos = start + offset + a.nbytes
+
+
+class SnapshotReader(object):
+
+    """Memory-maps the sections of a snapshot file on demand.
+
+    Each section is mapped separately, the first time its arrays are
+    requested. Readers can be pickled; unpickled readers open the file
+    again.
+
+    Parameters
+    ----------
+    fn: str
+        Path of the snapshot file.
+
+    Attributes
+    ----------
+    fn: str
+        Path of the snapshot file.
+    meta: dict
+        The additional information stored in the table of contents.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a snapshot file, or if it was written using an
+        unsupported version of the format.
+    """
+
+    def __init__(self, fn):
+        self.fn = fn
+        self._read_toc()
+
+    def __repr__(self):
+        return '<SnapshotReader "%s" (%d sections, %d mapped)>' \
+               % (self.fn, len(self._toc), len(self._arrays))
+
+    def __getstate__(self):
+        return {'fn': self.fn}
+
+    def __setstate__(self, state):
+        self.fn = state['fn']
+        self._read_toc()
+
+    def _read_toc(self):
+        fn = self.fn
+        with io.open(fn, 'rb') as fh:
+            if fh.read(len(MAGIC)) != MAGIC:
+                raise ValueError('File "%s" is not a GOparser snapshot file.'
+                                 % fn)
+            version, toc_len = _HEADER.unpack(fh.read(_HEADER.size))
+            if version != FORMAT_VERSION:
+                raise ValueError('Snapshot file "%s" uses format version %d '
+                                 '(supported: %d).'
+                                 % (fn, version, FORMAT_VERSION))
+            toc = json.loads(fh.read(toc_len).decode('UTF-8'))
+        self.meta = toc['meta']
+        self._toc = toc['sections']
+        self._start = _align(len(MAGIC) + _HEADER.size + toc_len)
+        self._arrays = {}
+
+    @property
+    def sections(self):
+        """The names of the sections stored in the file."""
+        return sorted(self._toc, key=_get_section_key)
+
+    def is_mapped(self, section):
+        """Tests whether a section has already been memory-mapped."""
+        return section in self._arrays
+
+    def get_arrays(self, section):
+        """Returns the (read-only) arrays of a section.
+
+        Parameters
+        ----------
+        section: str
+            The name of the section.
+
+        Returns
+        -------
+        dict [str:`numpy.ndarray`]
+            The arrays.
+
+        Raises
+        ------
+        ValueError
+            If the file does not contain the section.
+        """
+        try:
+            return self._arrays[section]
+        except KeyError:
+            pass
+
+        try:
+            info = self._toc[section]
+        except KeyError:
+            raise ValueError('Snapshot file "%s" does not contain a "%s" '
+                             'section.' % (self.fn, section))
+
+        # memory maps have to start at a multiple of the allocation
+        # granularity
+        start = self._start + info['offset']
+        base = start - (start % mmap.ALLOCATIONGRANULARITY)
+        mm = None
+        if info['size'] > 0:
+            with io.open(self.fn, 'rb') as fh:
+                mm = mmap.mmap(fh.fileno(), start - base + info['size'],
+                               access=mmap.ACCESS_READ, offset=base)
+
+        arrays = {}
+        for name, a_info in info['arrays'].items():
+            dtype = np.dtype(native_str(a_info['dtype']))
+            shape = tuple(a_info['shape'])
+            count = int(np.prod(shape))
+            if count == 0:
+                a = np.empty(shape, dtype=dtype)
+            else:
+                a = np.frombuffer(
+                    mm, dtype=dtype, count=count,
+                    offset=start - base + a_info['offset']).reshape(shape)
+            arrays[name] = a
+        self._arrays[section] = arrays
+        return arrays
+
+
+class TermMapping(Mapping):
+
+    """Mapping of GO term IDs to `GOTerm` objects stored in flat arrays.
+
+    The `GOTerm` objects are only created when they are first accessed,
+    and are views of the (memory-mapped) graph.
+
+    Parameters
+    ----------
+    graph: `GOGraph`
+        The graph of the GO terms.
+    names: sequence of str
+        The name of each GO term (ordered by index).
+    definitions: sequence of str
+        The definition of each GO term (ordered by index).
+    domains: list of str
+        The domain vocabulary.
+    domain_codes: `numpy.ndarray` of uint8
+        The domain code of each GO term.
+    is_obsolete: `numpy.ndarray` of uint8
+        Flags indicating which GO terms are obsolete.
+    """
+
+    def __init__(self, graph, names, definitions, domains, domain_codes,
+                 is_obsolete):
+        self.graph = graph
+        self.names = names
+        self.definitions = definitions
+        self.domains = domains
+        self.domain_codes = domain_codes
+        self.is_obsolete = is_obsolete
+        self._terms = {}
+
+    def __repr__(self):
+        return '<TermMapping (%d terms, %d created)>' \
+               % (len(self), len(self._terms))
+
+    def __getitem__(self, id_):
+        try:
+            return self._terms[id_]
+        except KeyError:
+            pass
+        idx = self.graph.id2idx[id_]
+        term = GOTerm(self.graph.ids[idx], self.names[idx],
+                      self.domains[self.domain_codes[idx]],
+                      self.definitions[idx], [], [],
+                      is_obsolete=bool(self.is_obsolete[idx]))
+        term.attach_graph(self.graph)
+        self._terms[id_] = term
+        return term
+
+    def __contains__(self, id_):
+        return id_ in self.graph.id2idx
+
+    def __iter__(self):
+        return iter(self.graph.ids)
+
+    def __len__(self):
+        return self.graph.n
+
+
+def _store_strings(arrays, name, strings):
+    s = StringArray.from_strings(strings)
+    arrays[name + '.data'] = s.data
+    arrays[name + '.offsets'] = s.offsets
+    if s.mask is not None:
+        arrays[name + '.mask'] = s.mask
+
+
+def _load_strings(arrays, name):
+    return StringArray(arrays[name + '.data'], arrays[name + '.offsets'],
+                       arrays.get(name + '.mask'))
+
+
+def _store_index(arrays, name, d):
+    index = StringIndex.from_dict(d)
+    _store_strings(arrays, name + '.keys', index.key_array)
+    arrays[name + '.values'] = index.value_array
+
+
+def _load_index(arrays, name, targets=None):
+    return StringIndex(_load_strings(arrays, name + '.keys'),
+                       arrays[name + '.values'], targets)
+
+
+def get_parser_arrays(parser, sections=None):
+    """Converts the data of a `GOParser` object into flat arrays.
+
+    Parameters
+    ----------
+    parser: `GOParser`
+        The parser.
+    sections: list of str, optional
+        The sections to include. If not specified, include all sections.
+
+    Returns
+    -------
+    sections: dict [str:dict [str:`numpy.ndarray`]]
+        The arrays of each section (see `SECTIONS`). Sections without data
+        are omitted.
+    meta: dict
+        Additional information about the data.
+    """
+    if parser.graph is None:
+        raise ValueError('The parser does not contain any ontology data.')
+
+    if sections is None:
+        sections = SECTIONS
+    selected = set(sections)
+    graph = parser.graph
+    sections = {}
+    meta = {'num_terms': graph.n, 'flattened': parser._flattened,
+            'annotations': parser.annotation_table is not None,
+            'annotation_params': getattr(parser, '_annotation_params',
+                                         None)}
+
+    if 'ontology' in selected:
+        # terms
+        arrays = sections['ontology'] = {}
+        terms = [parser.terms[id_] for id_ in graph.ids]
+        domains = sorted(set(t.domain for t in terms))
+        domain2code = dict((d, i) for i, d in enumerate(domains))
+        _store_strings(arrays, 'term.id', graph.ids)
+        _store_strings(arrays, 'term.name', [t.name for t in terms])
+        _store_strings(arrays, 'term.definition',
+                       [t.definition for t in terms])
+        _store_strings(arrays, 'term.domains', domains)
+        arrays['term.domain'] = np.array(
+            [domain2code[t.domain] for t in terms], dtype=np.uint8)
+        arrays['term.is_obsolete'] = np.array(
+            [t.is_obsolete for t in terms], dtype=np.uint8)
+        _store_index(arrays, 'index.id', graph.id2idx)
+
+        # graph
+        for rel in graph.relations:
+            for direction, csr in [('parents', graph.get_parent_csr(rel)),
+                                   ('children', graph.get_child_csr(rel))]:
+                name = 'graph.%s.%s' % (rel, direction)
+                arrays[name + '.indptr'], arrays[name + '.indices'] = csr
+
+    # closure
+    if 'closure' in selected and graph.ancestors is not None:
+        arrays = sections['closure'] = {}
+        for name in ['ancestors', 'descendants']:
+            name, csr = 'graph.' + name, getattr(graph, name)
+            arrays[name + '.indptr'], arrays[name + '.indices'] = csr
+
+    # name indexes
+    if 'names' in selected:
+        arrays = sections['names'] = {}
+        id2idx = graph.id2idx
+        _store_index(arrays, 'index.name',
+                     dict((k, id2idx[v]) for k, v in parser._name2id.items()))
+        _store_index(arrays, 'index.synonym',
+                     dict((k, id2idx[v]) for k, v in parser._syn2id.items()))
+        _store_index(arrays, 'index.alt_id',
+                     dict((k, id2idx[v]) for k, v in parser._alt_id.items()))
+
+    # annotations
+    table = parser.annotation_table
+    if 'annotations' in selected and table is not None:
+        arrays = sections['annotations'] = {}
+        for name in ['genes', 'evidence_codes', 'db_ids', 'refs',
+                     'with_values']:
+            _store_strings(arrays, 'annotation.' + name,
+                           getattr(table, name))
+        _store_index(arrays, 'annotation.gene_index', table.gene2idx)
+        for name in table.columns + table.index_arrays:
+            arrays['annotation.' + name] = getattr(table, name)
+
+    return sections, meta
+
+
+def _get_csr(arrays, name):
+    return arrays[name + '.indptr'], arrays[name + '.indices']
+
+
+def _load_closure(reader, graph):
+    """Loads the "closure" section (for `GOGraph.from_csr`)."""
+    arrays = reader.get_arrays('closure')
+    return {'ancestors': _get_csr(arrays, 'graph.ancestors'),
+            'descendants': _get_csr(arrays, 'graph.descendants')}
+
+
+def _load_names(reader, parser):
+    """Loads the "names" section (as `GOParser` attributes)."""
+    arrays = reader.get_arrays('names')
+    ids = parser.graph.ids
+    return {'_name2id': _load_index(arrays, 'index.name', ids),
+            '_syn2id': _load_index(arrays, 'index.synonym', ids),
+            '_alt_id': _load_index(arrays, 'index.alt_id', ids)}
+
+
+def _load_annotations(reader, parser):
+    """Loads the "annotations" section (as `GOParser` attributes)."""
+    if not reader.meta['annotations']:
+        return {'annotation_table': None, 'genes': set(),
+                '_annotation_params': None}
+
+    arrays = reader.get_arrays('annotations')
+
+    def get_strings(name):
+        return _load_strings(arrays, 'annotation.' + name)
+
+    columns = dict((name, arrays['annotation.' + name])
+                   for name in AnnotationTable.columns +
+                   AnnotationTable.index_arrays)
+    gene2idx = _load_index(arrays, 'annotation.gene_index')
+    table = AnnotationTable(
+        parser.terms, get_strings('genes'), parser.graph.ids,
+        get_strings('evidence_codes'), get_strings('db_ids'),
+        get_strings('refs'), get_strings('with_values'), columns,
+        gene2idx=gene2idx, term2idx=parser.graph.id2idx)
+    return {'annotation_table': table, 'genes': KeysView(gene2idx),
+            '_annotation_params': reader.meta.get('annotation_params')}
+
+
+def load_annotations(parser, reader):
+    """Restores the annotation data of a `GOParser` object from a snapshot.
+
+    Parameters
+    ----------
+    parser: `GOParser`
+        The parser. It must contain the same ontology as the parser that the
+        snapshot was created from. All previously stored annotation data is
+        replaced.
+    reader: `SnapshotReader`
+        The reader of the snapshot file.
+
+    Returns
+    -------
+    None
+    """
+    parser.clear_annotation_data()
+    for name, value in _load_annotations(reader, parser).items():
+        setattr(parser, name, value)
+
+
+_SECTION_ATTRIBUTES = {
+    'names': (['_name2id', '_syn2id', '_alt_id'], _load_names),
+    'annotations': (['annotation_table', 'genes', '_annotation_params'],
+                    _load_annotations),
+}
+"""The `GOParser` attributes stored in each section (other than "ontology"
+and "closure"), and the functions loading them."""
+
+
+def load_parser(parser, reader, sections=None):
+    """Restores the data of a `GOParser` object from a snapshot file.
+
+    The "ontology" section is always loaded. All other sections are either
+    loaded immediately, or when the corresponding attributes of the parser
+    (or its graph) are first accessed (see `util.LazyAttributes`). In both
+    cases, the arrays are used directly, without copying.
+
+    Parameters
+    ----------
+    parser: `GOParser`
+        The parser. All previously stored data is replaced.
+    reader: `SnapshotReader`
+        The reader of the snapshot file.
+    sections: list of str, optional
+        The sections to load immediately. If not specified, load all
+        sections immediately.
+
+    Returns
+    -------
+    None
+
+    Raises
+    ------
+    ValueError
+        If one of the sections is unknown.
+    """
+    if sections is None:
+        sections = SECTIONS
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        raise ValueError('Unknown snapshot section(s): %s (valid sections: '
+                         '%s).' % (', '.join(sorted(unknown)),
+                                   ', '.join(SECTIONS)))
+
+    parser.clear_data()
+    arrays = reader.get_arrays('ontology')
+
+    # graph
+    ids = _load_strings(arrays, 'term.id')
+    parents = {}
+    children = {}
+    for rel in GOGraph.relations:
+        parents[rel] = _get_csr(arrays, 'graph.%s.parents' % rel)
+        children[rel] = _get_csr(arrays, 'graph.%s.children' % rel)
+    load_closure = None
+    if reader.meta['flattened']:
+        load_closure = partial(_load_closure, reader)
+    graph = GOGraph.from_csr(
+        ids, _load_index(arrays, 'index.id'), parents, children,
+        load_closure=load_closure)
+
+    # terms
+    parser.graph = graph
+    parser.terms = TermMapping(
+        graph, _load_strings(arrays, 'term.name'),
+        _load_strings(arrays, 'term.definition'),
+        list(_load_strings(arrays, 'term.domains')),
+        arrays['term.domain'], arrays['term.is_obsolete'])
+    parser._flattened = reader.meta['flattened']
+
+    # other sections
+    for section, (names, load) in _SECTION_ATTRIBUTES.items():
+        parser.set_lazy(names, partial(load, reader))
+    for section in sections:
+        # accessing any attribute of a section loads the whole section
+        if section == 'closure':
+            getattr(graph, 'ancestors')
+        elif section in _SECTION_ATTRIBUTES:
+            getattr(parser, _SECTION_ATTRIBUTES[section][0][0])
@@ -0,0 +1,626 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Module containing the `AnnotationTable` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+from array import array
+from collections import Counter
+
+from future.utils import native_str
+
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
+
+import numpy as np
+
+from . import GOAnnotation
+from .graph import take_csr
+from .util import InternPool
+
+
+def _concat_csr(first, second):
+    """Concatenates the rows of two offset-encoded (CSR) columns."""
+    indptr = np.concatenate([first[0], second[0][1:] + first[0][-1]])
+    return indptr, np.concatenate([first[1], second[1]])
+
+
+def _group_rows(codes, n):
+    """Sorts row numbers by code (stably) and returns group offsets."""
+    order = np.argsort(codes, kind='mergesort').astype(np.int32)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(codes, minlength=n))
+    return indptr, order
+
+
+class AnnotationTable(Sequence):
+
+    """Columnar storage of GO annotations.
+
+    Each annotation is stored as a row of integer codes, and all strings are
+    stored only once, in vocabularies. Annotations with multiple
+    DB:References or "with" values are stored in offset-encoded (CSR)
+    columns. `GOAnnotation` objects are only created when an annotation is
+    accessed.
+
+    Instances are created by `GOParser.parse_annotations`, using an
+    `AnnotationTableBuilder`.
+
+    Parameters
+    ----------
+    terms: dict [str:GOTerm]
+        A mapping of GO term IDs to `GOTerm` objects.
+    genes: list of str
+        Gene vocabulary (the list of valid genes).
+    term_ids: list of str
+        GO term vocabulary (the GO term IDs, ordered by graph index).
+    evidence_codes: list of str
+        Evidence code vocabulary.
+    db_ids: list of str
+        DB Object ID vocabulary.
+    refs: list of str
+        DB:Reference vocabulary.
+    with_values: list of str
+        "With" vocabulary.
+    columns: dict [str:`numpy.ndarray`]
+        The columns of the table (see :attr:`columns`). It can also contain
+        precomputed index arrays (see :attr:`index_arrays`).
+    gene2idx: mapping [str:int], optional
+        A mapping of genes to gene codes. Created if not specified.
+    term2idx: mapping [str:int], optional
+        A mapping of GO term IDs to GO term codes. Created if not specified.
+
+    Attributes
+    ----------
+    genes: list of str
+        Gene vocabulary, containing all valid genes in sorted order.
+    term_ids: list of str
+        GO term vocabulary.
+    evidence_codes: list of str
+        Evidence code vocabulary.
+    db_ids: list of str
+        DB Object ID vocabulary.
+    refs: list of str
+        DB:Reference vocabulary.
+    with_values: list of str
+        "With" vocabulary.
+    gene: `numpy.ndarray` of int32
+        The gene code of each annotation.
+    term: `numpy.ndarray` of int32
+        The GO term code (index) of each annotation.
+    evidence: `numpy.ndarray` of uint8
+        The evidence code of each annotation.
+    db_id: `numpy.ndarray` of int32
+        The DB Object ID code of each annotation.
+    db_ref_indptr, db_ref: `numpy.ndarray`
+        Offsets and codes of the DB:References of each annotation.
+    with_indptr, with_: `numpy.ndarray`
+        Offsets and codes of the "with" values of each annotation.
+    gene_indptr, gene_rows: `numpy.ndarray`
+        For each gene, the numbers of the rows containing its annotations.
+    term_indptr, term_rows: `numpy.ndarray`
+        For each GO term, the numbers of the rows containing its annotations.
+    """
+
+    columns = ('gene', 'term', 'evidence', 'db_id',
+               'db_ref_indptr', 'db_ref', 'with_indptr', 'with_')
+    """The names of the columns of the table."""
+
+    index_arrays = ('gene_indptr', 'gene_rows', 'term_indptr', 'term_rows')
+    """The names of the index arrays of the table."""
+
+    def __init__(self, terms, genes, term_ids, evidence_codes, db_ids,
+                 refs, with_values, columns, gene2idx=None, term2idx=None):
+
+        # the vocabularies can be any sequences (e.g., memory-mapped strings)
+        self.terms = terms
+        self.genes = genes
+        self.term_ids = term_ids
+        self.evidence_codes = evidence_codes
+        self.db_ids = db_ids
+        self.refs = refs
+        self.with_values = with_values
+
+        for name in self.columns:
+            setattr(self, name, columns[name])
+
+        if gene2idx is None:
+            gene2idx = dict((g, i) for i, g in enumerate(self.genes))
+        if term2idx is None:
+            term2idx = dict((id_, i) for i, id_ in enumerate(self.term_ids))
+        self.gene2idx = gene2idx
+        self.term2idx = term2idx
+
+        # index arrays
+        if all(name in columns for name in self.index_arrays):
+            for name in self.index_arrays:
+                setattr(self, name, columns[name])
+        else:
+            self.gene_indptr, self.gene_rows = \
+                _group_rows(self.gene, len(self.genes))
+            self.term_indptr, self.term_rows = \
+                _group_rows(self.term, len(self.term_ids))
+
+    def __repr__(self):
+        return '<AnnotationTable (%d annotations, %d genes)>' \
+               % (len(self), len(self.genes))
+
+    def __len__(self):
+        return self.gene.size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.get_annotation(j)
+                    for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('Annotation index out of range.')
+        return self.get_annotation(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.get_annotation(i)
+
+    def get_annotation(self, i):
+        """Creates a `GOAnnotation` object for an annotation.
+
+        Parameters
+        ----------
+        i: int
+            The row number of the annotation.
+
+        Returns
+        -------
+        `GOAnnotation`
+            The annotation.
+        """
+        db_ref = [self.refs[k] for k in
+                  self.db_ref[self.db_ref_indptr[i]:self.db_ref_indptr[i+1]]]
+        with_ = [self.with_values[k] for k in
+                 self.with_[self.with_indptr[i]:self.with_indptr[i+1]]]
+        return GOAnnotation(
+            gene=self.genes[self.gene[i]],
+            term=self.terms[self.term_ids[self.term[i]]],
+            evidence=self.evidence_codes[self.evidence[i]],
+            db_id=self.db_ids[self.db_id[i]],
+            db_ref=db_ref, with_=with_)
+
+    def get_gene_rows(self, gene_idx):
+        """Returns the row numbers of all annotations of a gene.
+
+        Parameters
+        ----------
+        gene_idx: int
+            The gene code.
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The row numbers, in ascending order.
+        """
+        return self.gene_rows[
+            self.gene_indptr[gene_idx]:self.gene_indptr[gene_idx+1]]
+
+    def get_term_rows(self, term_idx):
+        """Returns the row numbers of all annotations using a GO term.
+
+        Parameters
+        ----------
+        term_idx: int
+            The GO term code (index).
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The row numbers, in ascending order.
+        """
+        return self.term_rows[
+            self.term_indptr[term_idx]:self.term_indptr[term_idx+1]]
+
+    def get_gene_terms(self, gene_idx):
+        """Returns the codes of all GO terms a gene is annotated with.
+
+        Parameters
+        ----------
+        gene_idx: int
+            The gene code.
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The sorted GO term codes (indices).
+        """
+        return np.unique(self.term[self.get_gene_rows(gene_idx)])
+
+    def get_term_genes(self, term_indices):
+        """Returns the codes of all genes annotated with any of the GO terms.
+
+        Parameters
+        ----------
+        term_indices: Iterable of int
+            The GO term codes (indices).
+
+        Returns
+        -------
+        `numpy.ndarray` of int32
+            The sorted gene codes.
+        """
+        rows = [self.get_term_rows(t) for t in term_indices]
+        if not rows:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(self.gene[np.concatenate(rows)])
+
+    def _get_row_keys(self, maps):
+        """Returns a hashable key for each row, based on shared codes."""
+        gene = self.gene.tolist()
+        term = self.term.tolist()
+        evidence = maps['evidence'][self.evidence].tolist()
+        db_id = maps['db_id'][self.db_id].tolist()
+        db_ref = maps['db_ref'][self.db_ref].tolist()
+        db_ref_indptr = self.db_ref_indptr.tolist()
+        with_ = maps['with_'][self.with_].tolist()
+        with_indptr = self.with_indptr.tolist()
+        return [(gene[i], term[i], evidence[i], db_id[i],
+                 tuple(db_ref[db_ref_indptr[i]:db_ref_indptr[i+1]]),
+                 tuple(with_[with_indptr[i]:with_indptr[i+1]]))
+                for i in range(len(gene))]
+
+    def update(self, other):
+        """Applies the differences to another table to a copy of this table.
+
+        Annotations are compared based on all of their properties, and
+        identical annotations are counted (i.e., the tables are compared as
+        multisets). Annotations that are only contained in this table are
+        removed, and annotations that are only contained in the other table
+        are appended (in their order in the other table). The vocabularies
+        of the other table are merged into those of this table.
+
+        Parameters
+        ----------
+        other: `AnnotationTable`
+            The other table. It must use the same genes and GO term IDs.
+
+        Returns
+        -------
+        table: `AnnotationTable`
+            The updated table.
+        removed: `numpy.ndarray` of int32
+            The row numbers of the removed annotations (in this table).
+        added: `numpy.ndarray` of int32
+            The row numbers of the added annotations (in the other table).
+        """
+        assert len(other.genes) == len(self.genes)
+        assert len(other.term_ids) == len(self.term_ids)
+
+        # merge vocabularies, so that codes can be compared
+        vocabularies = {}
+        maps = ({}, {})
+        for col, name in [('evidence', 'evidence_codes'), ('db_id', 'db_ids'),
+                          ('db_ref', 'refs'), ('with_', 'with_values')]:
+            values = getattr(self, name)
+            pool = InternPool(values)
+            maps[0][col] = np.arange(max(len(values), 1), dtype=np.int32)
+            maps[1][col] = np.array(
+                [pool.encode(v) for v in getattr(other, name)] or [0],
+                dtype=np.int32)
+            vocabularies[name] = pool.values
+
+        # compare annotations
+        counts = Counter(other._get_row_keys(maps[1]))
+        removed = []
+        for i, key in enumerate(self._get_row_keys(maps[0])):
+            if counts[key] > 0:
+                counts[key] -= 1
+            else:
+                removed.append(i)
+        added = []
+        for i, key in enumerate(other._get_row_keys(maps[1])):
+            if counts[key] > 0:
+                counts[key] -= 1
+                added.append(i)
+        removed = np.array(removed, dtype=np.int32)
+        added = np.array(added, dtype=np.int32)
+
+        # assemble the new columns
+        kept = np.ones(len(self), dtype=np.bool_)
+        kept[removed] = False
+        kept = np.nonzero(kept)[0]
+        columns = {}
+        for col in ['gene', 'term', 'evidence', 'db_id']:
+            values = getattr(other, col)[added]
+            if col in maps[1]:
+                values = maps[1][col][values]
+            columns[col] = np.concatenate(
+                [getattr(self, col)[kept],
+                 values.astype(getattr(self, col).dtype)])
+        for col, indptr_col in [('db_ref', 'db_ref_indptr'),
+                                ('with_', 'with_indptr')]:
+            indptr, values = take_csr(getattr(other, indptr_col),
+                                      getattr(other, col), added)
+            columns[indptr_col], columns[col] = _concat_csr(
+                take_csr(getattr(self, indptr_col), getattr(self, col),
+                         kept),
+                (indptr, maps[1][col][values]))
+
+        table = AnnotationTable(
+            self.terms, self.genes, self.term_ids,
+            vocabularies['evidence_codes'], vocabularies['db_ids'],
+            vocabularies['refs'], vocabularies['with_values'], columns,
+            gene2idx=self.gene2idx, term2idx=self.term2idx)
+        return table, removed, added
+
+    def get_num_associations(self):
+        """Returns the number of unique gene-term associations.
+
+        Returns
+        -------
+        int
+            The number of unique gene-term associations.
+        """
+        pairs = self.gene.astype(np.int64) * len(self.term_ids) + self.term
+        return np.unique(pairs).size
+
+
+class AnnotationTableBuilder(object):
+
+    """Encodes annotations row by row and assembles an `AnnotationTable`.
+
+    Evidence codes, DB Object IDs, DB:References and "with" values are
+    interned using `InternPool` objects, which also serve as the
+    vocabularies of the table.
+
+    Parameters
+    ----------
+    genes: Iterable of str
+        The valid genes.
+    term_ids: list of str
+        The GO term IDs, ordered by graph index.
+    """
+
+    def __init__(self, genes, term_ids):
+        self.genes = sorted(set(genes))
+        self.term_ids = term_ids
+        self._gene2idx = dict((g, i) for i, g in enumerate(self.genes))
+        self._term2idx = dict((id_, i) for i, id_ in enumerate(term_ids))
+
+        self._evidence_codes = InternPool()
+        self._db_ids = InternPool()
+        self._refs = InternPool()
+        self._with_values = InternPool()
+
+        self._gene = array(native_str('i'))
+        self._term = array(native_str('i'))
+        self._evidence = array(native_str('i'))
+        self._db_id = array(native_str('i'))
+        self._db_ref_counts = array(native_str('i'))
+        self._db_ref = array(native_str('i'))
+        self._with_counts = array(native_str('i'))
+        self._with = array(native_str('i'))
+
+    def __len__(self):
+        return len(self._gene)
+
+    def append(self, gene, term_id, evidence, db_id, db_ref, with_):
+        """Adds an annotation to the table.
+
+        Parameters
+        ----------
+        gene: str
+            The (valid) gene.
+        term_id: str
+            The (valid) GO term ID.
+        evidence: str
+            The evidence code.
+        db_id: str
+            The DB Object ID.
+        db_ref: list of str
+            The DB:References.
+        with_: list of str
+            The "with" values.
+
+        Returns
+        -------
+        None
+        """
+        self._gene.append(self._gene2idx[gene])
+        self._term.append(self._term2idx[term_id])
+        self._evidence.append(self._evidence_codes.encode(evidence))
+        self._db_id.append(self._db_ids.encode(db_id))
+        self._db_ref_counts.append(len(db_ref))
+        self._db_ref.extend(self._refs.encode(r) for r in db_ref)
+        self._with_counts.append(len(with_))
+        self._with.extend(self._with_values.encode(w) for w in with_)
+
+    @staticmethod
+    def _remap(data, source, target):
+        mapping = np.array([target.encode(v) for v in source.values] or [0],
+                           dtype=np.int32)
+        codes = mapping[np.frombuffer(data, dtype=np.int32)]
+        return array(native_str('i'), codes.astype(np.int32).tobytes())
+
+    def update(self, other):
+        """Appends all annotations added to another builder.
+
+        Parameters
+        ----------
+        other: `AnnotationTableBuilder`
+            The other builder. It must use the same genes and GO term IDs.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError
+            If the other builder uses different genes or GO term IDs.
+        """
+        if other.genes != self.genes or other.term_ids != self.term_ids:
+            raise ValueError('Cannot merge annotation table builders that '
+                             'use different genes or GO term IDs.')
+
+        self._gene.extend(other._gene)
+        self._term.extend(other._term)
+        self._evidence.extend(self._remap(
+            other._evidence, other._evidence_codes, self._evidence_codes))
+        self._db_id.extend(self._remap(
+            other._db_id, other._db_ids, self._db_ids))
+        self._db_ref_counts.extend(other._db_ref_counts)
+        self._db_ref.extend(self._remap(
+            other._db_ref, other._refs, self._refs))
+        self._with_counts.extend(other._with_counts)
+        self._with.extend(self._remap(
+            other._with, other._with_values, self._with_values))
+
+    @staticmethod
+    def _get_column(data, dtype=np.int32):
+        return np.frombuffer(data, dtype=np.int32).astype(dtype)
+
+    @classmethod
+    def _get_indptr(cls, counts):
+        indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(cls._get_column(counts))
+        return indptr
+
+    def build(self, terms):
+        """Assembles the table.
+
+        Parameters
+        ----------
+        terms: dict [str:GOTerm]
+            A mapping of GO term IDs to `GOTerm` objects.
+
+        Returns
+        -------
+        `AnnotationTable`
+            The table containing all annotations added so far.
+
+        Raises
+        ------
+        ValueError
+            If there are more distinct evidence codes than can be stored in
+            the (uint8) evidence column.
+        """
+        if len(self._evidence_codes) > 256:
+            raise ValueError('Annotations use %d distinct evidence codes, but '
+                             'at most 256 are supported.'
+                             % len(self._evidence_codes))
+        columns = {
+            'gene': self._get_column(self._gene),
+            'term': self._get_column(self._term),
+            'evidence': self._get_column(self._evidence, np.uint8),
+            'db_id': self._get_column(self._db_id),
+            'db_ref_indptr': self._get_indptr(self._db_ref_counts),
+            'db_ref': self._get_column(self._db_ref),
+            'with_indptr': self._get_indptr(self._with_counts),
+            'with_': self._get_column(self._with),
+        }
+        return AnnotationTable(
+            terms, self.genes, self.term_ids,
+            self._evidence_codes.values, self._db_ids.values,
+            self._refs.values, self._with_values.values,
+            columns)
+
+
+class AnnotationIndexView(Mapping):
+
+    """Read-only mapping of genes or GO terms to their annotations.
+
+    Provides the ``gene_annotations`` and ``term_annotations`` attributes of
+    `GOParser`, by looking up the row numbers in an `AnnotationTable`.
+
+    Parameters
+    ----------
+    table: `AnnotationTable`
+        The annotation table.
+    by: str
+        Either "gene" or "term".
+    """
+
+    def __init__(self, table, by):
+        assert by in ['gene', 'term']
+        self.table = table
+        self.by = by
+
+    def _get_keys(self):
+        if self.by == 'gene':
+            return self.table.genes, self.table.gene2idx
+        else:
+            return self.table.term_ids, self.table.term2idx
+
+    def __getitem__(self, key):
+        keys, key2idx = self._get_keys()
+        idx = key2idx[key]
+        if self.by == 'gene':
+            rows = self.table.get_gene_rows(idx)
+        else:
+            rows = self.table.get_term_rows(idx)
+        return [self.table.get_annotation(i) for i in rows.tolist()]
+
+    def __iter__(self):
+        return iter(self._get_keys()[0])
+
+    def __len__(self):
+        return len(self._get_keys()[0])
+
+    def __contains__(self, key):
+        return key in self._get_keys()[1]
+
+
+class AnnotationDelta(object):
+
+    """Differences between two versions of the annotation data.
+
+    Instances are returned by `GOParser.update_annotations`.
+
+    Parameters
+    ----------
+    added: list of `GOAnnotation`
+        See :attr:`added` attribute.
+    removed: list of `GOAnnotation`
+        See :attr:`removed` attribute.
+
+    Attributes
+    ----------
+    added: list of `GOAnnotation`
+        The annotations that were added.
+    removed: list of `GOAnnotation`
+        The annotations that were removed.
+    genes: set of str
+        The genes whose annotations have changed.
+    term_ids: set of str
+        The IDs of the GO terms whose (direct) annotations have changed.
+    """
+
+    def __init__(self, added, removed):
+        self.added = added
+        self.removed = removed
+        self.genes = set(ann.gene for ann in added + removed)
+        self.term_ids = set(ann.term.id for ann in added + removed)
+
+    def __repr__(self):
+        return '<AnnotationDelta (%d added, %d removed, %d genes, %d terms)>' \
+               % (len(self.added), len(self.removed), len(self.genes),
+                  len(self.term_ids))
+
+    def __len__(self):
+        return len(self.added) + len(self.removed)
@@ -28,7 +28,10 @@ class GOTerm(object):
     """Class representing a GO term.
 
     This class is used by :func:`GOParser.parse_ontology` to store all parsed
-    GO term data.
+    GO term data. Terms created by the parser are views of a compiled
+    `GOGraph`, from which their relations are obtained on demand. The
+    relations of such terms are returned as frozensets, since they cannot be
+    modified by changing these sets.
 
     Parameters
     ----------
@@ -44,6 +47,8 @@ class GOTerm(object):
         See ``is_a`` attribute.
     part_of: List of str
         See ``part_of`` attribute.
+    is_obsolete: bool, optional
+        See ``is_obsolete`` attribute.
 
     Attributes
     ----------
@@ -55,6 +60,8 @@ class GOTerm(object):
         The domain of the GO term (e.g., "biological_process").
     definition: str
         The definition (description) of the GO term.
+    is_obsolete: bool
+        Whether the GO term is marked as obsolete.
     is_a: set of str
         Set of GO term IDs that this GO term is a "subtype" of.
     part_of: set of str
@@ -70,6 +77,8 @@ class GOTerm(object):
 
     Methods
     -------
+    attach_graph(graph)
+        Turns the term into a view of a compiled `GOGraph`.
     get_pretty_format(omit_acc=False, max_name_length=0, abbreviate=True)
         Returns a formatted version of the GO term name and ID.
 
@@ -93,24 +102,49 @@ class GOTerm(object):
     """List of tuples defining abbreviations to use in GO term names.
     """
 
-    def __init__(self, id_, name, domain, definition, is_a, part_of):
+    __slots__ = ('id', 'name', 'domain', 'definition', 'is_obsolete',
+                 '_is_a', '_part_of', '_children', '_parts',
+                 '_ancestors', '_descendants', '_graph', '_index')
+
+    def __init__(self, id_, name, domain, definition, is_a, part_of,
+                 is_obsolete=False):
 
         self.id = id_  # unique identifier
         self.name = name
         self.domain = domain
         self.definition = definition
+        self.is_obsolete = is_obsolete
 
         # to store immediate parents/wholes
-        self.is_a = is_a.copy()
-        self.part_of = part_of.copy()
+        self._is_a = set(is_a)
+        self._part_of = set(part_of)
 
         # to store immediate children/parts
-        self.children = set()
-        self.parts = set()
+        self._children = set()
+        self._parts = set()
 
         # to store all descendants/ancestors
-        self.descendants = None
-        self.ancestors = None
+        self._descendants = None
+        self._ancestors = None
+
+        # the compiled graph that this term is a view of (if any)
+        self._graph = None
+        self._index = None
+
+    def __getstate__(self):
+        return dict((attr, getattr(self, attr)) for attr in self.__slots__)
+
+    def __setstate__(self, state):
+        # support objects pickled before the introduction of `GOGraph`
+        for attr in ['is_a', 'part_of', 'children', 'parts',
+                     'ancestors', 'descendants']:
+            if attr in state:
+                state['_' + attr] = state.pop(attr)
+        state.setdefault('is_obsolete', False)
+        state.setdefault('_graph', None)
+        state.setdefault('_index', None)
+        for attr in self.__slots__:
+            setattr(self, attr, state.get(attr))
 
     def __repr__(self):
         # The ID uniquely identifies the term
@@ -167,6 +201,105 @@ class GOTerm(object):
         """
         return 'GO:%07d' % acc
 
+    def _get_relatives(self, attr, parents, relation):
+        value = getattr(self, attr)
+        if value is None:
+            # the term is a view of a compiled graph
+            if parents:
+                indices = self._graph.get_parents(self._index, relation)
+            else:
+                indices = self._graph.get_children(self._index, relation)
+            value = self._graph.get_ids(indices)
+        return value
+
+    @property
+    def is_a(self):
+        return self._get_relatives('_is_a', True, 'is_a')
+
+    @is_a.setter
+    def is_a(self, value):
+        self._is_a = set(value)
+
+    @property
+    def part_of(self):
+        return self._get_relatives('_part_of', True, 'part_of')
+
+    @part_of.setter
+    def part_of(self, value):
+        self._part_of = set(value)
+
+    @property
+    def children(self):
+        return self._get_relatives('_children', False, 'is_a')
+
+    @children.setter
+    def children(self, value):
+        self._children = set(value)
+
+    @property
+    def parts(self):
+        return self._get_relatives('_parts', False, 'part_of')
+
+    @parts.setter
+    def parts(self, value):
+        self._parts = set(value)
+
+    @property
+    def ancestors(self):
+        if self._ancestors is None and self._graph is not None and \
+                self._graph.ancestors is not None:
+            # rebuild the set from the graph's closure
+            return self._graph.get_ids(self._graph.get_ancestors(self._index))
+        return self._ancestors
+
+    @ancestors.setter
+    def ancestors(self, value):
+        self._ancestors = None if value is None else set(value)
+
+    @property
+    def descendants(self):
+        if self._descendants is None and self._graph is not None and \
+                self._graph.descendants is not None:
+            # rebuild the set from the graph's closure
+            return self._graph.get_ids(
+                self._graph.get_descendants(self._index))
+        return self._descendants
+
+    @descendants.setter
+    def descendants(self, value):
+        self._descendants = None if value is None else set(value)
+
+    def attach_graph(self, graph):
+        """Turns the term into a view of a compiled graph.
+
+        Afterwards, the ``is_a``, ``part_of``, ``children`` and ``parts``
+        attributes are obtained from the graph, instead of being stored with
+        the term. Once the graph is flattened, the same applies to the
+        ``ancestors`` and ``descendants`` attributes.
+
+        Parameters
+        ----------
+        graph: `GOGraph`
+            The compiled graph containing this term.
+
+        Returns
+        -------
+        None
+        """
+        self._graph = graph
+        self._index = graph.id2idx[self.id]
+        self._is_a = None
+        self._part_of = None
+        self._children = None
+        self._parts = None
+        self._ancestors = None
+        self._descendants = None
+
+    @property
+    def index(self):
+        """Returns the index of the term in its graph (or None)."""
+        return self._index
+
     @property
     def acc(self):
         """Returns the GO term accession number (part of the ID)."""
@@ -0,0 +1,436 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Utility functions and classes used by GOparser."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import gc
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
+
+import numpy as np
+
+
+class InternPool(object):
+
+    """Pool of canonical instances of (string) values.
+
+    Parsers use the pool to make sure that repeated values, e.g., domain
+    names or evidence codes, are represented by a single object. Each value
+    is also assigned an integer code, in the order of first occurrence, so
+    that the pool can serve as a vocabulary for integer-coded columns.
+
+    Parameters
+    ----------
+    values: Iterable, optional
+        Values to add to the pool.
+
+    Attributes
+    ----------
+    values: list
+        The canonical instances, ordered by code.
+    """
+
+    def __init__(self, values=None):
+        self.values = []
+        self._codes = {}
+        if values is not None:
+            for v in values:
+                self.encode(v)
+
+    def __repr__(self):
+        return '<InternPool (%d values)>' % len(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        return value in self._codes
+
+    def encode(self, value):
+        """Returns the code of a value, adding the value if necessary.
+
+        Parameters
+        ----------
+        value: hashable
+            The value.
+
+        Returns
+        -------
+        int
+            The code of the value.
+        """
+        try:
+            return self._codes[value]
+        except KeyError:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+            return code
+
+    def intern(self, value):
+        """Returns the canonical instance of a value.
+
+        Parameters
+        ----------
+        value: hashable
+            The value.
+
+        Returns
+        -------
+        hashable
+            The canonical instance (the first instance added to the pool
+            that is equal to ``value``).
+        """
+        return self.values[self.encode(value)]
+
+
+@contextmanager
+def paused_gc():
+    """Context manager that disables the cyclic garbage collector.
+
+    Parsers use it while they create large numbers of (long-lived) objects,
+    which otherwise trigger many needless collections. The collector is only
+    re-enabled if it was enabled before.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class LazyAttributes(object):
+
+    """Mixin for classes with attributes that are loaded on first access.
+
+    Groups of attributes are registered together with a function that loads
+    them. When any attribute of the group is accessed for the first time, the
+    function is called (with the object as its only argument) and has to
+    return a dictionary containing the values of all attributes of the group.
+    Attributes that have been assigned in the meantime are not overwritten.
+
+    Loading functions must be picklable (e.g., module-level functions or
+    `functools.partial` objects wrapping them) if the object is pickled
+    before the attributes are loaded.
+    """
+
+    def set_lazy(self, names, load):
+        """Registers attributes that are loaded on first access.
+
+        Parameters
+        ----------
+        names: Iterable of str
+            The names of the attributes.
+        load: callable
+            The function that loads the attributes.
+
+        Returns
+        -------
+        None
+        """
+        lazy = self.__dict__.setdefault('_lazy_loaders', {})
+        for name in names:
+            self.__dict__.pop(name, None)
+            lazy[name] = load
+
+    def is_loaded(self, name):
+        """Tests whether an attribute has been loaded.
+
+        Parameters
+        ----------
+        name: str
+            The name of the attribute.
+
+        Returns
+        -------
+        bool
+            False if the attribute is registered for loading on first access
+            and has not been accessed yet, True otherwise.
+        """
+        return name not in self.__dict__.get('_lazy_loaders', {}) or \
+            name in self.__dict__
+
+    def __getattr__(self, name):
+        # only called if the attribute does not exist
+        lazy = self.__dict__.get('_lazy_loaders')
+        if not lazy or name not in lazy:
+            raise AttributeError('%r object has no attribute %r'
+                                 % (type(self).__name__, name))
+        load = lazy[name]
+        values = load(self)
+        for k in [k for k, v in lazy.items() if v is load]:
+            del lazy[k]
+            if k not in self.__dict__:
+                setattr(self, k, values[k])
+        return getattr(self, name)
+
+
+class LRUCache(object):
+
+    """Dictionary-like cache with a bounded number of items.
+
+    When the cache is full, the least recently used item is removed.
+
+    Parameters
+    ----------
+    max_size: int
+        The maximum number of items.
+
+    Attributes
+    ----------
+    max_size: int
+        The maximum number of items.
+    hits: int
+        The number of successful lookups.
+    misses: int
+        The number of unsuccessful lookups.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def __repr__(self):
+        return '<LRUCache (%d/%d items)>' % (len(self), self.max_size)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        """Looks up an item, and marks it as recently used.
+
+        Parameters
+        ----------
+        key: hashable
+            The key.
+        default: optional
+            The value to return if the item is not in the cache.
+
+        Returns
+        -------
+        The value of the item, or ``default``.
+        """
+        try:
+            value = self._items.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._items[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Adds an item, removing the least recently used item if necessary.
+
+        Parameters
+        ----------
+        key: hashable
+            The key.
+        value:
+            The value.
+
+        Returns
+        -------
+        None
+        """
+        self._items.pop(key, None)
+        self._items[key] = value
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        """Removes all items."""
+        self._items.clear()
+
+
+class StringArray(Sequence):
+
+    """Read-only sequence of strings stored in a single byte array.
+
+    The strings are stored UTF-8 encoded and concatenated, and decoded only
+    when they are accessed. This allows a `StringArray` to be backed by a
+    memory-mapped file (see :mod:`goparser.snapshot`).
+
+    Parameters
+    ----------
+    data: `numpy.ndarray` of uint8
+        The concatenated UTF-8 encoded strings.
+    offsets: `numpy.ndarray` of int64
+        The offsets of the strings in ``data`` (length ``n + 1``).
+    mask: `numpy.ndarray` of uint8, optional
+        Flags indicating which values are None (instead of a string).
+    """
+
+    def __init__(self, data, offsets, mask=None):
+        self.data = data
+        self.offsets = offsets
+        self.mask = mask
+
+    def __repr__(self):
+        return '<StringArray (%d strings)>' % len(self)
+
+    def __len__(self):
+        return self.offsets.size - 1
+
+    def __eq__(self, other):
+        # compare contents, so that copies (e.g., of the GO term IDs passed
+        # to worker processes) are equal to the original
+        if self is other:
+            return True
+        if isinstance(other, StringArray):
+            return (np.array_equal(self.offsets, other.offsets) and
+                    np.array_equal(self.data, other.data) and
+                    np.array_equal(self._get_mask(), other._get_mask()))
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and \
+            all(a == b for a, b in zip(self, other))
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = None
+
+    def _get_mask(self):
+        if self.mask is None:
+            return np.zeros(len(self), dtype=np.uint8)
+        return self.mask
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('String index out of range.')
+        if self.mask is not None and self.mask[i]:
+            return None
+        start, end = self.offsets[i:(i+2)].tolist()
+        return self.data[start:end].tobytes().decode('UTF-8')
+
+    @classmethod
+    def from_strings(cls, strings):
+        """Encodes a list of strings.
+
+        Parameters
+        ----------
+        strings: Iterable of str or None
+            The strings.
+
+        Returns
+        -------
+        `StringArray`
+            The encoded strings.
+        """
+        encoded = []
+        mask = []
+        for s in strings:
+            mask.append(s is None)
+            encoded.append(b'' if s is None else s.encode('UTF-8'))
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        mask = np.array(mask, dtype=np.uint8) if any(mask) else None
+        return cls(data, offsets, mask)
+
+
+class StringIndex(Mapping):
+
+    """Read-only mapping of strings to integers, based on binary search.
+
+    Parameters
+    ----------
+    keys: `StringArray`
+        The keys, in sorted order.
+    values: `numpy.ndarray` of int32
+        The value of each key.
+    targets: sequence, optional
+        If specified, the values are used as indices into this sequence,
+        whose items are then returned instead.
+    """
+
+    def __init__(self, keys, values, targets=None):
+        self.key_array = keys
+        self.value_array = values
+        self.targets = targets
+
+    def __repr__(self):
+        return '<StringIndex (%d keys)>' % len(self)
+
+    def _find(self, key):
+        i = bisect_left(self.key_array, key)
+        if i < len(self.key_array) and self.key_array[i] == key:
+            return i
+        return None
+
+    def __getitem__(self, key):
+        i = self._find(key)
+        if i is None:
+            raise KeyError(key)
+        value = int(self.value_array[i])
+        if self.targets is not None:
+            return self.targets[value]
+        return value
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __iter__(self):
+        return iter(self.key_array)
+
+    def __len__(self):
+        return len(self.key_array)
+
+    @classmethod
+    def from_dict(cls, d, targets=None):
+        """Creates an index of the items of a dictionary.
+
+        Parameters
+        ----------
+        d: dict [str:int]
+            The dictionary.
+        targets: sequence, optional
+            See the ``targets`` parameter of `StringIndex`.
+
+        Returns
+        -------
+        `StringIndex`
+            The index.
+        """
+        keys = sorted(d)
+        values = np.array([d[k] for k in keys], dtype=np.int32)
+        return cls(StringArray.from_strings(keys), values, targets)
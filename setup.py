@@ -30,8 +30,8 @@ with io.open(os.path.join(here, 'README.rst'), encoding='UTF-8') as fh:
 
 install_requires = [
     'future >= 0.15.2, < 1',
+    'numpy >= 1.10, < 3',
     'six >= 1.10.0, < 2',
-    'unicodecsv >= 0.14.1, < 1',
 ]
 
 # do not require installation if built by ReadTheDocs
@@ -99,9 +99,11 @@ setup(
 
     install_requires=install_requires,
 
-    # development dependencies
+    # optional and development dependencies
     extras_require={
-        'docs': ['sphinx', 'sphinx_rtd_theme']
+        'sparse': ['scipy >= 0.14, < 2'],
+        'docs': ['sphinx', 'sphinx_rtd_theme'],
+        'tests': ['pytest']
     },
 
     # data
@@ -0,0 +1,62 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Fixtures shared by all tests."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import os
+
+import pytest
+
+from goparser import GOParser
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+GENES = ['ACTB', 'EEF1A1', 'GAPDH', 'MYC', 'PKM', 'RPL3', 'RPS6']
+"""The valid genes. MYC does not have any annotations."""
+
+
+@pytest.fixture
+def obo_file():
+    return os.path.join(DATA_DIR, 'go.obo')
+
+
+@pytest.fixture
+def gaf_file():
+    return os.path.join(DATA_DIR, 'ann.gaf')
+
+
+@pytest.fixture
+def updated_gaf_file():
+    """A newer version of ``gaf_file`` with two annotations added and two
+    (valid) annotations removed."""
+    return os.path.join(DATA_DIR, 'ann_updated.gaf')
+
+
+@pytest.fixture
+def genes():
+    return list(GENES)
+
+
+@pytest.fixture
+def parser(obo_file, gaf_file, genes):
+    parser = GOParser()
+    parser.parse_ontology(obo_file)
+    parser.parse_annotations(gaf_file, genes)
+    return parser
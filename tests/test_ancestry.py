@@ -0,0 +1,119 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for common ancestor queries of `GOParser`."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import itertools
+
+import pytest
+
+from goparser import GOParser
+
+
+def get_ancestors(parser, id_, include_self):
+    ancestors = set(parser.terms[id_].ancestors)
+    if include_self:
+        ancestors.add(id_)
+    return ancestors
+
+
+def get_expected_common_ancestors(parser, ids, include_self):
+    common = None
+    for id_ in ids:
+        ancestors = get_ancestors(parser, id_, include_self)
+        common = ancestors if common is None else common & ancestors
+    return common or set()
+
+
+def get_expected_lowest(parser, common):
+    return set(id_ for id_ in common
+               if not any(id_ in parser.terms[other].ancestors
+                          for other in common))
+
+
+def get_expected_depth(parser, id_):
+    term = parser.terms[id_]
+    parents = list(term.is_a) + list(term.part_of)
+    if not parents:
+        return 0
+    return max(get_expected_depth(parser, p) for p in parents) + 1
+
+
+def get_groups(parser):
+    ids = sorted(parser.terms)
+    return [list(g) for k in (1, 2, 3)
+            for g in itertools.combinations(ids, k)]
+
+
+@pytest.mark.parametrize('include_self', [False, True])
+def test_common_ancestors(parser, include_self):
+    groups = get_groups(parser)
+    result = parser.get_common_ancestors_many(groups, include_self)
+    assert len(result) == len(groups)
+    for ids, common in zip(groups, result):
+        assert isinstance(common, frozenset)
+        assert set(t.id for t in common) == \
+            get_expected_common_ancestors(parser, ids, include_self)
+
+    ids = ['GO:0006096', 'GO:0006412']
+    assert set(t.id for t in parser.get_common_ancestors(ids)) == \
+        set(['GO:0008150', 'GO:0008152', 'GO:0009987', 'GO:0044237'])
+
+
+@pytest.mark.parametrize('include_self', [False, True])
+def test_lowest_common_ancestors(parser, include_self):
+    groups = get_groups(parser)
+    result = parser.get_lowest_common_ancestors_many(groups, include_self)
+    for ids, lowest in zip(groups, result):
+        expected = get_expected_lowest(
+            parser, get_expected_common_ancestors(parser, ids, include_self))
+        assert set(t.id for t in lowest) == expected
+        # the most specific terms come first
+        depths = [parser.get_term_depth(t.id) for t in lowest]
+        assert depths == sorted(depths, reverse=True)
+
+    lowest = parser.get_lowest_common_ancestors(['GO:0006096', 'GO:0006412'])
+    assert [t.id for t in lowest] == ['GO:0044237']
+    lowest = parser.get_lowest_common_ancestors(['GO:0006412', 'GO:0044237'],
+                                                include_self=True)
+    assert [t.id for t in lowest] == ['GO:0044237']
+
+
+def test_term_depth(parser):
+    for id_ in parser.terms:
+        assert parser.get_term_depth(id_) == get_expected_depth(parser, id_)
+    assert parser.get_term_depth('GO:0008150') == 0
+
+
+def test_empty_groups(parser):
+    assert parser.get_common_ancestors_many([[], ['GO:0006412']]) == \
+        [frozenset(), parser.get_common_ancestors(['GO:0006412'])]
+    assert parser.get_lowest_common_ancestors([]) == []
+
+
+def test_ancestors_require_flattening(obo_file):
+    parser = GOParser()
+    parser.parse_ontology(obo_file, flatten=False)
+    with pytest.raises(ValueError):
+        parser.get_term_depth('GO:0006412')
+    with pytest.raises(ValueError):
+        parser.get_common_ancestors(['GO:0006412', 'GO:0006096'])
+    with pytest.raises(ValueError):
+        parser.get_lowest_common_ancestors_many([['GO:0006412']])
@@ -0,0 +1,144 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for parsing and storing GO annotations."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import pickle
+
+import pytest
+
+from goparser import GOAnnotation, GOParser, GOTerm
+from goparser.table import AnnotationTableBuilder
+from .util import get_annotation_data, get_term_genes
+
+
+def get_term_ids(terms):
+    return set(t.id for t in terms)
+
+
+def test_parse_annotations(parser):
+    # the NOT annotation, the annotation of an unknown gene, the annotation
+    # with an unknown GO term and the MGI annotation are ignored
+    assert len(parser.annotations) == 15
+    assert parser.genes == set(['ACTB', 'EEF1A1', 'GAPDH', 'MYC', 'PKM',
+                                'RPL3', 'RPS6'])
+    assert parser.get_goterm_genes('GO:0006412') == \
+        set(['EEF1A1', 'RPL3', 'RPS6'])
+    assert parser.get_goterm_genes('GO:0005622') == \
+        set(['ACTB', 'EEF1A1', 'GAPDH', 'PKM', 'RPL3', 'RPS6'])
+    assert parser.get_goterm_genes('GO:0005622', descendants=False) == set()
+    assert get_term_ids(parser.get_gene_goterms('GAPDH')) == \
+        set(['GO:0006096', 'GO:0003824', 'GO:0005737'])
+    assert get_term_ids(parser.get_gene_goterms('MYC', ancestors=True)) == \
+        set()
+
+    ann = [a for a in parser.gene_annotations['RPL3']
+           if a.term.id == 'GO:0005840'][0]
+    assert ann.evidence == 'ISS'
+    assert ann.db_id == 'P39023'
+    assert list(ann.db_ref) == ['PMID:1001', 'GO_REF:0000024']
+    assert list(ann.with_) == ['UniProtKB:P61313']
+
+
+def test_annotation_views(parser):
+    annotations = list(parser.annotations)
+    assert len(set(annotations)) == 15
+    for gene, anns in parser.gene_annotations.items():
+        assert all(ann.gene == gene for ann in anns)
+    for id_, anns in parser.term_annotations.items():
+        assert all(ann.term.id == id_ for ann in anns)
+    assert sum(len(anns) for anns in parser.gene_annotations.values()) == 15
+    assert sum(len(anns) for anns in parser.term_annotations.values()) == 15
+    assert sorted(a.gene for a in parser.term_annotations['GO:0005737']) \
+        == ['ACTB', 'EEF1A1', 'GAPDH', 'PKM']
+
+
+def test_evidence_codes_limit(parser):
+    builder = AnnotationTableBuilder(['A'], ['GO:0008150'])
+    for i in range(257):
+        builder.append('A', 'GO:0008150', 'E%d' % i, 'X', [], [])
+    with pytest.raises(ValueError):
+        builder.build(parser.terms)
+
+
+def get_legacy_state(parser):
+    """Returns the state of a parser, as pickled by a previous version of
+    GOparser, which stored the terms and annotations as objects."""
+    terms = {}
+    for id_, term in parser.terms.items():
+        terms[id_] = GOTerm(id_, term.name, term.domain, term.definition,
+                            set(term.is_a), set(term.part_of))
+    annotations = [
+        GOAnnotation(gene=a.gene, term=terms[a.term.id], evidence=a.evidence,
+                     db_id=a.db_id, db_ref=list(a.db_ref),
+                     with_=list(a.with_))
+        for a in parser.annotations]
+    term_annotations = dict((id_, []) for id_ in terms)
+    gene_annotations = dict((g, []) for g in parser.genes)
+    for ann in annotations:
+        term_annotations[ann.term.id].append(ann)
+        gene_annotations[ann.gene].append(ann)
+    return {
+        'genes': set(parser.genes),
+        'terms': terms,
+        'annotations': annotations,
+        'term_annotations': term_annotations,
+        'gene_annotations': gene_annotations,
+        '_syn2id': dict(parser._syn2id),
+        '_alt_id': dict(parser._alt_id),
+        '_name2id': dict(parser._name2id),
+        '_flattened': True,
+    }
+
+
+def test_legacy_pickle(parser):
+    legacy = GOParser.__new__(GOParser)
+    legacy.__setstate__(get_legacy_state(parser))
+    legacy = pickle.loads(pickle.dumps(legacy))
+
+    assert legacy.graph.n == len(parser.terms)
+    assert legacy.terms['GO:0006412'].ancestors == \
+        parser.terms['GO:0006412'].ancestors
+    assert get_annotation_data(legacy) == get_annotation_data(parser)
+    assert get_term_genes(legacy) == get_term_genes(parser)
+
+
+def test_iter_annotations(gaf_file, genes, parser):
+    rows = [(ann.gene, ann.term.id, ann.evidence, ann.db_id,
+             tuple(ann.db_ref), tuple(ann.with_))
+            for ann in parser.iter_annotations(gaf_file, genes)]
+    assert sorted(rows) == get_annotation_data(parser)
+
+    # previously parsed annotations are not affected
+    anns = list(parser.iter_annotations(gaf_file, genes,
+                                        exclude_evidence=['IEA']))
+    assert len(anns) == 13
+    assert len(parser.annotations) == 15
+    assert all(ann.term is parser.terms[ann.term.id] for ann in anns)
+
+    anns = parser.iter_annotations(gaf_file, genes, select_evidence=['IMP'])
+    assert set(ann.gene for ann in anns) == set(['PKM', 'RPS6'])
+
+
+def test_iter_annotations_all_genes(gaf_file, parser):
+    # without a list of genes, the annotation of FOO1 is included
+    genes = set(ann.gene for ann in parser.iter_annotations(gaf_file))
+    assert genes == set(['ACTB', 'EEF1A1', 'GAPDH', 'PKM', 'RPL3', 'RPS6',
+                         'FOO1'])
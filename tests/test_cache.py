@@ -0,0 +1,155 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the `ParseCache` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import io
+import os
+
+import pytest
+
+from goparser import GOParser, ParseCache
+from .util import get_annotation_data, get_term_genes
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return ParseCache(str(tmpdir.join('cache')))
+
+
+def copy_file(src, dst):
+    with io.open(src, 'rb') as ifh, io.open(dst, 'wb') as ofh:
+        ofh.write(ifh.read())
+
+
+def write_modified_gaf(src, dst):
+    """Writes a copy of a GAF file without its first annotation."""
+    with io.open(src, 'rb') as fh:
+        lines = fh.read().split(b'\n')
+    first = [line.startswith(b'!') for line in lines].index(False)
+    with io.open(dst, 'wb') as fh:
+        fh.write(b'\n'.join(lines[:first] + lines[(first+1):]))
+
+
+def get_cached_files(cache):
+    return sorted(fn for fn in os.listdir(cache.cache_dir)
+                  if fn.endswith(cache.suffix))
+
+
+def test_key_depends_on_contents(cache, gaf_file, tmpdir):
+    fn = str(tmpdir.join('ann.gaf'))
+    copy_file(gaf_file, fn)
+    key = cache.get_key('annotations', fn, db_sel='UniProtKB')
+
+    # the key only depends on the contents of the file, not on its path
+    assert cache.get_key('annotations', gaf_file, db_sel='UniProtKB') == key
+
+    # modifying the file invalidates the key
+    write_modified_gaf(gaf_file, fn)
+    assert cache.get_key('annotations', fn, db_sel='UniProtKB') != key
+
+    # restoring the original contents restores the key
+    copy_file(gaf_file, fn)
+    assert cache.get_key('annotations', fn, db_sel='UniProtKB') == key
+
+
+def test_key_depends_on_parameters(cache, gaf_file):
+    key = cache.get_key('annotations', gaf_file, db_sel='UniProtKB',
+                        exclude_evidence=None)
+    assert cache.get_key('annotations', gaf_file, exclude_evidence=None,
+                         db_sel='UniProtKB') == key
+    assert cache.get_key('annotations', gaf_file, db_sel='MGI',
+                         exclude_evidence=None) != key
+    assert cache.get_key('annotations', gaf_file, db_sel='UniProtKB',
+                         exclude_evidence=['IEA']) != key
+    assert cache.get_key('ontology', gaf_file, db_sel='UniProtKB',
+                         exclude_evidence=None) != key
+
+
+def test_parse_with_cache(cache, obo_file, gaf_file, genes, parser):
+    other = GOParser()
+    other.parse_ontology(obo_file, cache=cache)
+    other.parse_annotations(gaf_file, genes, cache=cache)
+    assert len(get_cached_files(cache)) == 2
+
+    # the second parser loads both results from the cache
+    cached = GOParser()
+    cached.parse_ontology(obo_file, cache=cache)
+    cached.parse_annotations(gaf_file, genes, cache=cache)
+    assert len(get_cached_files(cache)) == 2
+    assert sorted(cached.terms) == sorted(parser.terms)
+    assert get_annotation_data(cached) == get_annotation_data(parser)
+    assert get_term_genes(cached) == get_term_genes(parser)
+
+
+def test_cache_invalidation(cache, obo_file, gaf_file, genes, tmpdir):
+    fn = str(tmpdir.join('ann.gaf'))
+    copy_file(gaf_file, fn)
+    parser = GOParser()
+    parser.parse_ontology(obo_file, cache=cache)
+    parser.parse_annotations(fn, genes, cache=cache)
+    before = get_annotation_data(parser)
+
+    # a modified file is parsed again
+    modified_fn = str(tmpdir.join('modified.gaf'))
+    write_modified_gaf(gaf_file, modified_fn)
+    copy_file(modified_fn, fn)
+    parser.parse_annotations(fn, genes, cache=cache)
+    reference = GOParser()
+    reference.parse_ontology(obo_file)
+    reference.parse_annotations(modified_fn, genes)
+    assert get_annotation_data(parser) == get_annotation_data(reference)
+    assert get_annotation_data(parser) != before
+
+    # so are annotations parsed with different parameters or genes
+    parser.parse_annotations(fn, genes, cache=cache,
+                             exclude_evidence=['IEA'])
+    parser.parse_annotations(fn, genes[1:], cache=cache)
+    assert len(get_cached_files(cache)) == 5
+
+
+def test_parallel_after_cache_hit(cache, obo_file, gaf_file, genes, parser):
+    GOParser().parse_ontology(obo_file, cache=cache)
+    cached = GOParser()
+    cached.parse_ontology(obo_file, cache=cache)
+    assert not isinstance(cached.graph.ids, list)
+    cached.parse_annotations(gaf_file, genes, n_jobs=2)
+    assert get_annotation_data(cached) == get_annotation_data(parser)
+    assert get_term_genes(cached) == get_term_genes(parser)
+
+
+def test_evict(cache, obo_file, gaf_file, genes):
+    parser = GOParser()
+    parser.parse_ontology(obo_file, cache=cache)
+    parser.parse_annotations(gaf_file, genes, cache=cache)
+    files = get_cached_files(cache)
+    assert len(files) == 2
+    size = cache.get_size()
+
+    # the least recently used file is removed first
+    ontology_fn = [fn for fn in files if fn.startswith('ontology')][0]
+    os.utime(os.path.join(cache.cache_dir, ontology_fn), (0, 0))
+    assert cache.evict(size - 1) == 1
+    assert [fn for fn in files if fn != ontology_fn] == \
+        get_cached_files(cache)
+
+    cache.clear()
+    assert get_cached_files(cache) == []
+    assert cache.get_size() == 0
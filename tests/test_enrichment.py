@@ -0,0 +1,117 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for GO enrichment analyses."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import numpy as np
+import pytest
+
+from goparser.enrichment import correct_pvalues
+
+stats = pytest.importorskip('scipy.stats')
+
+QUERIES = [
+    ['GAPDH', 'PKM'],
+    ['RPL3', 'RPS6', 'EEF1A1', 'FOO1'],
+    ['ACTB'],
+    ['MYC'],
+    [],
+]
+
+
+def get_expected_results(parser, queries, background, term_ids):
+    """Tests each gene list and GO term separately."""
+    background = set(background) & parser.genes
+    N = len(background)
+    overlaps = np.zeros((len(queries), len(term_ids)), dtype=np.int64)
+    pvals = np.zeros((len(queries), len(term_ids)))
+    for i, query in enumerate(queries):
+        query = set(query) & background
+        for j, id_ in enumerate(term_ids):
+            genes = parser.get_goterm_genes(id_) & background
+            k = len(query & genes)
+            overlaps[i, j] = k
+            pvals[i, j] = stats.hypergeom.sf(k - 1, N, len(genes),
+                                             len(query))
+    return overlaps, pvals
+
+
+@pytest.mark.parametrize('background', [
+    None, ['ACTB', 'GAPDH', 'PKM', 'RPL3', 'RPS6', 'FOO1']])
+@pytest.mark.parametrize('min_genes,max_genes', [(None, None), (2, 5)])
+def test_enrichment(parser, background, min_genes, max_genes):
+    result = parser.test_enrichment(QUERIES, background=background,
+                                    min_genes=min_genes, max_genes=max_genes,
+                                    correction=None)
+    term_ids = [gs.id for gs in parser.get_gene_sets(
+        min_genes=min_genes, max_genes=max_genes).gene_sets]
+    assert list(result.term_ids) == term_ids
+    assert len(result) == len(QUERIES)
+
+    if background is None:
+        background = parser.genes
+    overlaps, pvals = get_expected_results(parser, QUERIES, background,
+                                           term_ids)
+    assert result.background_size == len(set(background) & parser.genes)
+    assert result.overlaps.tolist() == overlaps.tolist()
+    assert np.allclose(result.pvals, pvals, rtol=1e-10, atol=0)
+    assert np.array_equal(result.qvals, result.pvals)
+
+
+def test_enriched_terms(parser):
+    analysis = parser.get_enrichment_analysis()
+    result = analysis.test(QUERIES, correction='bonferroni')
+    assert np.allclose(result.qvals,
+                       np.minimum(result.pvals * len(result.term_ids), 1.0))
+
+    enriched = result.get_enriched_terms(0, alpha=1.0)
+    pvals = dict(zip(result.term_ids, result.pvals[0].tolist()))
+    assert [pvals[id_] for id_ in enriched] == \
+        sorted(pvals[id_] for id_ in enriched)
+    assert result.get_enriched_terms(0, alpha=0.0) == []
+
+
+def test_empty_background(parser):
+    with pytest.raises(ValueError):
+        parser.get_enrichment_analysis(background=['FOO1'])
+    with pytest.raises(ValueError):
+        parser.test_enrichment(QUERIES, background=[])
+
+
+def test_correct_pvalues():
+    pvals = np.array([0.01, 0.04, 0.03, 0.005])
+    assert np.allclose(correct_pvalues(pvals, 'bonferroni'),
+                       [0.04, 0.16, 0.12, 0.02])
+    assert np.allclose(correct_pvalues(pvals, 'fdr_bh'),
+                       [0.02, 0.04, 0.04, 0.02])
+
+    # the q-values are monotonic in the p-values, and at most 1
+    pvals = np.array([[0.01, 0.02, 0.9, 0.5],
+                      [0.3, 0.6, 0.2, 0.4]])
+    assert np.allclose(correct_pvalues(pvals, 'fdr_bh'),
+                       [[0.04, 0.04, 0.9, 2 / 3],
+                        [1.6 / 3, 0.6, 1.6 / 3, 1.6 / 3]])
+    assert np.allclose(correct_pvalues(pvals, 'bonferroni'),
+                       [[0.04, 0.08, 1.0, 1.0],
+                        [1.0, 1.0, 0.8, 1.0]])
+    assert np.array_equal(correct_pvalues(pvals, None), pvals)
+
+    with pytest.raises(ValueError):
+        correct_pvalues(pvals, 'holm')
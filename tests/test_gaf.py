@@ -0,0 +1,85 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the GAF reader."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import io
+import logging
+
+import pytest
+
+from goparser.gaf import iter_gaf_lines, read_gaf
+
+ROWS = [
+    '!gaf-version: 2.0',
+    '',
+    'UniProtKB\tP60709\tACTB\t\tGO:0005737\tPMID:1|PMID:2\tIDA\t\tC',
+    'UniProtKB\tP04406\tGAPDH\tNOT\tGO:0005840\tPMID:3\tIDA\t\tC',
+    'MGI\tMGI:1\tActb\t\tGO:0005737\tPMID:4\tIDA\t\tC',
+    'UniProtKB\tP14618\tPKM\tcontributes_to\tGO:0003824\tPMID:5\tIMP\t'
+    'UniProtKB:P1|UniProtKB:P2\tF',
+    'UniProtKB\tP01106\tMYC',
+]
+
+
+def get_gaf(rows=ROWS, newline='\n'):
+    return io.BytesIO(newline.join(rows).encode('UTF-8'))
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 64, 2 ** 20])
+def test_iter_gaf_lines(block_size):
+    lines = list(iter_gaf_lines(get_gaf(), block_size=block_size))
+    assert [i for i, _ in lines] == list(range(1, len(ROWS) + 1))
+    assert [line.decode('UTF-8') for _, line in lines] == ROWS
+
+
+@pytest.mark.parametrize('block_size', [5, 2 ** 20])
+def test_read_gaf(block_size, caplog):
+    with caplog.at_level(logging.WARNING):
+        rows = list(read_gaf(get_gaf(), block_size=block_size))
+    assert rows == [
+        (3, 'P60709', 'ACTB', 'GO:0005737', 'PMID:1|PMID:2', 'IDA', ''),
+        (6, 'P14618', 'PKM', 'GO:0003824', 'PMID:5', 'IMP',
+         'UniProtKB:P1|UniProtKB:P2'),
+    ]
+    assert '1 malformed' in caplog.text
+
+
+def test_read_gaf_db_sel():
+    rows = list(read_gaf(get_gaf(), db_sel='MGI'))
+    assert [r[2] for r in rows] == ['Actb']
+
+    # disable filtering based on the DB value
+    rows = list(read_gaf(get_gaf(), db_sel=''))
+    assert [r[2] for r in rows] == ['ACTB', 'Actb', 'PKM']
+
+
+def test_read_gaf_file(gaf_file):
+    with io.open(gaf_file, 'rb') as fh:
+        rows = list(read_gaf(fh))
+    # only the NOT annotation and the MGI annotation are skipped
+    assert len(rows) == 17
+    assert not any(r[3] == 'GO:0005840' and r[2] == 'GAPDH' for r in rows)
+
+
+def test_read_gaf_bytes():
+    rows = list(read_gaf(get_gaf(), decode=False))
+    assert rows[0] == (3, b'P60709', b'ACTB', b'GO:0005737',
+                       b'PMID:1|PMID:2', b'IDA', b'')
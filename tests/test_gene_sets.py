@@ -0,0 +1,141 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for `GOParser.get_gene_sets`."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import pytest
+
+
+def get_expected_gene_sets(parser, min_genes=None, max_genes=None):
+    """Determines the gene sets term by term (and without redundant terms
+    that are ancestors of other terms with the same genes)."""
+    term_genes = {}
+    for id_ in sorted(parser.terms):
+        genes = parser.get_goterm_genes(id_)
+        if not genes or (min_genes is not None and len(genes) < min_genes) \
+                or (max_genes is not None and len(genes) > max_genes):
+            continue
+        term_genes[id_] = genes
+
+    expected = []
+    for id_, genes in sorted(term_genes.items()):
+        descendants = parser.terms[id_].descendants
+        if any(other != id_ and other in descendants and other_genes == genes
+               for other, other_genes in term_genes.items()):
+            continue
+        expected.append((id_, genes))
+    return expected
+
+
+def get_gene_set_data(gene_sets):
+    return [(gs.id, gs.genes) for gs in gene_sets.gene_sets]
+
+
+@pytest.mark.parametrize('min_genes,max_genes', [
+    (None, None), (2, None), (None, 3), (3, 5), (4, 2)])
+def test_gene_sets(parser, min_genes, max_genes):
+    gene_sets = parser.get_gene_sets(min_genes=min_genes,
+                                     max_genes=max_genes)
+    assert get_gene_set_data(gene_sets) == \
+        get_expected_gene_sets(parser, min_genes, max_genes)
+
+    for gs in gene_sets.gene_sets:
+        term = parser.terms[gs.id]
+        assert gs.name == term.name
+        assert gs.collection == term.domain_short
+        assert gs.description == term.definition
+
+
+def test_gene_set_sizes(parser):
+    gene_sets = parser.get_gene_sets(min_genes=3, max_genes=5)
+    assert [gs.id for gs in gene_sets.gene_sets] == \
+        ['GO:0003674', 'GO:0006412', 'GO:0044237']
+
+
+def get_expected_groups(parser, ids):
+    groups = {}
+    for id_ in ids:
+        groups.setdefault(parser.get_goterm_genes(id_), []).append(id_)
+    return sorted(g for g in groups.values() if len(g) > 1)
+
+
+def get_groups(parser, propagated, ids):
+    term_indices = [parser.terms[id_].index for id_ in ids]
+    ids = parser.graph.ids
+    return sorted([ids[i] for i in g.tolist()]
+                  for g in propagated.get_redundancy_groups(term_indices))
+
+
+def test_redundant_terms(parser):
+    ids = [id_ for id_ in sorted(parser.terms)
+           if parser.get_goterm_genes(id_)]
+    groups = get_expected_groups(parser, ids)
+    assert groups == [
+        ['GO:0003824', 'GO:0006096'],
+        ['GO:0005575', 'GO:0005622', 'GO:0005737', 'GO:0008150',
+         'GO:0009987'],
+        ['GO:0008152', 'GO:0044237'],
+    ]
+    assert get_groups(parser, parser._propagated, ids) == groups
+
+    # terms are only excluded if they are an ancestor of another term in
+    # their group
+    retained = set(gs.id for gs in parser.get_gene_sets().gene_sets)
+    assert retained & set(groups[0]) == set(groups[0])
+    assert retained & set(groups[1]) == set(['GO:0005737', 'GO:0009987'])
+    assert retained & set(groups[2]) == set(['GO:0044237'])
+
+
+def test_fingerprint_collisions(parser, monkeypatch):
+    ids = [id_ for id_ in sorted(parser.terms)
+           if parser.get_goterm_genes(id_)]
+    propagated = parser._propagated
+
+    # groups are confirmed by comparing the genes
+    fp = propagated.get_fingerprints()
+    monkeypatch.setattr(propagated, 'get_fingerprints', lambda: fp & 0)
+    assert get_groups(parser, propagated, ids) == \
+        get_expected_groups(parser, ids)
+
+
+def test_gene_set_cache(parser):
+    gene_sets = parser.get_gene_sets()
+    assert parser.is_loaded('_gene_sets')
+
+    # gene sets are reused by calls with other size bounds
+    selected = parser.get_gene_sets(min_genes=3, max_genes=5)
+    cached = dict((gs.id, gs) for gs in gene_sets.gene_sets)
+    assert all(gs is cached[gs.id] for gs in selected.gene_sets)
+    assert get_gene_set_data(selected) == \
+        get_expected_gene_sets(parser, 3, 5)
+
+
+def test_gene_set_cache_invalidation(parser, gaf_file, updated_gaf_file,
+                                     genes):
+    before = get_gene_set_data(parser.get_gene_sets())
+    parser.update_annotations(updated_gaf_file)
+    after = get_gene_set_data(parser.get_gene_sets())
+    assert after != before
+    assert after == get_expected_gene_sets(parser)
+
+    parser.parse_annotations(gaf_file, genes[:3])
+    assert not parser.is_loaded('_gene_sets')
+    assert get_gene_set_data(parser.get_gene_sets()) == \
+        get_expected_gene_sets(parser)
@@ -0,0 +1,169 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the `GOGraph` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import numpy as np
+import pytest
+
+from goparser import GOGraph, GOParser, GOTerm
+
+
+@pytest.fixture
+def ontology(obo_file):
+    parser = GOParser()
+    parser.parse_ontology(obo_file)
+    return parser
+
+
+def get_graph(parents):
+    """Creates a graph of terms "A", "B", ... with only is_a relations."""
+    ids = [chr(ord('A') + i) for i in range(len(parents))]
+    return GOGraph(ids, {'is_a': parents, 'part_of': [[] for _ in ids]})
+
+
+def test_term_index(ontology):
+    graph = ontology.graph
+    assert graph.n == len(ontology.terms) == 14
+    assert graph.ids == sorted(ontology.terms)
+    for id_, term in ontology.terms.items():
+        assert graph.ids[term.index] == id_
+        assert graph.id2idx[id_] == term.index
+
+
+def test_relations(ontology):
+    graph = ontology.graph
+    idx = graph.id2idx
+    cytoplasm = idx['GO:0005737']
+    assert graph.get_ids(graph.get_parents(cytoplasm, 'is_a')) == \
+        set(['GO:0005575'])
+    assert graph.get_ids(graph.get_parents(cytoplasm, 'part_of')) == \
+        set(['GO:0005622'])
+    assert graph.get_ids(graph.get_parents(cytoplasm)) == \
+        set(['GO:0005575', 'GO:0005622'])
+    assert graph.get_ids(graph.get_children(cytoplasm)) == \
+        set(['GO:0005840'])
+    assert graph.get_ids(graph.get_children(idx['GO:0044237'], 'is_a')) == \
+        set(['GO:0006412', 'GO:0006096'])
+
+    # the child relations are the transpose of the parent relations
+    for rel in GOGraph.relations:
+        for i in range(graph.n):
+            for p in graph.get_parents(i, rel).tolist():
+                assert i in graph.get_children(p, rel).tolist()
+
+
+def test_term_views(ontology):
+    term = ontology.terms['GO:0044237']
+    assert term.is_a == set(['GO:0008152', 'GO:0009987'])
+    assert term.part_of == set()
+    assert term.children == set(['GO:0006412', 'GO:0006096'])
+    assert ontology.terms['GO:0005622'].parts == set(['GO:0005737'])
+
+    # the relations of parsed terms cannot be modified in place
+    with pytest.raises(AttributeError):
+        term.children.add('GO:0005840')
+
+
+def test_unattached_term():
+    term = GOTerm('GO:0000001', 'term', 'biological_process', 'A term.',
+                  ['GO:0000002'], [])
+    term.is_a.add('GO:0000003')
+    assert term.is_a == set(['GO:0000002', 'GO:0000003'])
+
+
+def test_topological_order(ontology):
+    graph = ontology.graph
+    order = graph.get_topological_order()
+    assert sorted(order.tolist()) == list(range(graph.n))
+    rank = np.empty(graph.n, dtype=np.int64)
+    rank[order] = np.arange(graph.n)
+    for i in range(graph.n):
+        for p in graph.get_parents(i).tolist():
+            assert rank[p] < rank[i]
+
+
+def test_cycle_is_rejected():
+    # B -> C -> D -> B, and A is unaffected
+    graph = get_graph([[], [3], [1], [2]])
+    with pytest.raises(ValueError) as excinfo:
+        graph.get_topological_order()
+    assert '3 terms affected' in str(excinfo.value)
+    with pytest.raises(ValueError):
+        graph.flatten()
+
+
+def test_closure(ontology):
+    graph = ontology.graph
+    term = ontology.terms['GO:0006412']
+    assert term.ancestors == \
+        set(['GO:0044237', 'GO:0008152', 'GO:0009987', 'GO:0008150'])
+    assert ontology.terms['GO:0005622'].descendants == \
+        set(['GO:0005737', 'GO:0005840'])
+    # the sets are rebuilt from the closure of the graph
+    with pytest.raises(AttributeError):
+        term.ancestors.add('GO:0005575')
+    for i in range(graph.n):
+        assert graph.get_ids(graph.get_ancestors(i)) == \
+            ontology.terms[graph.ids[i]].ancestors
+
+
+def test_membership(ontology):
+    graph = ontology.graph
+    idx = graph.id2idx
+    for id_, term in ontology.terms.items():
+        for other in ontology.terms:
+            is_ancestor = other in term.ancestors
+            assert graph.is_ancestor(idx[other], idx[id_]) == is_ancestor
+            assert graph.is_descendant(idx[id_], idx[other]) == is_ancestor
+    assert not graph.is_ancestor(idx['GO:0008150'], idx['GO:0008150'])
+
+
+@pytest.mark.parametrize('include_self', [False, True])
+def test_common_relatives(ontology, include_self):
+    graph = ontology.graph
+    terms = ontology.terms
+    idx = graph.id2idx
+
+    def get_ids(indices):
+        return set(graph.ids[i] for i in indices.tolist())
+
+    def get_set(id_, attr):
+        result = set(getattr(terms[id_], attr))
+        if include_self:
+            result.add(id_)
+        return result
+
+    groups = [['GO:0006412', 'GO:0006096'], ['GO:0006412', 'GO:0009987'],
+              ['GO:0005840', 'GO:0005737', 'GO:0005622'],
+              ['GO:0006412', 'GO:0003824'], ['GO:0008150'], []]
+    for group in groups:
+        indices = [idx[id_] for id_ in group]
+        if group:
+            ancestors = set.intersection(
+                *[get_set(id_, 'ancestors') for id_ in group])
+            descendants = set.intersection(
+                *[get_set(id_, 'descendants') for id_ in group])
+        else:
+            ancestors = descendants = set()
+        assert get_ids(graph.get_common_ancestors(
+            indices, include_self)) == ancestors
+        assert get_ids(graph.get_common_descendants(
+            indices, include_self)) == descendants
@@ -0,0 +1,85 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for exporting annotations as an incidence matrix."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import numpy as np
+import pytest
+
+from goparser import GOParser
+
+pytest.importorskip('scipy')
+
+
+def get_expected_matrix(parser, propagate, evidence, domains):
+    """Builds the incidence matrix by brute force."""
+    genes = parser.annotation_table.genes
+    gene2idx = dict((g, i) for i, g in enumerate(genes))
+    matrix = np.zeros((len(genes), parser.graph.n), dtype=np.float64)
+    for ann in parser.annotations:
+        if evidence is not None and ann.evidence not in evidence:
+            continue
+        ids = set([ann.term.id])
+        if propagate:
+            ids |= ann.term.ancestors
+        for id_ in ids:
+            matrix[gene2idx[ann.gene], parser.terms[id_].index] = 1
+    terms = list(range(parser.graph.n))
+    if domains is not None:
+        terms = [i for i in terms
+                 if parser.terms[parser.graph.ids[i]].domain in domains]
+    return matrix[:, terms], terms
+
+
+@pytest.mark.parametrize('propagate', [False, True])
+@pytest.mark.parametrize('evidence', [None, ['IDA', 'IMP']])
+@pytest.mark.parametrize('domains', [None, ['biological_process'],
+                                     ['molecular_function',
+                                      'cellular_component']])
+def test_incidence_matrix(parser, propagate, evidence, domains):
+    matrix, genes, terms = parser.to_incidence_matrix(
+        propagate=propagate, evidence=evidence, domains=domains)
+    expected, expected_terms = get_expected_matrix(
+        parser, propagate, evidence, domains)
+    assert matrix.shape == expected.shape
+    assert genes.tolist() == list(range(len(parser.annotation_table.genes)))
+    assert terms.tolist() == expected_terms
+    assert matrix.has_sorted_indices
+    assert np.array_equal(matrix.toarray(), expected)
+
+
+def test_domain_abbreviations(parser):
+    matrix, _, terms = parser.to_incidence_matrix(domains=['BP'])
+    other, _, other_terms = parser.to_incidence_matrix(
+        domains=['biological_process'])
+    assert terms.tolist() == other_terms.tolist()
+    assert np.array_equal(matrix.toarray(), other.toarray())
+
+
+def test_incidence_matrix_dtype(parser):
+    matrix, _, _ = parser.to_incidence_matrix(dtype=np.float32)
+    assert matrix.dtype == np.float32
+
+
+def test_incidence_matrix_requires_annotations(obo_file):
+    parser = GOParser()
+    parser.parse_ontology(obo_file)
+    with pytest.raises(ValueError):
+        parser.to_incidence_matrix()
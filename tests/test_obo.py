@@ -0,0 +1,122 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the OBO reader."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import io
+import gzip
+import logging
+
+import pytest
+
+from goparser.obo import iter_obo_terms
+
+OBO = '''format-version: 1.2
+ontology: go
+
+[Term]
+id: GO:0008150
+name: biological_process
+namespace: biological_process
+def: "A \\"biological\\" process." [GOC:go_curators]
+synonym: "physiological process" EXACT []
+
+[Typedef]
+id: part_of
+name: part of
+namespace: external
+is_a: GO:0008150
+
+[Term]
+namespace: biological_process
+is_a: GO:0008150 ! biological_process
+relationship: part_of GO:0008150 {source="GOC"} ! biological_process
+name: metabolic process
+alt_id: GO:0044236
+id: GO:0008152
+def: "Chemical reactions." []
+
+[Term]
+id: GO:0000001
+name: obsolete term
+namespace: molecular_function
+is_obsolete: true'''
+
+
+def write_obo(path, text=OBO, newline='\n', compress=False):
+    data = text.replace('\n', newline).encode('UTF-8')
+    open_ = gzip.open if compress else io.open
+    with open_(path, 'wb') as fh:
+        fh.write(data)
+    return path
+
+
+def get_terms(fn, **kwargs):
+    return dict((term['id'], term) for term in iter_obo_terms(fn, **kwargs))
+
+
+def test_iter_obo_terms(tmpdir):
+    terms = get_terms(write_obo(str(tmpdir.join('go.obo'))))
+    assert sorted(terms) == ['GO:0000001', 'GO:0008150', 'GO:0008152']
+
+    term = terms['GO:0008150']
+    assert term['name'] == 'biological_process'
+    assert term['def'] == 'A "biological" process.'
+    assert term['synonym'] == [('physiological process', 'EXACT')]
+    # the [Typedef] stanza is skipped
+    assert term['is_a'] == []
+
+    # tags can appear in any order
+    term = terms['GO:0008152']
+    assert term['name'] == 'metabolic process'
+    assert term['namespace'] == 'biological_process'
+    assert term['def'] == 'Chemical reactions.'
+    assert term['alt_id'] == ['GO:0044236']
+    assert term['is_a'] == ['GO:0008150']
+    assert term['part_of'] == ['GO:0008150']
+    assert not term['is_obsolete']
+
+    assert terms['GO:0000001']['is_obsolete']
+
+
+@pytest.mark.parametrize('newline,compress', [
+    ('\r\n', False), ('\n', True), ('\r\n', True)])
+def test_file_formats(tmpdir, newline, compress):
+    expected = get_terms(write_obo(str(tmpdir.join('go.obo'))))
+    fn = write_obo(str(tmpdir.join('go2.obo')), newline=newline,
+                   compress=compress)
+    assert get_terms(fn) == expected
+
+
+@pytest.mark.parametrize('block_size', [1, 10, 100])
+def test_block_size(tmpdir, block_size):
+    fn = write_obo(str(tmpdir.join('go.obo')), newline='\r\n')
+    assert get_terms(fn, block_size=block_size) == get_terms(fn)
+
+
+def test_incomplete_stanza(tmpdir, caplog):
+    text = OBO.replace('id: GO:0008152\n', '') \
+        .replace('namespace: molecular_function\n', '')
+    fn = write_obo(str(tmpdir.join('go.obo')), text)
+    with caplog.at_level(logging.WARNING):
+        terms = get_terms(fn)
+    assert sorted(terms) == ['GO:0008150']
+    assert 'metabolic process' in caplog.text
+    assert 'GO:0000001' in caplog.text
@@ -0,0 +1,79 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for parsing the ontology and computing the GO term closures."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import io
+
+import pytest
+
+from goparser import GOParser
+
+
+def write_cyclic_obo(obo_file, fn):
+    """Makes the root of the biological process domain a child of one of its
+    descendants."""
+    with io.open(obo_file, encoding='UTF-8') as fh:
+        data = fh.read()
+    old = 'def: "A biological process." [GOC:test]\n'
+    assert old in data
+    data = data.replace(old, old + 'is_a: GO:0006412 ! translation\n')
+    with io.open(fn, 'w', encoding='UTF-8') as ofh:
+        ofh.write(data)
+
+
+def test_closures(obo_file):
+    parser = GOParser()
+    parser.parse_ontology(obo_file)
+    terms = parser.terms
+
+    assert set(terms['GO:0006412'].ancestors) == \
+        set(['GO:0044237', 'GO:0008152', 'GO:0009987', 'GO:0008150'])
+    assert set(terms['GO:0008150'].ancestors) == set()
+    assert set(terms['GO:0008150'].descendants) == \
+        set(['GO:0009987', 'GO:0008152', 'GO:0044237', 'GO:0006412',
+             'GO:0006096'])
+    # part_of relations are included
+    assert set(terms['GO:0005840'].ancestors) == \
+        set(['GO:0005575', 'GO:0005622', 'GO:0005737'])
+    assert set(terms['GO:0005622'].descendants) == \
+        set(['GO:0005737', 'GO:0005840'])
+
+
+def test_closures_are_consistent(obo_file):
+    parser = GOParser()
+    parser.parse_ontology(obo_file)
+    for id_, term in parser.terms.items():
+        parents = set(term.is_a) | set(term.part_of)
+        expected = set(parents)
+        for p in parents:
+            expected.update(parser.terms[p].ancestors)
+        assert set(term.ancestors) == expected
+        for other in term.ancestors:
+            assert id_ in parser.terms[other].descendants
+
+
+def test_cycle_is_rejected(obo_file, tmpdir):
+    fn = str(tmpdir.join('cyclic.obo'))
+    write_cyclic_obo(obo_file, fn)
+    parser = GOParser()
+    with pytest.raises(ValueError) as excinfo:
+        parser.parse_ontology(fn)
+    assert 'cycle' in str(excinfo.value)
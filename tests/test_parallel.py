@@ -0,0 +1,87 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for parsing GAF files in parallel."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import io
+import gzip
+import shutil
+
+import pytest
+
+from goparser import GOParser
+from goparser.table import AnnotationTableBuilder
+
+
+def get_rows(parser):
+    """Returns the annotations of a parser as tuples, in their order."""
+    return [(ann.gene, ann.term.id, ann.evidence, ann.db_id,
+             tuple(ann.db_ref), tuple(ann.with_))
+            for ann in parser.annotations]
+
+
+@pytest.fixture
+def gzip_gaf_file(gaf_file, tmpdir):
+    fn = str(tmpdir.join('ann.gaf.gz'))
+    with io.open(gaf_file, 'rb') as ifh, gzip.open(fn, 'wb') as ofh:
+        shutil.copyfileobj(ifh, ofh)
+    return fn
+
+
+@pytest.mark.parametrize('n_jobs', [2, 3, 8])
+def test_parallel(obo_file, gaf_file, genes, parser, n_jobs):
+    other = GOParser()
+    other.parse_ontology(obo_file)
+    other.parse_annotations(gaf_file, genes, n_jobs=n_jobs)
+    assert get_rows(other) == get_rows(parser)
+    assert other.genes == parser.genes
+
+
+def test_parallel_gzip(obo_file, gzip_gaf_file, genes, parser):
+    other = GOParser()
+    other.parse_ontology(obo_file)
+    other.parse_annotations(gzip_gaf_file, genes, n_jobs=2)
+    assert get_rows(other) == get_rows(parser)
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_failed_parse(gaf_file, genes, parser, tmpdir, n_jobs):
+    # an annotation without a gene
+    fn = str(tmpdir.join('invalid.gaf'))
+    with io.open(gaf_file, 'rb') as fh:
+        data = fh.read()
+    with io.open(fn, 'wb') as fh:
+        fh.write(data)
+        fh.write(b'UniProtKB\tP60709\t\t\tGO:0005737\tPMID:1\tIDA\t\tC\n')
+
+    rows = get_rows(parser)
+    with pytest.raises(ValueError):
+        parser.parse_annotations(fn, genes, n_jobs=n_jobs)
+    # the previously parsed annotations are kept
+    assert get_rows(parser) == rows
+
+
+def test_merge_builders(parser):
+    term_ids = sorted(parser.terms)
+    builder = AnnotationTableBuilder(['A', 'B'], term_ids)
+    with pytest.raises(ValueError):
+        builder.update(AnnotationTableBuilder(['A'], term_ids))
+    with pytest.raises(ValueError):
+        builder.update(AnnotationTableBuilder(['A', 'B'], term_ids[1:]))
@@ -0,0 +1,173 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the propagated annotations of GO terms."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import pytest
+
+from goparser import GOParser
+from goparser.propagation import PropagatedAnnotations
+
+
+def get_direct_genes(parser):
+    """Returns the genes directly annotated with each GO term."""
+    genes = dict((id_, set()) for id_ in parser.terms)
+    for ann in parser.annotations:
+        genes[ann.term.id].add(ann.gene)
+    return genes
+
+
+def get_expected_genes(parser):
+    """Propagates the annotations by brute force."""
+    direct = get_direct_genes(parser)
+    expected = {}
+    for id_, term in parser.terms.items():
+        genes = set(direct[id_])
+        for other in term.descendants:
+            genes |= direct[other]
+        expected[id_] = genes
+    return expected
+
+
+def test_get_goterm_genes(parser):
+    expected = get_expected_genes(parser)
+    assert parser.get_goterm_genes('GO:0008150') == \
+        set(['ACTB', 'EEF1A1', 'GAPDH', 'PKM', 'RPL3', 'RPS6'])
+    for id_ in parser.terms:
+        genes = parser.get_goterm_genes(id_)
+        assert isinstance(genes, frozenset)
+        assert genes == expected[id_]
+
+    direct = get_direct_genes(parser)
+    for id_ in parser.terms:
+        assert parser.get_goterm_genes(id_, descendants=False) == direct[id_]
+
+
+def test_propagated_index(parser):
+    propagated = PropagatedAnnotations.from_table(
+        parser.graph, parser.annotation_table)
+    expected = get_expected_genes(parser)
+    genes = parser.annotation_table.genes
+    for id_, term in parser.terms.items():
+        indices = propagated.get_genes(term.index).tolist()
+        assert indices == sorted(indices)
+        assert set(genes[i] for i in indices) == expected[id_]
+
+
+def test_propagated_index_is_reset(parser, obo_file, gaf_file, genes):
+    assert not parser.is_loaded('_propagated')
+    parser.get_goterm_genes('GO:0008150')
+    assert parser.is_loaded('_propagated')
+
+    # the index is recomputed after parsing other annotations
+    parser.parse_annotations(gaf_file, genes[:3])
+    assert not parser.is_loaded('_propagated')
+    assert parser.get_goterm_genes('GO:0008150') == \
+        set(['ACTB', 'EEF1A1', 'GAPDH'])
+
+
+def test_unannotated_parser(obo_file):
+    parser = GOParser()
+    parser.parse_ontology(obo_file)
+    assert parser.get_goterm_genes('GO:0008150') == frozenset()
+
+
+def get_expected_terms(parser):
+    """Determines the (propagated) GO terms of each gene by brute force."""
+    direct = dict((g, set()) for g in parser.genes)
+    for ann in parser.annotations:
+        direct[ann.gene].add(ann.term.id)
+    expected = {}
+    for gene, ids in direct.items():
+        propagated = set(ids)
+        for id_ in ids:
+            propagated |= parser.terms[id_].ancestors
+        expected[gene] = (ids, propagated)
+    return expected
+
+
+def test_get_gene_goterms(parser):
+    expected = get_expected_terms(parser)
+    assert expected['MYC'] == (set(), set())
+    for gene, (direct, propagated) in expected.items():
+        assert parser.get_gene_goterm_ids(gene) == direct
+        assert parser.get_gene_goterm_ids(gene, ancestors=True) == propagated
+
+        terms = parser.get_gene_goterms(gene, ancestors=True)
+        assert isinstance(terms, frozenset)
+        assert terms == set(parser.terms[id_] for id_ in propagated)
+
+        indices = parser.get_gene_goterm_indices(gene, ancestors=True)
+        assert indices.tolist() == \
+            sorted(parser.terms[id_].index for id_ in propagated)
+
+
+def test_get_gene_goterms_unknown_gene(parser):
+    with pytest.raises(KeyError):
+        parser.get_gene_goterms('FOO1')
+    with pytest.raises(KeyError):
+        parser.get_gene_goterm_ids('FOO1', ancestors=True)
+
+
+@pytest.mark.parametrize('descendants', [False, True])
+def test_get_goterm_genes_many(parser, descendants):
+    # repeated IDs are allowed, and the order of the IDs is kept
+    ids = sorted(parser.terms)[::-1] + ['GO:0008150']
+    result = parser.get_goterm_genes_many(ids, descendants=descendants,
+                                          as_dict=True)
+    assert result == dict((id_, parser.get_goterm_genes(id_, descendants))
+                          for id_ in ids)
+
+    indptr, indices = parser.get_goterm_genes_many(ids,
+                                                   descendants=descendants)
+    assert indptr.size == len(ids) + 1
+    genes = parser.annotation_table.genes
+    for i, id_ in enumerate(ids):
+        row = indices[indptr[i]:indptr[i+1]].tolist()
+        assert row == sorted(row)
+        assert set(genes[j] for j in row) == result[id_]
+
+
+@pytest.mark.parametrize('ancestors', [False, True])
+def test_get_gene_goterms_many(parser, ancestors):
+    genes = sorted(parser.genes)
+    result = parser.get_gene_goterms_many(genes, ancestors=ancestors,
+                                          as_dict=True)
+    assert result == dict((g, parser.get_gene_goterm_ids(g, ancestors))
+                          for g in genes)
+
+    indptr, indices = parser.get_gene_goterms_many(genes, ancestors=ancestors)
+    for i, gene in enumerate(genes):
+        row = indices[indptr[i]:indptr[i+1]]
+        assert row.tolist() == \
+            parser.get_gene_goterm_indices(gene, ancestors).tolist()
+
+    with pytest.raises(KeyError):
+        parser.get_gene_goterms_many(['ACTB', 'FOO1'])
+
+
+def test_many_without_annotations(obo_file):
+    parser = GOParser()
+    parser.parse_ontology(obo_file)
+    indptr, indices = parser.get_goterm_genes_many(['GO:0008150'])
+    assert indptr.tolist() == [0, 0]
+    assert indices.size == 0
+    assert parser.get_goterm_genes_many(['GO:0008150'], as_dict=True) == \
+        {'GO:0008150': frozenset()}
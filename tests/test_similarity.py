@@ -0,0 +1,267 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the semantic similarity of GO terms and genes."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+from goparser import GOParser
+from goparser.similarity import compute_similarity_matrix
+from goparser.util import LRUCache
+
+
+def get_expected_ic(parser):
+    """Computes the information content of each GO term, term by term."""
+    counts = dict((id_, len(parser.get_goterm_genes(id_)))
+                  for id_ in parser.terms)
+    totals = {}
+    for id_, term in parser.terms.items():
+        totals[term.domain] = max(totals.get(term.domain, 0), counts[id_])
+    ic = {}
+    for id_, term in parser.terms.items():
+        if counts[id_] == 0:
+            ic[id_] = float('nan')
+        else:
+            ic[id_] = -math.log(counts[id_] / totals[term.domain])
+    return ic
+
+
+def get_expected_similarity(parser, ic, id1, id2, method):
+    """Computes the similarity of two GO terms by brute force."""
+    ancestors = [parser.terms[id_].ancestors | set([id_])
+                 for id_ in (id1, id2)]
+    common = [ic[id_] for id_ in ancestors[0] & ancestors[1]
+              if not math.isnan(ic[id_])]
+    res = max(common) if common else None
+    if method == 'resnik':
+        return 0.0 if res is None else res
+
+    ic_sum = ic[id1] + ic[id2]
+    if math.isnan(ic_sum):
+        return float('nan')
+    if res is None:
+        return 0.0
+    if method == 'lin':
+        return 2 * res / ic_sum if ic_sum > 0 else 1.0
+    return 1.0 / (1.0 + ic_sum - 2 * res)
+
+
+def assert_equal_scores(scores, expected):
+    assert np.allclose(scores, expected, rtol=1e-12, atol=1e-12,
+                       equal_nan=True)
+
+
+def test_information_content(parser):
+    expected = get_expected_ic(parser)
+    assert expected['GO:0008150'] == 0
+    for id_ in parser.terms:
+        ic = parser.get_information_content(id_)
+        if math.isnan(expected[id_]):
+            assert math.isnan(ic)
+        else:
+            assert ic == pytest.approx(expected[id_], abs=1e-12)
+
+
+@pytest.mark.parametrize('method', ['resnik', 'lin', 'jiang'])
+def test_term_similarity(parser, method):
+    ic = get_expected_ic(parser)
+    pairs = list(itertools.product(sorted(parser.terms), repeat=2))
+    scores = parser.get_term_similarity_many(pairs, method=method)
+    expected = [get_expected_similarity(parser, ic, id1, id2, method)
+                for id1, id2 in pairs]
+    assert_equal_scores(scores, expected)
+
+    id1, id2 = pairs[17]
+    assert_equal_scores([parser.get_term_similarity(id1, id2, method)],
+                        [expected[17]])
+
+
+@pytest.mark.parametrize('method', ['resnik', 'lin', 'jiang'])
+def test_different_domains(parser, method):
+    # translation (BP) and structural constituent of ribosome (MF)
+    assert parser.get_term_similarity('GO:0006412', 'GO:0003735',
+                                      method) == 0
+    assert parser.get_term_similarity('GO:0008150', 'GO:0003674',
+                                      method) == 0
+
+
+@pytest.mark.parametrize('method', ['lin', 'jiang'])
+def test_terms_without_genes(parser, method):
+    assert parser.get_goterm_genes('GO:0000004') == frozenset()
+    for id_ in ['GO:0000004', 'GO:0008150', 'GO:0003674']:
+        assert math.isnan(parser.get_term_similarity('GO:0000004', id_,
+                                                     method))
+
+
+def test_identical_roots(parser):
+    for root in ['GO:0008150', 'GO:0003674', 'GO:0005575']:
+        assert parser.get_information_content(root) == 0
+        assert parser.get_term_similarity(root, root, 'lin') == 1
+        assert parser.get_term_similarity(root, root, 'jiang') == 1
+        assert parser.get_term_similarity(root, root, 'resnik') == 0
+
+
+def test_unknown_method(parser):
+    with pytest.raises(ValueError):
+        parser.get_term_similarity('GO:0008150', 'GO:0006412', 'wang')
+
+
+def test_similarity_requires_annotations(obo_file):
+    parser = GOParser()
+    parser.parse_ontology(obo_file)
+    with pytest.raises(ValueError):
+        parser.get_information_content('GO:0008150')
+
+
+def test_similarity_after_update(parser, updated_gaf_file):
+    before = parser.get_information_content('GO:0003735')
+    parser.update_annotations(updated_gaf_file)
+    ic = get_expected_ic(parser)
+    for id_ in ['GO:0003735', 'GO:0003824', 'GO:0005840']:
+        assert parser.get_information_content(id_) == pytest.approx(ic[id_])
+    assert parser.get_information_content('GO:0003735') != before
+
+
+@pytest.mark.parametrize('block_size,n_jobs', [(3, 1), (4, 2), (64, 2)])
+@pytest.mark.parametrize('method', ['resnik', 'lin'])
+def test_similarity_matrix(parser, block_size, n_jobs, method):
+    ids = sorted(parser.terms)
+    terms = np.array([parser.terms[id_].index for id_ in ids])
+    assert terms.size % block_size != 0
+    # the information content is computed on first use
+    parser.get_information_content(ids[0])
+    matrix = compute_similarity_matrix(
+        parser._similarity, terms, method=method, n_jobs=n_jobs,
+        block_size=block_size)
+    assert matrix.shape == (len(ids), len(ids))
+    assert np.array_equal(matrix, matrix.T, equal_nan=True)
+
+    pairs = list(itertools.product(ids, repeat=2))
+    expected = parser.get_term_similarity_many(pairs, method=method)
+    assert np.allclose(matrix.ravel(), expected.astype(np.float32),
+                       rtol=1e-6, atol=0, equal_nan=True)
+
+
+def test_term_similarity_matrix(parser, tmpdir):
+    ofn = str(tmpdir.join('sim.f32'))
+    matrix, ids = parser.term_similarity_matrix('MF', n_jobs=2, ofn=ofn)
+    assert ids == ['GO:0003674', 'GO:0003735', 'GO:0003824']
+    pairs = list(itertools.product(ids, repeat=2))
+    assert np.allclose(matrix.ravel(), parser.get_term_similarity_many(pairs))
+
+    # the matrix is stored in the given file
+    stored = np.fromfile(ofn, dtype=np.float32).reshape(3, 3)
+    assert np.array_equal(stored, matrix)
+
+
+def get_expected_gene_similarity(parser, gene1, gene2, method, aggregate,
+                                 domain=None):
+    """Computes the similarity of two genes by brute force."""
+    terms = []
+    for gene in (gene1, gene2):
+        terms.append(sorted(
+            id_ for id_ in parser.get_gene_goterm_ids(gene)
+            if domain is None or parser.terms[id_].domain == domain))
+    if not terms[0] or not terms[1]:
+        return float('nan')
+    scores = parser.get_term_similarity_many(
+        itertools.product(terms[0], terms[1]), method)
+    scores = scores.reshape(len(terms[0]), len(terms[1]))
+    if aggregate == 'max':
+        return scores.max()
+    if aggregate == 'avg':
+        return scores.mean()
+    return (scores.max(axis=1).mean() + scores.max(axis=0).mean()) / 2
+
+
+@pytest.mark.parametrize('aggregate', ['bma', 'max', 'avg'])
+@pytest.mark.parametrize('method,domain', [
+    ('lin', None), ('resnik', None), ('jiang', 'biological_process')])
+def test_gene_similarity(parser, method, aggregate, domain):
+    genes = sorted(parser.genes)
+    pairs = list(itertools.product(genes, repeat=2))
+    scores = parser.get_gene_similarity_many(pairs, method, aggregate,
+                                             domain)
+    expected = [get_expected_gene_similarity(parser, g1, g2, method,
+                                             aggregate, domain)
+                for g1, g2 in pairs]
+    assert_equal_scores(scores, expected)
+
+    matrix = parser.gene_similarity_matrix(genes, method=method,
+                                           aggregate=aggregate,
+                                           domain=domain, n_jobs=2)
+    assert_equal_scores(matrix.ravel(), expected)
+
+
+def test_genes_without_annotations(parser):
+    # MYC is a valid gene without any annotations
+    assert math.isnan(parser.get_gene_similarity('MYC', 'GAPDH'))
+    assert math.isnan(parser.get_gene_similarity('MYC', 'MYC'))
+    # ACTB is not annotated with any molecular function
+    assert math.isnan(parser.get_gene_similarity('ACTB', 'PKM',
+                                                 domain='MF'))
+    assert not math.isnan(parser.get_gene_similarity('ACTB', 'PKM'))
+
+
+def test_gene_similarity_matrix(parser):
+    genes1 = ['ACTB', 'GAPDH', 'MYC']
+    genes2 = ['PKM', 'RPL3']
+    matrix = parser.gene_similarity_matrix(genes1, genes2, aggregate='max')
+    assert matrix.shape == (3, 2)
+    expected = parser.get_gene_similarity_many(
+        itertools.product(genes1, genes2), aggregate='max')
+    assert_equal_scores(matrix.ravel(), expected)
+
+
+def test_term_score_cache(parser, updated_gaf_file):
+    parser.get_gene_similarity('RPL3', 'RPS6')
+    cache = parser._get_gene_similarity('lin', None).cache
+    hits, misses = cache.hits, cache.misses
+    assert misses > 0 and len(cache) == misses
+
+    # the term similarities are only computed once
+    parser.get_gene_similarity('RPS6', 'RPL3')
+    assert cache.misses == misses
+    assert cache.hits > hits
+
+    # term similarities are not reused after the annotations changed
+    parser.update_annotations(updated_gaf_file)
+    assert parser._get_gene_similarity('lin', None).cache is not cache
+    assert_equal_scores(
+        [parser.get_gene_similarity('RPL3', 'RPS6')],
+        [get_expected_gene_similarity(parser, 'RPL3', 'RPS6', 'lin', 'bma')])
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    cache.put(1, 'a')
+    cache.put(2, 'b')
+    assert cache.get(1) == 'a'
+    # the least recently used item is removed
+    cache.put(3, 'c')
+    assert 2 not in cache
+    assert cache.get(2) is None
+    assert cache.get(3) == 'c'
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (2, 1)
@@ -0,0 +1,155 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for snapshot files and pickles of `GOParser` objects."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import pickle
+
+import pytest
+
+from goparser import GOParser
+from goparser.util import StringArray
+from .util import get_annotation_data, get_term_genes
+
+
+def get_term_data(parser):
+    return dict((id_, (t.name, t.domain, t.definition, t.is_obsolete,
+                       t.is_a, t.part_of, t.children, t.parts,
+                       t.ancestors, t.descendants))
+                for id_, t in parser.terms.items())
+
+
+def assert_same_data(parser, other):
+    assert get_term_data(parser) == get_term_data(other)
+    assert set(parser.genes) == set(other.genes)
+    assert get_annotation_data(parser) == get_annotation_data(other)
+    assert get_term_genes(parser) == get_term_genes(other)
+    assert parser.get_term_by_name('protein biosynthesis').id == \
+        'GO:0006412'
+
+
+def test_snapshot_round_trip(parser, tmpdir):
+    fn = str(tmpdir.join('go.snap'))
+    parser.write_snapshot(fn)
+    assert_same_data(GOParser.read_snapshot(fn), parser)
+
+
+def test_snapshot_without_annotations(obo_file, tmpdir):
+    parser = GOParser()
+    parser.parse_ontology(obo_file)
+    fn = str(tmpdir.join('go.snap'))
+    parser.write_snapshot(fn)
+
+    loaded = GOParser.read_snapshot(fn)
+    assert get_term_data(loaded) == get_term_data(parser)
+    assert len(loaded.annotations) == 0
+
+
+def test_parallel_after_snapshot(parser, gaf_file, genes, tmpdir):
+    fn = str(tmpdir.join('go.snap'))
+    parser.write_snapshot(fn)
+    loaded = GOParser.read_snapshot(fn)
+    assert isinstance(loaded.graph.ids, StringArray)
+    loaded.parse_annotations(gaf_file, genes, n_jobs=2)
+    assert_same_data(loaded, parser)
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_pickle_round_trip(parser, tmpdir, compress):
+    fn = str(tmpdir.join('go.pickle'))
+    parser.write_pickle(fn, compress=compress)
+    assert_same_data(GOParser.read_pickle(fn), parser)
+
+
+def test_pickle_of_snapshot(parser, tmpdir):
+    fn = str(tmpdir.join('go.snap'))
+    parser.write_snapshot(fn)
+    pickle_fn = str(tmpdir.join('go.pickle'))
+    GOParser.read_snapshot(fn).write_pickle(pickle_fn)
+    assert_same_data(GOParser.read_pickle(pickle_fn), parser)
+
+
+def test_string_array():
+    strings = ['GO:0008150', None, '', 'Zellkern \u00fc']
+    array = StringArray.from_strings(strings)
+    assert len(array) == 4
+    assert list(array) == strings
+    assert array[-1] == strings[-1]
+    assert array[1:3] == strings[1:3]
+
+    copy = pickle.loads(pickle.dumps(array))
+    assert copy is not array
+    assert copy == array
+    assert array == strings
+    assert not array != strings
+    assert array != strings[:3]
+    assert array != StringArray.from_strings(strings[:3] + ['x'])
+    assert array != StringArray.from_strings(strings[:1] + ['', ''] +
+                                             strings[3:])
+
+
+@pytest.mark.parametrize('sections', [[], ['ontology'],
+                                      ['ontology', 'names']])
+def test_snapshot_lazy_sections(parser, tmpdir, sections):
+    fn = str(tmpdir.join('go.snap'))
+    parser.write_snapshot(fn)
+    loaded = GOParser.read_snapshot(fn, sections=sections)
+    assert loaded.is_loaded('_name2id') == ('names' in sections)
+    assert not loaded.is_loaded('annotation_table')
+    assert not loaded.graph.is_loaded('ancestors')
+
+    # looking up terms by ID does not load any other section
+    assert loaded.terms['GO:0006412'].name == 'translation'
+    assert not loaded.is_loaded('annotation_table')
+    assert not loaded.graph.is_loaded('ancestors')
+
+    # sections that are not loaded immediately are loaded on first access
+    assert_same_data(loaded, parser)
+    assert loaded.is_loaded('annotation_table')
+    assert loaded.graph.is_loaded('ancestors')
+
+
+def test_snapshot_unknown_section(parser, tmpdir):
+    fn = str(tmpdir.join('go.snap'))
+    parser.write_snapshot(fn)
+    with pytest.raises(ValueError):
+        GOParser.read_snapshot(fn, sections=['ontology', 'foo'])
+
+
+@pytest.mark.parametrize('sections', [[], ['ontology', 'closure']])
+def test_pickle_of_lazy_snapshot(parser, tmpdir, sections):
+    fn = str(tmpdir.join('go.snap'))
+    parser.write_snapshot(fn)
+    pickle_fn = str(tmpdir.join('go.pickle'))
+    # sections that are not loaded yet are loaded after unpickling
+    GOParser.read_snapshot(fn, sections=sections).write_pickle(pickle_fn)
+    assert_same_data(GOParser.read_pickle(pickle_fn), parser)
+
+
+def test_snapshot_after_update(parser, updated_gaf_file, tmpdir):
+    parser.update_annotations(updated_gaf_file)
+    fn = str(tmpdir.join('go.snap'))
+    parser.write_snapshot(fn)
+    loaded = GOParser.read_snapshot(fn)
+    assert_same_data(loaded, parser)
+
+    # the parameters are stored, so that the annotations can be updated
+    loaded.update_annotations(updated_gaf_file)
+    assert get_annotation_data(loaded) == get_annotation_data(parser)
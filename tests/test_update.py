@@ -0,0 +1,93 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests for `GOParser.update_annotations`."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import pytest
+
+from goparser import GOParser
+from .util import get_annotation_data, get_term_genes
+
+
+@pytest.fixture
+def updated_parser(obo_file, updated_gaf_file, genes):
+    parser = GOParser()
+    parser.parse_ontology(obo_file)
+    parser.parse_annotations(updated_gaf_file, genes)
+    return parser
+
+
+def get_gene_terms(parser):
+    return dict((g, set(term.id for term in
+                        parser.get_gene_goterms(g, ancestors=True)))
+                for g in parser.genes)
+
+
+def test_update_matches_fresh_parse(parser, updated_parser,
+                                    updated_gaf_file):
+    parser.update_annotations(updated_gaf_file)
+    assert get_annotation_data(parser) == get_annotation_data(updated_parser)
+    assert get_term_genes(parser) == get_term_genes(updated_parser)
+    assert get_gene_terms(parser) == get_gene_terms(updated_parser)
+
+
+def test_update_delta(parser, updated_gaf_file):
+    delta = parser.update_annotations(updated_gaf_file)
+    assert sorted((a.gene, a.term.id) for a in delta.added) == \
+        [('ACTB', 'GO:0005622'), ('RPS6', 'GO:0003735')]
+    assert sorted((a.gene, a.term.id) for a in delta.removed) == \
+        [('EEF1A1', 'GO:0005737'), ('PKM', 'GO:0005737')]
+    assert delta.genes == set(['ACTB', 'EEF1A1', 'PKM', 'RPS6'])
+    assert delta.term_ids == set(['GO:0003735', 'GO:0005622', 'GO:0005737'])
+
+
+def test_update_round_trip(parser, gaf_file, updated_gaf_file):
+    before = get_term_genes(parser)
+    parser.update_annotations(updated_gaf_file)
+    parser.update_annotations(gaf_file)
+    assert get_term_genes(parser) == before
+
+    # updating with the same file does not change anything
+    delta = parser.update_annotations(gaf_file)
+    assert len(delta.added) == 0 and len(delta.removed) == 0
+    assert get_term_genes(parser) == before
+
+
+def test_update_requires_annotations(obo_file, gaf_file):
+    parser = GOParser()
+    parser.parse_ontology(obo_file)
+    with pytest.raises(ValueError):
+        parser.update_annotations(gaf_file)
+
+
+def test_update_propagated(parser, updated_parser, updated_gaf_file):
+    # the propagated annotations are updated incrementally
+    get_term_genes(parser)
+    assert parser.is_loaded('_propagated')
+    parser.update_annotations(updated_gaf_file)
+    assert parser.is_loaded('_propagated')
+
+    expected = updated_parser._propagated
+    propagated = parser._propagated
+    for name in ['term_indptr', 'term_genes', 'gene_indptr', 'gene_terms']:
+        assert getattr(propagated, name).tolist() == \
+            getattr(expected, name).tolist()
+    assert get_term_genes(parser) == get_term_genes(updated_parser)
@@ -0,0 +1,68 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the utility classes and the memory layout of terms and
+annotations."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import pickle
+
+import pytest
+
+from goparser import GOAnnotation, GOTerm
+from goparser.util import InternPool
+
+
+def test_intern_pool():
+    pool = InternPool(['IEA', 'IDA'])
+    assert len(pool) == 2
+    assert pool.encode('IDA') == 1
+    assert pool.encode('TAS') == 2
+    assert pool.values == ['IEA', 'IDA', 'TAS']
+    assert 'TAS' in pool
+    assert 'IMP' not in pool
+
+    value = ''.join(['I', 'E', 'A'])
+    assert pool.intern(value) is pool.values[0]
+
+
+def test_interned_values(parser):
+    domains = [t.domain for t in parser.terms.values()
+               if t.domain == 'biological_process']
+    assert all(d is domains[0] for d in domains)
+    evidence = [a.evidence for a in parser.annotations
+                if a.evidence == 'IDA']
+    assert len(evidence) > 1
+    assert all(e is evidence[0] for e in evidence)
+
+
+def test_slots():
+    term = GOTerm('GO:0008150', 'biological_process', 'biological_process',
+                  'A biological process.', [], [])
+    ann = GOAnnotation('ACTB', term, 'IDA', db_id='P60709',
+                       db_ref=['PMID:1'])
+    for obj in [term, ann]:
+        assert not hasattr(obj, '__dict__')
+        with pytest.raises(AttributeError):
+            obj.foo = 1
+
+    ann2 = pickle.loads(pickle.dumps(ann))
+    assert ann2 == ann
+    assert ann2.term.name == 'biological_process'
+    assert ann2.db_ref == ('PMID:1',)
@@ -0,0 +1,33 @@
+# Copyright (c) 2015, 2016 Florian Wagner
+#
+# This file is part of GOparser.
+#
+# GOparser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Helper functions for comparing `GOParser` objects."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+
+def get_annotation_data(parser):
+    """Returns the annotations of a parser as a sorted list of tuples."""
+    return sorted((ann.gene, ann.term.id, ann.evidence, ann.db_id,
+                   tuple(ann.db_ref), tuple(ann.with_))
+                  for ann in parser.annotations)
+
+
+def get_term_genes(parser):
+    """Returns the (propagated) genes of all GO terms of a parser."""
+    return dict((id_, parser.get_goterm_genes(id_)) for id_ in parser.terms)